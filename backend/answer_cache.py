@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import traceback
+from collections import OrderedDict
+
+from resources import get_table
+
+# Answer cache configuration
+ANSWER_CACHE_ENABLED = os.environ.get('ANSWER_CACHE_ENABLED', 'true').lower() == 'true'
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get('ANSWER_CACHE_MAX_ENTRIES', 1000))
+ANSWER_CACHE_TTL_SECONDS = int(os.environ.get('ANSWER_CACHE_TTL_SECONDS', 6 * 3600))
+ANSWER_CACHE_TABLE = os.environ.get('ANSWER_CACHE_TABLE')
+ANSWER_CACHE_DIR = os.environ.get('ANSWER_CACHE_DIR', '/tmp/answer-cache')
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_question(message):
+    """Lowercase, collapse whitespace and drop trailing punctuation so trivial variants share an entry"""
+    return WHITESPACE_PATTERN.sub(" ", message.lower()).strip().rstrip("?!. ")
+
+
+def answer_cache_key(repo_path, sha, message, model_id, prompt_version):
+    """Build the cache key for an answer to `message` about the repository at `sha`"""
+    parts = [repo_path.lower(), sha, normalize_question(message), model_id, str(prompt_version)]
+    return hashlib.sha256("\n".join(parts).encode('utf-8')).hexdigest()
+
+
+class LRUAnswerTier:
+    """In-process LRU of answers bounded by entry count"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (answer, expires_at)
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, answer, expires_at):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (answer, expires_at)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+class DynamoDBAnswerStore:
+    """
+    Shared answer tier backed by a DynamoDB table with TTL enabled on
+    `expiresAt`. TTL deletion can lag, so expiry is also checked on read.
+    """
+
+    def __init__(self, table_name):
+        self.table_name = table_name
+
+    @property
+    def table(self):
+        return get_table(self.table_name)
+
+    def get(self, key):
+        item = self.table.get_item(Key={'cacheKey': key}).get('Item')
+        if not item or int(item.get('expiresAt', 0)) <= time.time():
+            return None
+        return item['answer'], int(item['expiresAt'])
+
+    def put(self, key, answer, expires_at):
+        self.table.put_item(Item={
+            'cacheKey': key,
+            'answer': answer,
+            'expiresAt': int(expires_at),
+        })
+
+
+class LocalDirAnswerStore:
+    """Shared answer tier backed by a local directory (stand-in for DynamoDB)"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def get(self, key):
+        file_path = os.path.join(self.root, f"{key}.json")
+        if not os.path.exists(file_path):
+            return None
+        with open(file_path, 'r', encoding='utf-8') as f:
+            item = json.load(f)
+        if item['expiresAt'] <= time.time():
+            os.remove(file_path)
+            return None
+        return item['answer'], item['expiresAt']
+
+    def put(self, key, answer, expires_at):
+        os.makedirs(self.root, exist_ok=True)
+        file_path = os.path.join(self.root, f"{key}.json")
+        tmp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'answer': answer, 'expiresAt': expires_at}, f)
+        os.replace(tmp_path, file_path)
+
+
+class AnswerCache:
+    """
+    Two-tier cache of generated answers keyed by answer_cache_key. Entries
+    expire after ttl_seconds in both tiers.
+    """
+
+    def __init__(self, local_tier, shared_store=None, ttl_seconds=ANSWER_CACHE_TTL_SECONDS):
+        self.local_tier = local_tier
+        self.shared_store = shared_store
+        self.ttl_seconds = ttl_seconds
+        self.stats = {'local_hits': 0, 'shared_hits': 0, 'misses': 0, 'stores': 0}
+        self.stats_lock = threading.Lock()
+
+    def record(self, stat):
+        with self.stats_lock:
+            self.stats[stat] += 1
+
+    def get(self, key):
+        """Return the cached answer for `key`, or None"""
+        answer = self.local_tier.get(key)
+        if answer is not None:
+            self.record('local_hits')
+            return answer
+
+        if self.shared_store is not None:
+            try:
+                stored = self.shared_store.get(key)
+                if stored is not None:
+                    answer, expires_at = stored
+                    self.local_tier.put(key, answer, expires_at)
+                    self.record('shared_hits')
+                    return answer
+            except Exception as e:
+                print(f"ERROR: Failed to read shared answer {key[:12]}: {str(e)}")
+                traceback.print_exc()
+
+        self.record('misses')
+        return None
+
+    def put(self, key, answer):
+        """Store an answer in both tiers"""
+        expires_at = int(time.time() + self.ttl_seconds)
+        self.local_tier.put(key, answer, expires_at)
+        self.record('stores')
+
+        if self.shared_store is not None:
+            try:
+                self.shared_store.put(key, answer, expires_at)
+            except Exception as e:
+                print(f"ERROR: Failed to write shared answer {key[:12]}: {str(e)}")
+                traceback.print_exc()
+
+    def summary(self):
+        """Return the counters plus the overall hit rate"""
+        with self.stats_lock:
+            stats = dict(self.stats)
+        lookups = stats['local_hits'] + stats['shared_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['local_hits'] + stats['shared_hits']) / lookups, 3) if lookups else 0.0
+        return stats
+
+
+def create_answer_cache():
+    """Build the answer cache from environment configuration, or None if disabled"""
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    if ANSWER_CACHE_TABLE:
+        shared_store = DynamoDBAnswerStore(ANSWER_CACHE_TABLE)
+    elif ANSWER_CACHE_DIR:
+        shared_store = LocalDirAnswerStore(ANSWER_CACHE_DIR)
+    else:
+        shared_store = None
+    return AnswerCache(LRUAnswerTier(ANSWER_CACHE_MAX_ENTRIES), shared_store)
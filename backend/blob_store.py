@@ -0,0 +1,313 @@
+"""
+Content-addressed store for file bodies, shared by every snapshot in the process.
+
+Bodies are keyed by their git blob SHA and kept zlib-compressed. Forks,
+vendored libraries, license files and files unchanged between two commits
+all have the same SHA, so they are downloaded and held once: a snapshot's
+FileContents references the store's compressed blob instead of keeping its
+own copy of the text, and fetches skip files whose SHA is already known.
+
+The in-memory tier is an LRU bounded by BLOB_STORE_MAX_BYTES of compressed
+data. Evicting a blob doesn't affect snapshots that reference it; it only
+means the next fetch of that SHA looks in the disk tier (BLOB_STORE_DIR)
+before downloading it again. The disk tier is an LRU too, bounded by
+BLOB_STORE_DISK_MAX_BYTES, and stops writing when the filesystem runs low,
+since Lambda's /tmp is small and shared with the other caches.
+"""
+import hashlib
+import os
+import shutil
+import threading
+import traceback
+import zlib
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+from tracing import debug
+
+BLOB_STORE_MAX_BYTES = int(os.environ.get('BLOB_STORE_MAX_BYTES', 64 * 1024 * 1024))
+# Persistent tier; "" keeps blobs in memory only
+BLOB_STORE_DIR = os.environ.get('BLOB_STORE_DIR', '/tmp/blob-store')
+BLOB_STORE_DISK_MAX_BYTES = int(os.environ.get('BLOB_STORE_DISK_MAX_BYTES', 128 * 1024 * 1024))
+DISK_MIN_FREE_BYTES = 64 * 1024 * 1024  # Left free for the snapshot and answer caches
+BLOB_COMPRESSION_LEVEL = 6
+
+
+def git_blob_sha(data):
+    """The git object ID of a blob with these bytes"""
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def decompress(blob):
+    return zlib.decompress(blob).decode('utf-8')
+
+
+class BlobStore:
+    """Compressed file bodies by git blob SHA: an in-process LRU over an optional disk directory"""
+
+    def __init__(self, max_bytes, root=None, disk_max_bytes=BLOB_STORE_DISK_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.root = root
+        self.disk_max_bytes = disk_max_bytes
+        self.current_bytes = 0
+        self.entries = OrderedDict()  # sha -> compressed body
+        self.disk_entries = None  # sha -> size on disk, least recently used first; listed on first use
+        self.disk_bytes = 0
+        self.lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stored': 0, 'deduplicated': 0,
+                      'disk_evictions': 0, 'disk_skipped': 0}
+
+    def get(self, sha):
+        """The compressed body for `sha`, or None if neither tier has it"""
+        if not sha:
+            return None
+        with self.lock:
+            blob = self.entries.get(sha)
+            if blob is not None:
+                self.entries.move_to_end(sha)
+                self.stats['memory_hits'] += 1
+                return blob
+
+        blob = self.read_disk(sha)
+        if blob is None:
+            self.stats['misses'] += 1
+            return None
+        self.stats['disk_hits'] += 1
+        self.remember(sha, blob)
+        return blob
+
+    def put(self, sha, text):
+        """Store a body and return its compressed blob; a body already stored is not compressed again"""
+        with self.lock:
+            blob = self.entries.get(sha)
+            if blob is not None:
+                self.entries.move_to_end(sha)
+                self.stats['deduplicated'] += 1
+                return blob
+        blob = zlib.compress(text.encode('utf-8'), BLOB_COMPRESSION_LEVEL)
+        self.stats['stored'] += 1
+        self.remember(sha, blob)
+        self.write_disk(sha, blob)
+        return blob
+
+    def remember(self, sha, blob):
+        if len(blob) > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(sha, None)
+            if old is not None:
+                self.current_bytes -= len(old)
+            self.entries[sha] = blob
+            self.current_bytes += len(blob)
+            while self.current_bytes > self.max_bytes and self.entries:
+                _, evicted = self.entries.popitem(last=False)
+                self.current_bytes -= len(evicted)
+
+    def blob_path(self, sha):
+        return os.path.join(self.root, sha[:2], sha)
+
+    def read_disk(self, sha):
+        if not self.root:
+            return None
+        try:
+            with open(self.blob_path(sha), 'rb') as f:
+                blob = f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            print(f"WARNING: Failed to read blob {sha}: {str(e)}")
+            return None
+        with self.lock:
+            self.list_disk()
+            if sha in self.disk_entries:
+                self.disk_entries.move_to_end(sha)
+        return blob
+
+    def write_disk(self, sha, blob):
+        if not self.root or len(blob) > self.disk_max_bytes:
+            return
+        file_path = self.blob_path(sha)
+        try:
+            if os.path.exists(file_path):
+                return
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            if shutil.disk_usage(self.root).free < DISK_MIN_FREE_BYTES + len(blob):
+                self.stats['disk_skipped'] += 1
+                return
+            tmp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(blob)
+            os.replace(tmp_path, file_path)
+        except OSError as e:
+            print(f"ERROR: Failed to write blob {sha}: {str(e)}")
+            traceback.print_exc()
+            return
+
+        with self.lock:
+            self.list_disk()
+            if sha not in self.disk_entries:
+                self.disk_entries[sha] = len(blob)
+                self.disk_bytes += len(blob)
+            while self.disk_bytes > self.disk_max_bytes and self.disk_entries:
+                evicted, size = self.disk_entries.popitem(last=False)
+                self.disk_bytes -= size
+                self.stats['disk_evictions'] += 1
+                try:
+                    os.remove(self.blob_path(evicted))
+                except OSError:
+                    pass
+
+    def list_disk(self):
+        """Index the blobs already on disk (from earlier invocations), oldest first; call with the lock held"""
+        if self.disk_entries is not None:
+            return
+        found = []
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                if name.endswith('.tmp'):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(directory, name))
+                except OSError:
+                    continue
+                found.append((stat.st_mtime, name, stat.st_size))
+        found.sort()
+        self.disk_entries = OrderedDict((name, size) for _, name, size in found)
+        self.disk_bytes = sum(size for _, _, size in found)
+
+
+# Shared by all snapshots in the process, so it survives warm invocations
+blob_store = BlobStore(BLOB_STORE_MAX_BYTES, BLOB_STORE_DIR or None)
+
+
+class FileContents(MutableMapping):
+    """
+    A snapshot's fetched file contents: path -> {"name", "content",
+    "truncated", "size", "sha"}. Bodies are references to blobs in the
+    BlobStore; truncated bodies (not the blob their SHA names) are kept
+    inline. Entries are built per lookup, so reading "content" decompresses.
+    """
+
+    def __init__(self, store=None):
+        self.store = store or blob_store
+        self.files = {}  # path -> (name, sha, blob, inline text, truncated, size)
+
+    def add(self, path, name, content, size=0, sha=None, truncated=False):
+        if truncated:
+            self.files[path] = (name, sha, None, content, True, size)
+            return
+        sha = sha or git_blob_sha(content.encode('utf-8'))
+        self.files[path] = (name, sha, self.store.put(sha, content), None, False, size)
+
+    def add_blob(self, path, name, sha, blob, size=0):
+        """Reference a blob already in the store"""
+        self.files[path] = (name, sha, blob, None, False, size)
+
+    def sha(self, path):
+        return self.files[path][1]
+
+    def set_size(self, path, size):
+        self.files[path] = self.files[path][:5] + (size,)
+
+    def total_size(self):
+        return sum(entry[5] for entry in self.files.values())
+
+    def copy(self):
+        contents = FileContents(self.store)
+        contents.files = dict(self.files)
+        return contents
+
+    # Mapping interface
+
+    def __getitem__(self, path):
+        name, sha, blob, text, truncated, size = self.files[path]
+        return {
+            "name": name,
+            "content": decompress(blob) if blob is not None else text,
+            "truncated": truncated,
+            "size": size,
+            "sha": sha,
+        }
+
+    def __setitem__(self, path, entry):
+        self.add(path, entry.get("name"), entry.get("content", ""), entry.get("size", 0),
+                 entry.get("sha"), entry.get("truncated", False))
+
+    def __delitem__(self, path):
+        del self.files[path]
+
+    def __contains__(self, path):
+        return path in self.files
+
+    def __iter__(self):
+        return iter(self.files)
+
+    def __len__(self):
+        return len(self.files)
+
+    # Serialization
+
+    def to_json(self):
+        """Snapshot form; bodies are written out so a stored snapshot doesn't depend on this process's store"""
+        return {
+            '__file_contents__': 1,
+            'files': {path: [entry["name"], entry["sha"], entry["truncated"], entry["size"], entry["content"]]
+                      for path, entry in self.items()},
+        }
+
+    @classmethod
+    def from_json(cls, data, store=None):
+        contents = cls(store)
+        for path, (name, sha, truncated, size, content) in data['files'].items():
+            contents.add(path, name, content, size, sha, truncated)
+        return contents
+
+    @classmethod
+    def from_entries(cls, entries, store=None):
+        """Build from a path -> entry dict (the old snapshot format)"""
+        contents = cls(store)
+        for path, entry in entries.items():
+            contents[path] = entry
+        return contents
+
+
+def as_file_contents(file_contents):
+    """Return `file_contents` as FileContents, converting a plain dict of entries"""
+    if isinstance(file_contents, FileContents):
+        return file_contents
+    return FileContents.from_entries(file_contents or {})
+
+
+def reuse_known_blobs(files_to_fetch, file_contents, store=None):
+    """
+    Fill `file_contents` from the store for the selected (path, info, score)
+    files whose blob SHA is already known, and return the files that still
+    need fetching
+    """
+    store = store or blob_store
+    remaining = []
+    for selected in files_to_fetch:
+        path, info, _ = selected
+        blob = store.get(info.get("sha"))
+        if blob is None:
+            remaining.append(selected)
+        else:
+            file_contents.add_blob(path, info.get("name"), info["sha"], blob, info.get("size", 0))
+    reused = len(files_to_fetch) - len(remaining)
+    if reused:
+        debug(f"Reused {reused} of {len(files_to_fetch)} file bodies from the blob store ({store.stats})")
+    return remaining
+
+
+def encode_json_value(value):
+    """json.dumps `default` hook for snapshots containing FileContents"""
+    if isinstance(value, FileContents):
+        return value.to_json()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def decode_json_object(obj):
+    """json.loads `object_hook` restoring FileContents"""
+    if '__file_contents__' in obj:
+        return FileContents.from_json(obj)
+    return obj
@@ -0,0 +1,130 @@
+import math
+import os
+
+# Prompt budget configuration
+PROMPT_TOKEN_BUDGET = int(os.environ.get('PROMPT_TOKEN_BUDGET', 24000))
+# Share of the budget reserved for code retrieved per question; the rest is the cached repository context
+RETRIEVAL_TOKEN_BUDGET = int(os.environ.get('RETRIEVAL_TOKEN_BUDGET', 8000))
+CHARS_PER_TOKEN = 3.5  # Conservative average for mixed prose and code
+MIN_TRUNCATED_TOKENS = 200  # Don't keep truncated fragments smaller than this
+TRUNCATION_MARKER = "\n[TRUNCATED]"
+
+
+def estimate_tokens(text):
+    """Estimate the model token count of a string"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut text to about `max_tokens`, preferring a line boundary"""
+    max_chars = int(max_tokens * CHARS_PER_TOKEN) - len(TRUNCATION_MARKER)
+    if max_chars <= 0:
+        return ""
+    cut = text[:max_chars]
+    newline = cut.rfind("\n")
+    if newline > max_chars // 2:
+        cut = cut[:newline]
+    return cut + TRUNCATION_MARKER
+
+
+class ContextItem:
+    """One candidate piece of prompt context with its value and cost"""
+
+    def __init__(self, section, label, text, priority, truncatable=False, truncated=False):
+        self.section = section
+        self.label = label
+        self.text = text
+        self.priority = priority
+        self.truncatable = truncatable
+        self.truncated = truncated  # The caller already cut the text
+        self.tokens = estimate_tokens(text)
+
+
+class PackedContext:
+    """Result of packing: the assembled text plus what was kept, cut and dropped"""
+
+    def __init__(self, text, used_tokens, token_budget, included, truncated, dropped):
+        self.text = text
+        self.used_tokens = used_tokens
+        self.token_budget = token_budget
+        self.included = included
+        self.truncated = truncated
+        self.dropped = dropped
+
+    def summary(self):
+        return (f"{self.used_tokens}/{self.token_budget} tokens, {len(self.included)} items included, "
+                f"{len(self.truncated)} truncated, {len(self.dropped)} dropped")
+
+
+class ContextPacker:
+    """
+    Selects prompt sections and items under a token budget. Items are taken
+    greedily in priority order; an item that doesn't fit is truncated to the
+    remaining budget if allowed, otherwise dropped. The output is assembled in
+    one pass in section order, so the prompt layout stays stable regardless of
+    which items were selected.
+    """
+
+    def __init__(self, token_budget=PROMPT_TOKEN_BUDGET):
+        self.token_budget = token_budget
+        self.sections = []  # (name, heading)
+        self.items = []
+
+    def add_section(self, name, heading):
+        self.sections.append((name, heading))
+
+    def add(self, section, label, text, priority, truncatable=False, truncated=False):
+        """Add a candidate item; `truncated` marks text the caller already cut, so it is reported as truncated"""
+        if text:
+            self.items.append(ContextItem(section, label, text, priority, truncatable, truncated))
+
+    def pack(self):
+        headings = {name: heading for name, heading in self.sections}
+        heading_tokens = {name: estimate_tokens(f"\n\n{heading}\n") for name, heading in self.sections}
+        remaining = self.token_budget
+        opened_sections = set()
+        selected = {}  # item index -> text
+        included, truncated, dropped = [], [], []
+
+        order = sorted(range(len(self.items)), key=lambda i: (-self.items[i].priority, i))
+        for i in order:
+            item = self.items[i]
+            # The first item of a section also pays for the section heading
+            overhead = 0 if item.section in opened_sections else heading_tokens.get(item.section, 0)
+            available = remaining - overhead
+
+            if item.tokens <= available:
+                text = item.text
+                if item.truncated:
+                    truncated.append(item.label)
+            elif item.truncatable and available >= MIN_TRUNCATED_TOKENS:
+                text = truncate_to_tokens(item.text, available)
+                truncated.append(item.label)
+            else:
+                dropped.append(item.label)
+                continue
+
+            selected[i] = text
+            included.append(item.label)
+            opened_sections.add(item.section)
+            remaining -= overhead + estimate_tokens(text)
+
+        # Group selected items by section, keeping insertion order within each
+        by_section = {name: [] for name, _ in self.sections}
+        for i in sorted(selected):
+            by_section.setdefault(self.items[i].section, []).append(selected[i])
+
+        parts = []
+        for name, _ in self.sections:
+            if by_section[name]:
+                parts.append(f"\n\n{headings[name]}\n")
+                parts.append("\n".join(by_section[name]))
+
+        return PackedContext(
+            text="".join(parts).strip(),
+            used_tokens=self.token_budget - remaining,
+            token_budget=self.token_budget,
+            included=included,
+            truncated=truncated,
+            dropped=dropped
+        )
@@ -0,0 +1,229 @@
+"""
+Read paths for saved conversations.
+
+Turns are stored one item per question in the ConversationHistory table,
+keyed by userId (hash) and timestamp (range), with the ConversationIdIndex
+GSI keyed by conversationId and timestamp. Both reads here are Queries on
+those keys, never Scans, so their cost depends on the page size rather than
+on how much history a user has. Pages are continued with an opaque cursor
+that wraps DynamoDB's LastEvaluatedKey.
+"""
+import base64
+import binascii
+import gzip
+import json
+import os
+
+from conversation_store import conversation_title, decode_response
+from tracing import span
+
+HISTORY_PAGE_SIZE = int(os.environ.get('HISTORY_PAGE_SIZE', 50))
+HISTORY_MAX_PAGE_SIZE = 200
+CONVERSATION_INDEX = 'ConversationIdIndex'
+RESPONSE_COMPRESSION = os.environ.get('RESPONSE_COMPRESSION', 'true').lower() == 'true'
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.environ.get('RESPONSE_COMPRESSION_MIN_BYTES', 1024))
+# The API's only binary media type; API Gateway decodes a base64 body only for requests accepting it first
+COMPRESSED_MEDIA_TYPE = 'application/gzip'
+
+# Only the attributes the history list shows; question and response bodies stay in the table
+LIST_PROJECTION = 'conversationId, #ts, repoPath, title'
+TURN_PROJECTION = 'conversationId, #ts, repoPath, question, response, responseEncoding'
+# Turns saved before titles were stored are titled from their question, read only for them
+UNTITLED_PROJECTION = '#ts, question'
+BATCH_GET_MAX_KEYS = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(last_evaluated_key):
+    """Opaque, URL-safe cursor for a LastEvaluatedKey (None when there are no more pages)"""
+    if not last_evaluated_key:
+        return None
+    raw = json.dumps(last_evaluated_key, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, expected):
+    """
+    Decode a cursor into an ExclusiveStartKey. `expected` maps key attributes
+    to the values the query is bound to, so a cursor cannot move a query onto
+    another user's or conversation's items.
+    """
+    if not cursor:
+        return None
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(cursor + padding))
+    except (binascii.Error, ValueError) as e:
+        raise InvalidCursor(f"Invalid cursor: {str(e)}")
+    if not isinstance(key, dict) or not all(isinstance(value, str) for value in key.values()):
+        raise InvalidCursor("Invalid cursor")
+    for attribute, value in expected.items():
+        if key.get(attribute) != value:
+            raise InvalidCursor("Cursor does not belong to this query")
+    return key
+
+
+def page_size(value):
+    try:
+        limit = int(value) if value else HISTORY_PAGE_SIZE
+    except (TypeError, ValueError):
+        limit = HISTORY_PAGE_SIZE
+    return max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+
+
+def list_conversations(table, user_id, cursor=None, limit=None):
+    """
+    Return the user's most recent conversations, newest first, as
+    {'conversations': [...], 'nextCursor': ...}. One page covers `limit`
+    turns; turns of the same conversation are collapsed, so a conversation
+    continued across pages can appear on both and clients merge by
+    conversationId.
+    """
+    params = {
+        'KeyConditionExpression': 'userId = :userId',
+        'ExpressionAttributeValues': {':userId': user_id},
+        'ExpressionAttributeNames': {'#ts': 'timestamp'},
+        'ProjectionExpression': LIST_PROJECTION,
+        'ScanIndexForward': False,
+        'Limit': page_size(limit),
+    }
+    start_key = decode_cursor(cursor, {'userId': user_id})
+    if start_key:
+        params['ExclusiveStartKey'] = start_key
+
+    with span('dynamodb_query', index='table') as record:
+        response = table.query(**params)
+        record['items'] = len(response.get('Items', []))
+
+    conversations = {}
+    first_turns = {}  # conversationId -> timestamp of its earliest turn on the page
+    for item in response.get('Items', []):
+        conversation_id = item.get('conversationId')
+        conversation = conversations.get(conversation_id)
+        if conversation is None:
+            conversation = conversations[conversation_id] = {
+                'conversationId': conversation_id,
+                'repoPath': item.get('repoPath'),
+                'timestamp': item.get('timestamp'),
+                'turns': 0,
+            }
+        conversation['turns'] += 1
+        # Items are newest first, so the last title seen is from the earliest turn on the page
+        first_turns[conversation_id] = item.get('timestamp')
+        if item.get('title'):
+            conversation['title'] = item['title']
+
+    untitled = [conversation for conversation in conversations.values() if 'title' not in conversation]
+    if untitled:
+        add_question_titles(table, user_id, untitled, first_turns)
+
+    return {
+        'conversations': list(conversations.values()),
+        'nextCursor': encode_cursor(response.get('LastEvaluatedKey')),
+    }
+
+
+def add_question_titles(table, user_id, conversations, first_turns):
+    """
+    Title conversations saved without one from the question of their
+    earliest turn on the page, read with BatchGetItem. Titles that can't be
+    read are left out.
+    """
+    by_timestamp = {first_turns[c['conversationId']]: c for c in conversations}
+    keys = [{'userId': user_id, 'timestamp': timestamp} for timestamp in by_timestamp]
+    for i in range(0, len(keys), BATCH_GET_MAX_KEYS):
+        request = {table.name: {
+            'Keys': keys[i:i + BATCH_GET_MAX_KEYS],
+            'ProjectionExpression': UNTITLED_PROJECTION,
+            'ExpressionAttributeNames': {'#ts': 'timestamp'},
+        }}
+        try:
+            with span('dynamodb_batch_get', keys=len(request[table.name]['Keys'])):
+                response = table.meta.client.batch_get_item(RequestItems=request)
+        except Exception as e:
+            print(f"WARNING: Could not read questions to title {len(keys)} conversations: {str(e)}")
+            return
+        for item in response.get('Responses', {}).get(table.name, []):
+            conversation = by_timestamp.get(item.get('timestamp'))
+            if conversation is not None and item.get('question'):
+                conversation['title'] = conversation_title(item['question'])
+
+
+def get_conversation(table, user_id, conversation_id, cursor=None, limit=None):
+    """
+    Return one page of a conversation's turns in chronological order as
+    {'conversationId', 'repoPath', 'messages', 'nextCursor'}, or None if the
+    conversation does not exist or belongs to another user.
+    """
+    params = {
+        'IndexName': CONVERSATION_INDEX,
+        'KeyConditionExpression': 'conversationId = :conversationId',
+        'FilterExpression': 'userId = :userId',
+        'ExpressionAttributeValues': {':conversationId': conversation_id, ':userId': user_id},
+        'ExpressionAttributeNames': {'#ts': 'timestamp'},
+        'ProjectionExpression': TURN_PROJECTION,
+        'ScanIndexForward': True,
+        'Limit': page_size(limit),
+    }
+    start_key = decode_cursor(cursor, {'conversationId': conversation_id, 'userId': user_id})
+    if start_key:
+        params['ExclusiveStartKey'] = start_key
+
+    with span('dynamodb_query', index=CONVERSATION_INDEX) as record:
+        response = table.query(**params)
+        record['items'] = len(response.get('Items', []))
+
+    items = response.get('Items', [])
+    if not items and not cursor:
+        # A conversation's turns all share one userId, so an empty first page means it isn't the caller's
+        return None
+
+    messages = []
+    for item in items:
+        messages.append({'role': 'user', 'content': item.get('question', ''), 'timestamp': item.get('timestamp')})
+        messages.append({'role': 'assistant', 'content': decode_response(item), 'timestamp': item.get('timestamp')})
+
+    return {
+        'conversationId': conversation_id,
+        'repoPath': items[0].get('repoPath') if items else None,
+        'messages': messages,
+        'nextCursor': encode_cursor(response.get('LastEvaluatedKey')),
+    }
+
+
+def header(request_headers, name):
+    for key, value in (request_headers or {}).items():
+        if key.lower() == name:
+            return (value or '').lower()
+    return ''
+
+
+def accepts_gzip(request_headers):
+    """
+    Whether the client takes gzip content encoding and asks for the binary
+    media type first, so API Gateway returns the bytes rather than base64
+    """
+    first_accepted = header(request_headers, 'accept').split(',')[0].split(';')[0].strip()
+    return 'gzip' in header(request_headers, 'accept-encoding') and first_accepted == COMPRESSED_MEDIA_TYPE
+
+
+def compress_response(response, request_headers):
+    """
+    Gzip a JSON proxy response when the client accepts it and the body is
+    large enough to be worth it. API Gateway passes the body through as
+    binary because the request accepts COMPRESSED_MEDIA_TYPE, the API's
+    binary media type.
+    """
+    body = response.get('body') or ''
+    if not RESPONSE_COMPRESSION or len(body) < RESPONSE_COMPRESSION_MIN_BYTES or not accepts_gzip(request_headers):
+        return response
+    compressed = gzip.compress(body.encode('utf-8'), compresslevel=5)
+    return {
+        **response,
+        'headers': {**response.get('headers', {}), 'Content-Encoding': 'gzip', 'Vary': 'Accept-Encoding'},
+        'body': base64.b64encode(compressed).decode('ascii'),
+        'isBase64Encoded': True,
+    }
@@ -0,0 +1,280 @@
+"""
+Write-behind persistence for conversation turns.
+
+Chat handlers queue each turn with ConversationWriter.submit() and return
+without waiting for DynamoDB. The queue is written with BatchWriteItem, 25
+items per request, retrying throttled or unprocessed items with backoff.
+When it is flushed depends on CONVERSATION_WRITE_MODE:
+
+    extension  On Lambda. An internal Lambda extension thread flushes after
+               the handler has returned its response. Lambda does not freeze
+               the environment until the extension asks for the next event,
+               so the writes finish inside the invocation they belong to.
+    thread     In long-running processes (stream_server.py, local runs). A
+               background thread flushes shortly after each submit.
+    sync       Fallback. The handler flushes before returning, bounded by the
+               invocation's remaining time.
+
+Write counts, retries and failures are logged as CloudWatch metrics.
+"""
+import gzip
+import json
+import os
+import random
+import threading
+import time
+import traceback
+import urllib.request
+from collections import deque
+from datetime import datetime
+
+from tracing import debug, emit_metrics
+
+# "auto" picks extension on Lambda and thread elsewhere
+CONVERSATION_WRITE_MODE = os.environ.get('CONVERSATION_WRITE_MODE', 'auto').lower()
+CONVERSATION_WRITE_MAX_ATTEMPTS = int(os.environ.get('CONVERSATION_WRITE_MAX_ATTEMPTS', 5))
+# Responses at least this large are stored gzip-compressed (0 disables compression)
+CONVERSATION_COMPRESS_MIN_BYTES = int(os.environ.get('CONVERSATION_COMPRESS_MIN_BYTES', 16 * 1024))
+CONVERSATION_WRITE_BATCH_SIZE = 25  # BatchWriteItem limit
+CONVERSATION_WRITE_LINGER_SECONDS = 0.05  # Thread mode waits this long so turns arriving together share a batch
+CONVERSATION_FLUSH_MARGIN_SECONDS = 0.5  # Flushes stop this long before the invocation deadline
+CONVERSATION_TIMEZONE = 'US/Eastern'
+EXTENSION_NAME = 'conversation-writer'
+
+_timezone = None
+
+
+def conversation_timestamp():
+    """Current Eastern time as stored in the table's range key"""
+    global _timezone
+    if _timezone is None:
+        import pytz  # Only needed when saving, so kept off the import path
+        _timezone = pytz.timezone(CONVERSATION_TIMEZONE)
+    return datetime.now(_timezone).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def conversation_title(question):
+    """Title of a conversation: the start of its first question"""
+    return question[:50] + ('...' if len(question) > 50 else '')
+
+
+def build_item(user_id, conversation_id, repo_path, question, response, title=None):
+    """Build the ConversationHistory item for one turn, compressing a large response"""
+    item = {
+        'userId': user_id,
+        'timestamp': conversation_timestamp(),
+        'conversationId': conversation_id,
+        'repoPath': repo_path,
+        'question': question,
+        'response': response,
+    }
+    if title:
+        # Stored separately so the history list can project it instead of the full question
+        item['title'] = title
+    encoded = response.encode('utf-8')
+    if CONVERSATION_COMPRESS_MIN_BYTES and len(encoded) >= CONVERSATION_COMPRESS_MIN_BYTES:
+        item['response'] = gzip.compress(encoded, compresslevel=6)  # Stored as a Binary attribute
+        item['responseEncoding'] = 'gzip'
+    return item
+
+
+def decode_response(item):
+    """Return the response text of a stored item, decompressing it if needed"""
+    response = item.get('response', '')
+    if item.get('responseEncoding') == 'gzip':
+        data = response.value if hasattr(response, 'value') else response  # boto3 returns Binary
+        return gzip.decompress(bytes(data)).decode('utf-8')
+    return response
+
+
+def item_key(item):
+    return item['userId'], item['timestamp']
+
+
+class ConversationWriter:
+    """Queue of conversation items written to DynamoDB in batches off the request path"""
+
+    def __init__(self, get_table, mode, max_attempts=CONVERSATION_WRITE_MAX_ATTEMPTS):
+        self.get_table = get_table  # Returns the Table, or None if it can't be reached
+        self.mode = mode
+        self.max_attempts = max_attempts
+        self.pending = deque()  # [item, attempts]
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.invocations_done = threading.Semaphore(0)
+        self.thread = None
+
+    def start(self):
+        """Register the Lambda extension for extension mode, falling back to sync"""
+        if self.mode != 'extension':
+            return
+        runtime_api = os.environ.get('AWS_LAMBDA_RUNTIME_API')
+        try:
+            extension_id = register_extension(runtime_api)
+        except Exception as e:
+            print(f"WARNING: Could not register the {EXTENSION_NAME} extension, saving conversations synchronously: {str(e)}")
+            self.mode = 'sync'
+            return
+        self.thread = threading.Thread(target=self.run_extension, args=(runtime_api, extension_id), daemon=True)
+        self.thread.start()
+
+    def submit(self, item):
+        with self.lock:
+            self.pending.append([item, 0])
+        if self.mode == 'thread':
+            self.ensure_thread()
+            self.wakeup.set()
+
+    def invocation_done(self, context=None):
+        """Called once the handler has its response; flush now (sync) or let the extension flush"""
+        if self.mode == 'extension':
+            self.invocations_done.release()
+        elif self.mode == 'sync' and self.pending:
+            remaining_ms = context.get_remaining_time_in_millis() if context else None
+            self.flush(time.time() + remaining_ms / 1000 - CONVERSATION_FLUSH_MARGIN_SECONDS if remaining_ms else None)
+
+    def ensure_thread(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run_thread, daemon=True)
+                self.thread.start()
+
+    def run_thread(self):
+        while True:
+            self.wakeup.wait()
+            time.sleep(CONVERSATION_WRITE_LINGER_SECONDS)
+            self.wakeup.clear()
+            self.flush()
+            if self.pending:
+                # Items were put back for a later attempt
+                time.sleep(1)
+                self.wakeup.set()
+
+    def run_extension(self, runtime_api, extension_id):
+        """Extension event loop: after each invocation's response, flush before asking for the next event"""
+        while True:
+            try:
+                event = next_extension_event(runtime_api, extension_id)
+            except Exception as e:
+                print(f"ERROR: {EXTENSION_NAME} extension failed, saving conversations synchronously: {str(e)}")
+                traceback.print_exc()
+                self.mode = 'sync'
+                return
+            if event.get('eventType') != 'INVOKE':
+                continue
+            deadline = event.get('deadlineMs', (time.time() + 60) * 1000) / 1000 - CONVERSATION_FLUSH_MARGIN_SECONDS
+            self.invocations_done.acquire(timeout=max(0, deadline - time.time()))
+            if self.pending:
+                self.flush(deadline)
+
+    def flush(self, deadline=None):
+        """Write everything queued; items that still fail are retried on a later flush, up to max_attempts"""
+        with self.flush_lock:
+            with self.lock:
+                records = list(self.pending)
+                self.pending.clear()
+            if not records:
+                return
+
+            start_time = time.time()
+            table = self.get_table()
+            failed, retries = [], 0
+            for i in range(0, len(records), CONVERSATION_WRITE_BATCH_SIZE):
+                batch = records[i:i + CONVERSATION_WRITE_BATCH_SIZE]
+                if table is None:
+                    failed.extend(batch)
+                    continue
+                unwritten, batch_retries = self.write_batch(table, batch, deadline)
+                failed.extend(unwritten)
+                retries += batch_retries
+
+            dropped = []
+            for record in failed:
+                record[1] += 1
+                if record[1] < self.max_attempts:
+                    with self.lock:
+                        self.pending.append(record)
+                else:
+                    dropped.append(record[0])
+            for item in dropped:
+                print(f"ERROR: Giving up saving conversation {item['conversationId']} for user {item['userId']} "
+                      f"after {self.max_attempts} attempts")
+
+            debug(f"Saved {len(records) - len(failed)} of {len(records)} conversation turns")
+            emit_metrics({
+                'conversation_writes': len(records) - len(failed),
+                'conversation_write_retries': retries,
+                'conversation_write_deferred': len(failed) - len(dropped),
+                'conversation_write_failures': len(dropped),
+                'conversation_flush_ms': round((time.time() - start_time) * 1000, 1),
+            }, units={'conversation_flush_ms': 'Milliseconds'}, Mode=self.mode)
+
+    def write_batch(self, table, records, deadline):
+        """
+        BatchWriteItem one batch, resending unprocessed items with jittered
+        exponential backoff until they are written or the deadline is near.
+        Returns the records left unwritten and the number of retries.
+        """
+        # Like batch_writer(overwrite_by_pkeys=...): a batch may not contain one key twice
+        by_key = {}
+        for record in records:
+            by_key[item_key(record[0])] = record
+        remaining = list(by_key.values())
+
+        attempt = 0
+        while remaining:
+            try:
+                response = table.meta.client.batch_write_item(RequestItems={
+                    table.name: [{'PutRequest': {'Item': record[0]}} for record in remaining]
+                })
+                unprocessed = {
+                    item_key(request['PutRequest']['Item'])
+                    for request in response.get('UnprocessedItems', {}).get(table.name, [])
+                }
+                remaining = [record for record in remaining if item_key(record[0]) in unprocessed]
+            except Exception as e:
+                print(f"WARNING: Conversation batch write failed: {str(e)}")
+            if not remaining:
+                break
+
+            attempt += 1
+            delay = min(2.0, 0.05 * (2 ** attempt)) * random.uniform(0.5, 1.0)
+            if attempt >= self.max_attempts or (deadline and time.time() + delay >= deadline):
+                break
+            time.sleep(delay)
+        return remaining, attempt
+
+
+def register_extension(runtime_api):
+    """Register an internal extension for INVOKE events; returns its identifier"""
+    if not runtime_api:
+        raise RuntimeError("AWS_LAMBDA_RUNTIME_API is not set")
+    request = urllib.request.Request(
+        f"http://{runtime_api}/2020-01-01/extension/register",
+        data=json.dumps({'events': ['INVOKE']}).encode('utf-8'),
+        headers={'Lambda-Extension-Name': EXTENSION_NAME},
+        method='POST'
+    )
+    with urllib.request.urlopen(request, timeout=2) as response:
+        return response.headers['Lambda-Extension-Identifier']
+
+
+def next_extension_event(runtime_api, extension_id):
+    """Block until Lambda delivers the next event to the extension"""
+    request = urllib.request.Request(
+        f"http://{runtime_api}/2020-01-01/extension/event/next",
+        headers={'Lambda-Extension-Identifier': extension_id}
+    )
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def create_conversation_writer(get_table):
+    """Build and start the writer for the configured (or detected) mode"""
+    mode = CONVERSATION_WRITE_MODE
+    if mode == 'auto':
+        mode = 'extension' if os.environ.get('AWS_LAMBDA_RUNTIME_API') else 'thread'
+    writer = ConversationWriter(get_table, mode)
+    writer.start()
+    return writer
@@ -0,0 +1,229 @@
+"""
+Asyncio engine for the per-file GitHub fetches, with adaptive concurrency.
+
+Each fetch runs on its own event loop (one per invocation or ingestion job)
+and gates its requests on an AIMD limit instead of a fixed pool size: every
+healthy response raises the limit by 1/limit, so it grows by about one
+request per round of responses while latency stays within
+GITHUB_FETCH_LATENCY_TOLERANCE of the best seen, and a throttled response
+(403/429 primary or secondary rate limit) or a burst of errors halves it,
+at most once per round. The limit is kept between fetches, so a warm
+container starts where the last fetch left off.
+
+Requests still go through the pooled requests session of github_client, so
+the rate limit scheduler and connections are shared with every other call
+path; the blocking calls run on the engine's executor through
+loop.run_in_executor.
+"""
+import asyncio
+import functools
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from file_fetch import read_capped, body_cap, content_entry, READ_CHUNK_BYTES
+from github_client import (
+    github, RateLimitScheduler, RateLimitExceeded, GITHUB_FETCH_CONCURRENCY, GITHUB_FETCH_MAX_CONCURRENCY
+)
+from tracing import debug, span, propagate
+
+# Responses slower than this multiple of the best smoothed latency stop the limit from growing
+GITHUB_FETCH_LATENCY_TOLERANCE = float(os.environ.get('GITHUB_FETCH_LATENCY_TOLERANCE', 2.0))
+MIN_CONCURRENCY = 1
+DECREASE_FACTOR = 0.5
+LATENCY_SMOOTHING = 0.2
+ERROR_WINDOW = 20  # Recent responses the error rate is measured over
+ERROR_RATE_THRESHOLD = 0.2
+MIN_ERROR_SAMPLES = 5
+
+OK, THROTTLED, ERROR = 'ok', 'throttled', 'error'
+
+
+class AIMDLimit:
+    """
+    Additive-increase, multiplicative-decrease concurrency limit. Requests
+    take a ticket when they start; a decrease applies once to the round of
+    requests in flight when it happened, and their late responses don't
+    raise the limit again.
+    """
+
+    def __init__(self, initial, minimum, maximum, latency_tolerance):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.latency_tolerance = latency_tolerance
+        self.started = 0
+        self.decrease_mark = 0  # Tickets up to here belong to a round that was already backed off
+        self.latency = None  # Smoothed latency to response headers, in seconds
+        self.baseline = None  # Best smoothed latency of the current fetch
+        self.outcomes = deque(maxlen=ERROR_WINDOW)
+        self.lock = threading.Lock()
+        self.stats = {'increases': 0, 'decreases': 0, 'throttled': 0, 'errors': 0, 'peak': self.limit}
+
+    @property
+    def slots(self):
+        return int(self.limit)
+
+    def start_fetch(self):
+        """Forget latency and errors of earlier fetches; the limit itself carries over"""
+        with self.lock:
+            self.latency = None
+            self.baseline = None
+            self.outcomes.clear()
+
+    def begin(self):
+        """Ticket for a request that is about to start"""
+        with self.lock:
+            self.started += 1
+            return self.started
+
+    def record(self, ticket, outcome, latency=None):
+        with self.lock:
+            self.outcomes.append(outcome == ERROR)
+            if outcome == THROTTLED:
+                self.stats['throttled'] += 1
+                self.decrease(ticket)
+            elif outcome == ERROR:
+                self.stats['errors'] += 1
+                if len(self.outcomes) >= MIN_ERROR_SAMPLES and sum(self.outcomes) / len(self.outcomes) > ERROR_RATE_THRESHOLD:
+                    self.decrease(ticket)
+            else:
+                if latency is not None:
+                    self.latency = latency if self.latency is None else self.latency + LATENCY_SMOOTHING * (latency - self.latency)
+                    self.baseline = self.latency if self.baseline is None else min(self.baseline, self.latency)
+                healthy = self.baseline is None or self.latency <= self.baseline * self.latency_tolerance
+                if healthy and ticket > self.decrease_mark and self.limit < self.maximum:
+                    self.limit = min(self.maximum, self.limit + 1 / self.limit)
+                    self.stats['increases'] += 1
+                    self.stats['peak'] = max(self.stats['peak'], self.limit)
+
+    def decrease(self, ticket):
+        if ticket <= self.decrease_mark:
+            return
+        self.limit = max(self.minimum, self.limit * DECREASE_FACTOR)
+        self.decrease_mark = self.started
+        self.outcomes.clear()
+        self.stats['decreases'] += 1
+
+
+# Shared by the fetches of the process, so what one fetch learns carries over to the next
+fetch_limit = AIMDLimit(GITHUB_FETCH_CONCURRENCY, MIN_CONCURRENCY, GITHUB_FETCH_MAX_CONCURRENCY,
+                        GITHUB_FETCH_LATENCY_TOLERANCE)
+
+
+class FetchEngine:
+    """Per-file GitHub requests of one fetch, run on the current event loop within an AIMDLimit"""
+
+    def __init__(self, client=None, limit=None):
+        self.client = client or github
+        self.limit = limit or fetch_limit
+        self.executor = ThreadPoolExecutor(max_workers=self.limit.maximum)
+        self.in_flight = 0
+        self.gate = asyncio.Condition()
+
+    async def acquire(self):
+        async with self.gate:
+            await self.gate.wait_for(lambda: self.in_flight < self.limit.slots)
+            self.in_flight += 1
+        return self.limit.begin()
+
+    async def release(self):
+        async with self.gate:
+            self.in_flight -= 1
+            # The limit may have grown or shrunk while the request ran
+            self.gate.notify(max(0, self.limit.slots - self.in_flight))
+
+    async def call(self, fn, *args):
+        """Run a blocking call on the engine's executor, within the current trace"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(propagate(fn), *args))
+
+    async def fetch_file(self, repo_path, path, info, ref, budget=None):
+        """
+        Fetch one file at `ref` once a slot is free. Returns the
+        file_contents entry, {"binary": True, ...} for binary content, or
+        None if the request failed or `budget` was spent first.
+        """
+        ticket = await self.acquire()
+        try:
+            with span('file', path=path) as file_span:
+                content = await self.call(self.read_file, ticket, repo_path, path, info, ref, budget)
+                file_span['bytes'] = content["size"] if content else 0
+                return content
+        finally:
+            await self.release()
+
+    def read_file(self, ticket, repo_path, path, info, ref, budget):
+        """Stream one file's raw content from the Contents API, keeping at most the capped head"""
+        if budget is not None and budget.spent:
+            return None
+        url = f"/repos/{repo_path}/contents/{path}" + (f"?ref={ref}" if ref else "")
+        file_size = info.get('size', 0)
+        try:
+            with self.client.get(url, accept="application/vnd.github.raw", timeout=15, stream=True) as response:
+                self.record(ticket, response)
+                if response.status_code != 200:
+                    return None
+                body = read_capped(response.iter_content(READ_CHUNK_BYTES), body_cap(file_size), budget)
+        except RateLimitExceeded as e:
+            self.limit.record(ticket, THROTTLED)
+            print(f"WARNING: Skipping {path}: {str(e)}")
+            return None
+        except Exception as e:
+            self.limit.record(ticket, ERROR)
+            print(f"ERROR: Failed to fetch content for {path}: {str(e)}")
+            return None
+
+        if body.binary:
+            debug(f"Skipping binary file {path}")
+            return {"name": info.get("name"), "binary": True, "size": 0, "sha": info.get("sha")}
+        if body.cancelled or (budget is not None and not budget.charge(len(body.data))):
+            return None
+        return content_entry(info, body, file_size, path)
+
+    def record(self, ticket, response):
+        # `throttled` also counts a rate limited response the client retried past
+        if response.throttled or RateLimitScheduler.is_rate_limited(response):
+            self.limit.record(ticket, THROTTLED)
+        elif response.status_code >= 500:
+            self.limit.record(ticket, ERROR)
+        else:
+            # With stream=True, elapsed is the time to the response headers, whatever the body size
+            self.limit.record(ticket, OK, response.elapsed.total_seconds())
+
+    async def fetch_files(self, repo_path, files, ref, budget=None):
+        """
+        Fetch (path, info) pairs at `ref`, the commit their tree was listed
+        at, best first, and return {path: content} in completion order. Once `budget` is spent, queued requests are
+        cancelled and requests in flight stop reading.
+        """
+        self.limit.start_fetch()
+        tasks = {asyncio.ensure_future(self.fetch_file(repo_path, path, info, ref, budget)): path for path, info in files}
+        results = {}
+        try:
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    results[tasks[task]] = task.result()
+                if budget is not None and budget.spent:
+                    break
+        finally:
+            if budget is not None:
+                budget.stop()
+            for task in tasks:
+                task.cancel()
+            # Don't wait for the rest: requests in flight bail out at their next chunk
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        return results
+
+
+def fetch_files(repo_path, files, ref, budget=None):
+    """Run FetchEngine.fetch_files on a new event loop; call from a thread without a running loop"""
+    async def run():
+        engine = FetchEngine()
+        results = await engine.fetch_files(repo_path, files, ref, budget)
+        debug(f"Fetched {len(results)} files, concurrency limit now {engine.limit.limit:.1f} ({engine.limit.stats})")
+        return results
+    return asyncio.run(run())
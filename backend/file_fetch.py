@@ -0,0 +1,109 @@
+"""
+Streaming reads of file bodies for the content fetch.
+
+Bodies are read in chunks rather than downloaded whole: a file is cut off at
+its byte cap (keeping only the head of very large files), binary content is
+recognized from the first chunk and abandoned, and every worker of one fetch
+stops as soon as the fetch's shared FetchBudget is spent. Leaving a response
+early closes its connection instead of draining it.
+"""
+import threading
+from collections import namedtuple
+
+from blob_store import git_blob_sha
+
+MAX_FILE_BYTES = 10 * 1024 * 1024  # Larger files are truncated
+TRUNCATED_FILE_BYTES = 100000  # Head kept of a truncated file
+BINARY_SNIFF_BYTES = 8000  # Like git, a NUL byte in the first 8000 bytes means binary
+READ_CHUNK_BYTES = 64 * 1024
+TRUNCATION_NOTICE = "\n\n[FILE TRUNCATED] This file was too large to display completely."
+
+# data is None when the body was binary or the read was cancelled
+Body = namedtuple('Body', ['data', 'truncated', 'binary', 'cancelled'])
+
+
+class FetchBudget:
+    """Byte and file budget shared by the workers of one content fetch"""
+
+    def __init__(self, max_bytes, max_files):
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.bytes = 0
+        self.files = 0
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def charge(self, size):
+        """Account for one fetched file; returns False if the budget was already spent"""
+        with self.lock:
+            if self.stopped.is_set():
+                return False
+            self.bytes += size
+            self.files += 1
+            if self.bytes >= self.max_bytes or self.files >= self.max_files:
+                self.stopped.set()
+            return True
+
+    def stop(self):
+        self.stopped.set()
+
+    @property
+    def spent(self):
+        return self.stopped.is_set()
+
+
+def read_capped(chunks, cap, budget=None):
+    """
+    Read an iterable of byte chunks into a Body of at most `cap` bytes,
+    stopping early on binary content or when `budget` is spent. The caller
+    closes the underlying stream.
+    """
+    data = bytearray()
+    for chunk in chunks:
+        if budget is not None and budget.spent:
+            return Body(None, False, False, True)
+        if not chunk:
+            continue
+        if len(data) < BINARY_SNIFF_BYTES and b'\0' in chunk[:BINARY_SNIFF_BYTES - len(data)]:
+            return Body(None, False, True, False)
+        data += chunk
+        if len(data) > cap:
+            return Body(bytes(data[:cap]), True, False, False)
+    return Body(bytes(data), False, False, False)
+
+
+def file_chunks(fileobj, chunk_bytes=READ_CHUNK_BYTES):
+    """Iterate over a file-like object in chunks"""
+    return iter(lambda: fileobj.read(chunk_bytes), b'')
+
+
+def body_cap(declared_size):
+    """Byte cap for a file GitHub reports as `declared_size` bytes"""
+    return TRUNCATED_FILE_BYTES if declared_size > MAX_FILE_BYTES else MAX_FILE_BYTES
+
+
+def content_entry(info, body, declared_size, path=None):
+    """
+    The file_contents entry for a complete or truncated body. A complete
+    body is keyed by the SHA of its bytes, so content read from a different
+    commit than the tree can't be stored under the tree's blob SHA.
+    """
+    content = body.data.decode('utf-8', errors='replace')
+    if body.truncated:
+        return {
+            "name": info.get("name"),
+            "content": content + TRUNCATION_NOTICE,
+            "truncated": True,
+            "size": max(declared_size, len(body.data)),
+            "sha": info.get("sha"),
+        }
+    sha = git_blob_sha(body.data)
+    if info.get("sha") and info["sha"] != sha:
+        print(f"WARNING: Content of {path or info.get('name')} doesn't match blob {info['sha']}, keeping it as {sha}")
+    return {
+        "name": info.get("name"),
+        "content": content,
+        "truncated": False,
+        "size": len(body.data),
+        "sha": sha,
+    }
@@ -0,0 +1,437 @@
+"""
+Ranking of repository files for content fetching.
+
+A file's score is the sum of weighted signals. Most signals only depend on
+one part of the path, so they are registered by the key they read and
+evaluated once per distinct key rather than once per file:
+
+    extension  The interned extension of a FileTree row (source, docs and
+               config types; the repository's primary language)
+    name       The lowercased file name (entry points such as setup.py or
+               package.json, READMEs, tests, lockfiles, generated code)
+    directory  The parent directory (depth, test/vendor/generated trees)
+    size       The size in half megabytes, for files of at least 512KB
+    hint       A path named by the ranking hints (import-graph centrality,
+               entry points found in file contents)
+    file       Any row; called for every candidate, so only for signals that
+               fit none of the above (none are built in)
+
+Import centrality and content-declared entry points come from ranking hints:
+the in-degree of each file in the import graph of the previously fetched
+contents, and the targets of package.json `main`/`bin` and Python console
+scripts. They are built after each fetch, stored with the snapshot and used
+the next time the repository is ranked.
+
+Selection is a streaming top-K: one pass over the files keeps a min-heap of
+the best candidates within the file count and byte budget, instead of
+sorting every file.
+"""
+import heapq
+import json
+import math
+import os
+import posixpath
+import re
+import threading
+import traceback
+from collections import Counter, OrderedDict
+
+from file_tree import TYPE_CODES, as_file_tree
+from tracing import debug
+
+# Signal weights; FILE_RANKING_WEIGHTS (JSON object) overrides individual ones
+RANKING_WEIGHTS = {
+    'extension': 1.0,  # Multiplies EXTENSION_SCORES
+    'language': 4.0,  # Extensions of the repository's primary language
+    'entry_point': 8.0,
+    'name': 1.0,  # Multiplies NAME_SCORES
+    'top_level': 3.0,
+    'depth': 0.5,  # Per directory level below the first
+    'test': 8.0,
+    'vendor': 15.0,
+    'generated': 12.0,
+    'size': 2.0,  # Per MB, for files of at least SIZE_PENALTY_MIN_BYTES
+    'centrality': 3.0,  # Per doubling of a file's import in-degree
+}
+try:
+    RANKING_WEIGHTS.update(json.loads(os.environ.get('FILE_RANKING_WEIGHTS') or '{}'))
+except ValueError:
+    print("WARNING: FILE_RANKING_WEIGHTS is not a JSON object, using the default ranking weights")
+
+# Signals only demote files by default; set a threshold to never fetch files scoring below it
+# (vendored, generated, lockfiles), even when the budget has room
+FILE_RANKING_MIN_SCORE = float(os.environ.get('FILE_RANKING_MIN_SCORE', '-inf'))
+SIZE_PENALTY_MIN_BYTES = 512 * 1024
+MAX_DEPTH_PENALTY_LEVELS = 8
+MAX_IMPORT_DEGREE = 64  # In-degrees are capped so one hub file can't outrank everything
+MAX_HINTED_IMPORTS = 2000  # Most-imported files kept in a snapshot's ranking hints
+MAX_CACHED_NAMES = 50000  # File names repeat (index.js, __init__.py), but a tree can have millions of distinct ones
+RANKING_HINTS_MAX_REPOS = 256  # Repositories whose latest hints are kept in process
+
+EXTENSION_SCORES = {
+    **dict.fromkeys(['.py', '.js', '.mjs', '.cjs', '.ts', '.jsx', '.tsx', '.java', '.go', '.rs', '.rb', '.php',
+                     '.c', '.h', '.cc', '.cpp', '.hpp', '.cs', '.kt', '.swift', '.scala', '.sh'], 10),
+    **dict.fromkeys(['.md', '.rst'], 10),
+    **dict.fromkeys(['.html', '.css', '.yml', '.yaml', '.json', '.toml', '.cfg', '.ini', '.sql', '.proto'], 6),
+    '.txt': 2,
+    '': 2,  # LICENSE, scripts; Makefile and Dockerfile score as entry points
+}
+# Extensions not listed above (.ex, .vue, .dart, .lua, ...) are likely source in a language we don't know
+UNKNOWN_EXTENSION_SCORE = 6
+NAME_SCORES = {'readme': 8, 'contributing': 4, 'license': 3, 'changelog': 2}  # Matched against the file stem
+
+# Build, packaging and program entry points in any language
+ENTRY_POINT_NAMES = frozenset([
+    'setup.py', 'setup.cfg', 'pyproject.toml', 'requirements.txt', 'package.json', 'dockerfile',
+    'docker-compose.yml', 'docker-compose.yaml', 'makefile', 'cmakelists.txt', 'go.mod', 'cargo.toml',
+    'pom.xml', 'build.gradle', 'build.gradle.kts', 'gemfile', 'composer.json',
+])
+# Per-language rules, keyed by GitHub's primary language name
+LANGUAGE_RULES = {
+    'Python': {'extensions': ('.py',), 'entry_points': ('__main__.py', 'main.py', 'app.py', 'manage.py', 'wsgi.py', 'asgi.py', 'cli.py')},
+    'JavaScript': {'extensions': ('.js', '.mjs', '.cjs', '.jsx'), 'entry_points': ('index.js', 'main.js', 'app.js', 'server.js')},
+    'TypeScript': {'extensions': ('.ts', '.tsx'), 'entry_points': ('index.ts', 'main.ts', 'app.ts', 'server.ts', 'tsconfig.json')},
+    'Go': {'extensions': ('.go',), 'entry_points': ('main.go',)},
+    'Rust': {'extensions': ('.rs',), 'entry_points': ('main.rs', 'lib.rs')},
+    'Java': {'extensions': ('.java',), 'entry_points': ('application.java', 'main.java')},
+    'Kotlin': {'extensions': ('.kt',), 'entry_points': ('application.kt', 'main.kt')},
+    'Ruby': {'extensions': ('.rb',), 'entry_points': ('config.ru', 'rakefile')},
+    'PHP': {'extensions': ('.php',), 'entry_points': ('index.php', 'artisan')},
+    'C': {'extensions': ('.c', '.h'), 'entry_points': ('main.c',)},
+    'C++': {'extensions': ('.cc', '.cpp', '.hpp', '.h'), 'entry_points': ('main.cc', 'main.cpp')},
+    'C#': {'extensions': ('.cs',), 'entry_points': ('program.cs', 'startup.cs')},
+    'Swift': {'extensions': ('.swift',), 'entry_points': ('main.swift', 'package.swift')},
+}
+
+TEST_DIRS = frozenset(['test', 'tests', '__tests__', 'spec', 'specs', 'testing', 'testdata', 'fixtures', '__mocks__', 'e2e'])
+VENDOR_DIRS = frozenset(['vendor', 'node_modules', 'third_party', 'thirdparty', 'third-party', 'external',
+                         'bower_components', 'site-packages', 'venv', '.venv'])
+GENERATED_DIRS = frozenset(['dist', 'build', 'out', 'target', 'generated', '__generated__', '.next', 'coverage', '_build'])
+TEST_NAMES = frozenset(['conftest.py', 'jest.config.js', 'pytest.ini', 'tox.ini'])
+TEST_NAME_PREFIXES = ('test_',)
+TEST_NAME_SUFFIXES = ('_test.py', '_test.go', '_spec.rb', '_test.rb', '.test.js', '.test.ts', '.test.jsx', '.test.tsx',
+                      '.spec.js', '.spec.ts', '.spec.jsx', '.spec.tsx', 'test.java', 'tests.java', 'test.kt', 'tests.cs')
+GENERATED_NAME_SUFFIXES = ('.min.js', '.min.css', '.map', '_pb2.py', '_pb2_grpc.py', '.pb.go', '.generated.ts', '.g.dart', '.bundle.js')
+LOCKFILE_NAMES = frozenset(['package-lock.json', 'yarn.lock', 'pnpm-lock.yaml', 'poetry.lock', 'pipfile.lock', 'cargo.lock',
+                            'gemfile.lock', 'composer.lock', 'go.sum'])
+
+SIGNALS = {'extension': [], 'name': [], 'directory': [], 'size': [], 'hint': [], 'file': []}
+
+
+def signal(kind):
+    """
+    Register a scoring function. Signals of every kind but "file" are called
+    as fn(key, ranker) once per distinct key; file signals as
+    fn(row, path, ranker) for every candidate file.
+    """
+    def register(fn):
+        SIGNALS[kind].append(fn)
+        return fn
+    return register
+
+
+# Built-in signals
+
+@signal('extension')
+def extension_signal(extension, ranker):
+    return ranker.weights['extension'] * EXTENSION_SCORES.get(extension, UNKNOWN_EXTENSION_SCORE)
+
+
+@signal('extension')
+def language_signal(extension, ranker):
+    return ranker.weights['language'] if extension in ranker.rule.get('extensions', ()) else 0
+
+
+@signal('name')
+def name_signal(name, ranker):
+    score = 0
+    if name in ENTRY_POINT_NAMES or name in ranker.rule.get('entry_points', ()):
+        score += ranker.weights['entry_point']
+    stem = name.split('.', 1)[0]
+    score += ranker.weights['name'] * NAME_SCORES.get(stem, 0)
+    if name in TEST_NAMES or name.startswith(TEST_NAME_PREFIXES) or name.endswith(TEST_NAME_SUFFIXES):
+        score -= ranker.weights['test']
+    if name in LOCKFILE_NAMES or name.endswith(GENERATED_NAME_SUFFIXES):
+        score -= ranker.weights['generated']
+    return score
+
+
+@signal('directory')
+def directory_signal(directory, ranker):
+    if not directory:
+        return ranker.weights['top_level']
+    parts = directory.lower().split('/')
+    score = -ranker.weights['depth'] * min(len(parts) - 1, MAX_DEPTH_PENALTY_LEVELS)
+    segments = set(parts)
+    if not segments.isdisjoint(VENDOR_DIRS):
+        score -= ranker.weights['vendor']
+    if not segments.isdisjoint(GENERATED_DIRS):
+        score -= ranker.weights['generated']
+    if not segments.isdisjoint(TEST_DIRS):
+        score -= ranker.weights['test']
+    return score
+
+
+@signal('size')
+def size_signal(half_megabytes, ranker):
+    return -ranker.weights['size'] / 2 * half_megabytes
+
+
+@signal('hint')
+def hint_signal(path, ranker):
+    score = 0
+    degree = ranker.imports.get(path)
+    if degree:
+        score += ranker.weights['centrality'] * math.log2(1 + min(degree, MAX_IMPORT_DEGREE))
+    if path in ranker.entry_points:
+        score += ranker.weights['entry_point']
+    return score
+
+
+class FileRanker:
+    """Scores the files of one FileTree and selects the best of them"""
+
+    def __init__(self, file_structure, repo_info=None, hints=None, weights=None, signals=None):
+        self.tree = as_file_tree(file_structure)
+        self.weights = {**RANKING_WEIGHTS, **(weights or {})}
+        self.rule = LANGUAGE_RULES.get((repo_info or {}).get('language'), {})
+        self.imports = (hints or {}).get('imports') or {}
+        self.entry_points = frozenset((hints or {}).get('entry_points') or ())
+        self.signals = signals or SIGNALS
+        # Lookup tables: extension ID -> score is complete, directories and names fill in as they are seen
+        self.extension_scores = [self.key_score('extension', extension) for extension in self.tree.extensions]
+        self.directory_scores = {}
+        self.name_scores = {}
+        self.size_scores = {}
+        self.hint_scores = {path: self.key_score('hint', path) for path in set(self.imports) | self.entry_points}
+
+    def key_score(self, kind, key):
+        score = 0
+        for fn in self.signals[kind]:
+            score += fn(key, self)
+        return score
+
+    def directory_score(self, directory):
+        score = self.directory_scores.get(directory)
+        if score is None:
+            score = self.directory_scores[directory] = self.key_score('directory', directory)
+        return score
+
+    def name_score(self, name):
+        score = self.name_scores.get(name)
+        if score is None:
+            score = self.key_score('name', name)
+            if len(self.name_scores) < MAX_CACHED_NAMES:
+                self.name_scores[name] = score
+        return score
+
+    def score(self, row):
+        path = self.tree.paths[row]
+        slash = path.rfind('/')
+        score = self.extension_scores[self.tree.ext_ids[row]]
+        score += self.directory_score(path[:slash] if slash >= 0 else '')
+        score += self.name_score(path[slash + 1:].lower())
+        half_megabytes = self.tree.sizes[row] // SIZE_PENALTY_MIN_BYTES
+        if half_megabytes:
+            size_score = self.size_scores.get(half_megabytes)
+            if size_score is None:
+                size_score = self.size_scores[half_megabytes] = self.key_score('size', half_megabytes)
+            score += size_score
+        if path in self.hint_scores:
+            score += self.hint_scores[path]
+        for fn in self.signals['file']:
+            score += fn(row, path, self)
+        return score
+
+    def top(self, limit, byte_budget, exclude_suffixes=(), min_score=FILE_RANKING_MIN_SCORE):
+        """
+        The highest-scoring files as (path, entry, score) tuples, best first:
+        at most `limit` files, together at most `byte_budget` bytes. Files
+        scoring below `min_score`, larger than the budget, or ending with one
+        of `exclude_suffixes` are never selected.
+        """
+        tree = self.tree
+        excluded = set(tree.rows_with_suffixes(exclude_suffixes)) if exclude_suffixes else ()
+        sizes = tree.sizes
+        score = self.score
+        heap = []  # (score, -row, size); the root is the weakest candidate, later rows losing ties
+        total = 0
+        for row in tree.rows_of_type('file'):
+            size = sizes[row]
+            if size > byte_budget or row in excluded:
+                continue
+            candidate = (score(row), -row, size)
+            if candidate[0] < min_score:
+                continue
+            # A candidate that would be the first evicted is not pushed at all
+            if heap and (len(heap) >= limit or total + size > byte_budget) and candidate < heap[0]:
+                continue
+            heapq.heappush(heap, candidate)
+            total += size
+            while len(heap) > limit or total > byte_budget:
+                total -= heapq.heappop(heap)[2]
+
+        heap.sort(reverse=True)
+        return [(tree.paths[-negative_row], tree.entry(-negative_row), round(score, 2)) for score, negative_row, _ in heap]
+
+
+def rank_files(file_structure, limit, byte_budget, exclude_suffixes=(), repo_info=None, hints=None):
+    """Select the files whose contents to fetch; see FileRanker.top()"""
+    return FileRanker(file_structure, repo_info, hints).top(limit, byte_budget, exclude_suffixes)
+
+
+# Ranking hints from fetched file contents
+
+PYTHON_IMPORT_PATTERN = re.compile(r"^[ \t]*(?:from[ \t]+(\.*[\w.]*)[ \t]+import[ \t]+([\w., \t()*]+)|import[ \t]+([\w., \t]+))", re.MULTILINE)
+JS_IMPORT_PATTERN = re.compile(r"""(?:\bfrom\s*|\brequire\(\s*|\bimport\(\s*|^\s*import\s+)['"](\.{1,2}/[^'"]+)['"]""", re.MULTILINE)
+CONSOLE_SCRIPT_PATTERN = re.compile(r"""^\s*['"]?[\w.-]+['"]?\s*=\s*['"]?([\w.]+):[\w.]+""", re.MULTILINE)
+JS_EXTENSIONS = ('.js', '.mjs', '.cjs', '.jsx', '.ts', '.tsx')
+JS_RESOLVE_SUFFIXES = ('', '.js', '.ts', '.jsx', '.tsx', '.mjs', '/index.js', '/index.ts', '/index.jsx', '/index.tsx')
+PYTHON_SOURCE_ROOTS = frozenset(['src', 'lib', 'python'])
+
+
+class ImportResolver:
+    """Maps import statements of a file to paths in the tree"""
+
+    def __init__(self, tree):
+        self.tree = tree
+        self._modules = None
+
+    @property
+    def modules(self):
+        """Dotted Python module name -> path, including names relative to a src/ or lib/ root"""
+        if self._modules is None:
+            modules = {}
+            for row in self.tree.rows_with_suffixes(['.py'], 'file'):
+                path = self.tree.paths[row]
+                parts = path[:-3].split('/')
+                if parts[-1] == '__init__':
+                    parts.pop()
+                for start in range(len(parts)):
+                    if start and parts[start - 1] not in PYTHON_SOURCE_ROOTS:
+                        break
+                    if parts[start:]:
+                        modules.setdefault('.'.join(parts[start:]), path)
+            self._modules = modules
+        return self._modules
+
+    def python_module(self, module):
+        return self.modules.get(module)
+
+    def python_imports(self, path, content):
+        package = path.rsplit('/', 1)[0].replace('/', '.') if '/' in path else ''
+        targets = []
+        for from_module, names, modules in PYTHON_IMPORT_PATTERN.findall(content):
+            if modules:
+                for module in modules.split(','):
+                    module = module.split()[0] if module.split() else ''
+                    targets.append(self.python_module(module))
+                continue
+            level = len(from_module) - len(from_module.lstrip('.'))
+            module = from_module[level:]
+            if level:
+                base = package.split('.') if package else []
+                base = base[:len(base) - (level - 1)] if level > 1 else base
+                module = '.'.join(base + ([module] if module else []))
+            # "from package import module" imports a module; otherwise the names come from `module`
+            resolved = None
+            for name in names.replace('(', ' ').replace(')', ' ').split(','):
+                name = name.split()[0] if name.split() else ''
+                if name and name != '*':
+                    resolved = self.python_module(f"{module}.{name}" if module else name) or resolved
+                    if resolved:
+                        targets.append(resolved)
+            if not resolved and module:
+                targets.append(self.python_module(module))
+        return targets
+
+    def js_imports(self, path, content):
+        directory = posixpath.dirname(path)
+        targets = []
+        for specifier in JS_IMPORT_PATTERN.findall(content):
+            targets.append(self.js_path(posixpath.normpath(posixpath.join(directory, specifier))))
+        return targets
+
+    def js_path(self, base):
+        for suffix in JS_RESOLVE_SUFFIXES:
+            candidate = base + suffix
+            if candidate in self.tree.rows and self.tree.types[self.tree.rows[candidate]] == TYPE_CODES['file']:
+                return candidate
+        return None
+
+    def imports(self, path, content):
+        lowered = path.lower()
+        if lowered.endswith('.py'):
+            return self.python_imports(path, content)
+        if lowered.endswith(JS_EXTENSIONS):
+            return self.js_imports(path, content)
+        return []
+
+
+def package_entry_points(resolver, path, content):
+    """Files named by package.json `main`, `module` and `bin`"""
+    try:
+        package = json.loads(content)
+    except ValueError:
+        return []
+    if not isinstance(package, dict):
+        return []
+    specifiers = [package.get('main'), package.get('module')]
+    bin_field = package.get('bin')
+    specifiers += list(bin_field.values()) if isinstance(bin_field, dict) else [bin_field]
+    directory = posixpath.dirname(path)
+    return [
+        resolver.js_path(posixpath.normpath(posixpath.join(directory, specifier)))
+        for specifier in specifiers if isinstance(specifier, str) and specifier
+    ]
+
+
+def build_ranking_hints(file_structure, file_contents):
+    """
+    Ranking hints for the next fetch of this repository, from the contents
+    fetched now: import in-degrees ({path: count}, most imported first) and
+    entry points declared in package manifests.
+    """
+    try:
+        resolver = ImportResolver(as_file_tree(file_structure))
+        imports = Counter()
+        entry_points = set()
+        for path, file_content in file_contents.items():
+            content = file_content.get('content') or ''
+            name = path.rsplit('/', 1)[-1].lower()
+            if name == 'package.json':
+                entry_points.update(package_entry_points(resolver, path, content))
+            elif name in ('setup.py', 'setup.cfg', 'pyproject.toml'):
+                entry_points.update(resolver.python_module(module) for module in CONSOLE_SCRIPT_PATTERN.findall(content))
+            imports.update({target for target in resolver.imports(path, content) if target and target != path})
+        entry_points.discard(None)
+        return {
+            'imports': dict(imports.most_common(MAX_HINTED_IMPORTS)),
+            'entry_points': sorted(entry_points),
+        }
+    except Exception as e:
+        print(f"ERROR: Failed to build ranking hints: {str(e)}")
+        traceback.print_exc()
+        return {}
+
+
+# The latest hints per repository, for full fetches that have no base snapshot at hand
+_recent_hints = OrderedDict()
+_recent_hints_lock = threading.Lock()
+
+
+def remember_hints(repo_path, hints):
+    if not hints:
+        return
+    with _recent_hints_lock:
+        _recent_hints[repo_path.lower()] = hints
+        _recent_hints.move_to_end(repo_path.lower())
+        while len(_recent_hints) > RANKING_HINTS_MAX_REPOS:
+            _recent_hints.popitem(last=False)
+    debug(f"Ranking hints for {repo_path}: {len(hints.get('imports', {}))} imported files, "
+          f"{len(hints.get('entry_points', []))} entry points")
+
+
+def recall_hints(repo_path):
+    with _recent_hints_lock:
+        return _recent_hints.get(repo_path.lower())
@@ -0,0 +1,246 @@
+"""
+Compact, array-backed store for a repository's file structure.
+
+A snapshot used to keep one dict per path, each repeating the name, type,
+size, SHA and full html_url. FileTree keeps one row per path in parallel
+arrays instead: the path string, a type code, the size, an interned
+extension ID and the blob SHA as 20 raw bytes. Names and URLs are derived on
+demand. Rows are indexed by extension and by depth as they are added, so
+finding media files or top-level entries doesn't scan every path.
+
+FileTree is a MutableMapping of path -> entry dict, so code written for the
+old dict of dicts keeps working; entries are built per lookup, so mutating a
+returned entry does not change the tree (use set_size()).
+"""
+import base64
+from array import array
+from collections.abc import MutableMapping
+from itertools import compress
+
+TYPES = ('file', 'dir', 'symlink', 'submodule')
+TYPE_CODES = {name: code for code, name in enumerate(TYPES)}
+REMOVED = 255  # Type code of a deleted row; rows are reclaimed by copy()
+NO_SHA = bytes(20)
+# bytes.translate tables mapping one type code to 1 and every other byte to 0
+TYPE_MASKS = {code: bytes(int(value == code) for value in range(256)) for code in range(len(TYPES))}
+
+
+def path_extension(path):
+    """Lowercased extension of the last path component including the dot, or '' if it has none"""
+    dot = path.rfind('.')
+    return path[dot:].lower() if dot > path.rfind('/') + 1 else ''
+
+
+class FileTree(MutableMapping):
+    """File structure of one repository at one ref"""
+
+    def __init__(self, repo_path='', ref=''):
+        self.repo_path = repo_path
+        self.ref = ref
+        self.paths = []  # row -> path
+        self.rows = {}  # path -> row
+        self.types = bytearray()
+        self.sizes = array('q')
+        self.ext_ids = array('I')
+        self.shas = bytearray()  # 20 bytes per row
+        self.extensions = ['']  # ext_id -> extension
+        self.extension_ids = {'': 0}
+        # Row indexes; they keep rows that are later removed, so readers skip REMOVED types
+        self.by_extension = {}  # ext_id -> rows
+        self.by_depth = {}  # number of "/" in the path -> rows
+
+    # Row storage
+
+    def add(self, path, item_type, size=0, sha=None):
+        """Add or replace the entry for `path`"""
+        type_code = TYPE_CODES.get(item_type, 0)
+        sha_bytes = bytes.fromhex(sha) if sha and len(sha) == 40 else NO_SHA
+        row = self.rows.get(path)
+        if row is not None:
+            self.types[row] = type_code
+            self.sizes[row] = size or 0
+            self.shas[row * 20:row * 20 + 20] = sha_bytes
+            return
+        row = len(self.paths)
+        self.rows[path] = row
+        self.paths.append(path)
+        self.types.append(type_code)
+        self.sizes.append(size or 0)
+        self.shas += sha_bytes
+        self.index_row(row, path)
+
+    def index_row(self, row, path):
+        extension = path_extension(path)
+        ext_id = self.extension_ids.get(extension)
+        if ext_id is None:
+            ext_id = self.extension_ids[extension] = len(self.extensions)
+            self.extensions.append(extension)
+        self.ext_ids.append(ext_id)
+
+        rows = self.by_extension.get(ext_id)
+        if rows is None:
+            rows = self.by_extension[ext_id] = array('I')
+        rows.append(row)
+        depth = path.count('/')
+        rows = self.by_depth.get(depth)
+        if rows is None:
+            rows = self.by_depth[depth] = array('I')
+        rows.append(row)
+
+    def set_size(self, path, size):
+        self.sizes[self.rows[path]] = size
+
+    def sha(self, row):
+        sha = bytes(self.shas[row * 20:row * 20 + 20])
+        return None if sha == NO_SHA else sha.hex()
+
+    def html_url(self, row):
+        url_kind = "tree" if self.types[row] == TYPE_CODES['dir'] else "blob"
+        return f"https://github.com/{self.repo_path}/{url_kind}/{self.ref}/{self.paths[row]}"
+
+    def entry(self, row):
+        """The dict-of-dicts entry for a row"""
+        path = self.paths[row]
+        return {
+            "name": path.rsplit('/', 1)[-1],
+            "path": path,
+            "type": TYPES[self.types[row]],
+            "size": self.sizes[row],
+            "sha": self.sha(row),
+            "html_url": self.html_url(row),
+        }
+
+    def copy(self):
+        """Independent copy; deleted rows are compacted away"""
+        tree = FileTree(self.repo_path, self.ref)
+        if len(self.rows) != len(self.paths):
+            for path, row in self.rows.items():
+                tree.add(path, TYPES[self.types[row]], self.sizes[row], self.sha(row))
+            return tree
+        tree.paths = list(self.paths)
+        tree.rows = dict(self.rows)
+        tree.types = bytearray(self.types)
+        tree.sizes = array('q', self.sizes)
+        tree.ext_ids = array('I', self.ext_ids)
+        tree.shas = bytearray(self.shas)
+        tree.extensions = list(self.extensions)
+        tree.extension_ids = dict(self.extension_ids)
+        tree.by_extension = {ext_id: array('I', rows) for ext_id, rows in self.by_extension.items()}
+        tree.by_depth = {depth: array('I', rows) for depth, rows in self.by_depth.items()}
+        return tree
+
+    # Mapping interface for existing callers
+
+    def __getitem__(self, path):
+        return self.entry(self.rows[path])
+
+    def __setitem__(self, path, entry):
+        self.add(path, entry.get("type"), entry.get("size", 0), entry.get("sha"))
+
+    def __delitem__(self, path):
+        row = self.rows.pop(path)
+        self.types[row] = REMOVED
+
+    def __contains__(self, path):
+        return path in self.rows
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    # Queries
+
+    def count(self, item_type):
+        return self.types.count(TYPE_CODES[item_type])
+
+    def rows_of_type(self, item_type):
+        """Iterate over the rows of one type, in row order"""
+        return compress(range(len(self.types)), self.types.translate(TYPE_MASKS[TYPE_CODES[item_type]]))
+
+    def top_level(self, item_type):
+        """Sorted paths of the top-level entries of one type"""
+        type_code = TYPE_CODES[item_type]
+        return sorted(self.paths[row] for row in self.by_depth.get(0, ()) if self.types[row] == type_code)
+
+    def rows_with_suffixes(self, suffixes, item_type=None):
+        """
+        Rows whose lowercased path ends with one of `suffixes`, in row order.
+        Plain extensions are read from the extension index; multi-part
+        (".tar.gz") or dotless ("Dockerfile") suffixes also compare the paths
+        of the candidate rows.
+        """
+        rows = set()
+        for suffix in suffixes:
+            lowered = suffix.lower()
+            extension = lowered[lowered.rfind('.'):] if '.' in lowered else ''
+            if not extension:
+                candidates = range(len(self.paths))
+            else:
+                candidates = self.by_extension.get(self.extension_ids.get(extension), ())
+            if extension == lowered:
+                rows.update(candidates)
+            else:
+                paths = self.paths
+                rows.update(row for row in candidates if paths[row].lower().endswith(lowered))
+        if item_type is None:
+            return sorted(row for row in rows if self.types[row] != REMOVED)
+        type_code = TYPE_CODES[item_type]
+        return sorted(row for row in rows if self.types[row] == type_code)
+
+    # Serialization
+
+    def to_json(self):
+        """Columnar JSON form used in cached snapshots"""
+        tree = self.copy() if len(self.rows) != len(self.paths) else self
+        return {
+            '__file_tree__': 1,
+            'repo': tree.repo_path,
+            'ref': tree.ref,
+            'paths': tree.paths,
+            'types': base64.b64encode(bytes(tree.types)).decode('ascii'),
+            'sizes': tree.sizes.tolist(),
+            'shas': base64.b64encode(bytes(tree.shas)).decode('ascii'),
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        tree = cls(data.get('repo', ''), data.get('ref', ''))
+        tree.paths = data['paths']
+        tree.rows = {path: row for row, path in enumerate(tree.paths)}
+        tree.types = bytearray(base64.b64decode(data['types']))
+        tree.sizes = array('q', data['sizes'])
+        tree.shas = bytearray(base64.b64decode(data['shas']))
+        for row, path in enumerate(tree.paths):
+            tree.index_row(row, path)
+        return tree
+
+    @classmethod
+    def from_entries(cls, entries, repo_path='', ref=''):
+        """Build a tree from a path -> entry dict (the old snapshot format)"""
+        tree = cls(repo_path, ref)
+        for path, info in entries.items():
+            tree.add(path, info.get("type"), info.get("size", 0), info.get("sha"))
+        return tree
+
+
+def as_file_tree(file_structure, repo_path='', ref=''):
+    """Return `file_structure` as a FileTree, converting snapshots cached in the old dict format"""
+    if isinstance(file_structure, FileTree):
+        return file_structure
+    return FileTree.from_entries(file_structure or {}, repo_path, ref)
+
+
+def encode_json_value(value):
+    """json.dumps `default` hook for snapshots containing a FileTree"""
+    if isinstance(value, FileTree):
+        return value.to_json()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def decode_json_object(obj):
+    """json.loads `object_hook` restoring FileTrees"""
+    if '__file_tree__' in obj:
+        return FileTree.from_json(obj)
+    return obj
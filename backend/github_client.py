@@ -0,0 +1,350 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
+
+# Overridable for GitHub Enterprise or the local fake server used by the benchmarks
+GITHUB_API_URL = os.environ.get('GITHUB_API_URL', "https://api.github.com").rstrip('/')
+DEFAULT_ACCEPT = "application/vnd.github.v3+json"
+DEFAULT_TIMEOUT = 10
+
+# Concurrency of the per-file GitHub fetches: the adaptive limit starts at
+# GITHUB_FETCH_CONCURRENCY and never exceeds GITHUB_FETCH_MAX_CONCURRENCY.
+# The connection pool also covers the metadata fan-out that runs alongside them.
+GITHUB_FETCH_CONCURRENCY = int(os.environ.get('GITHUB_FETCH_CONCURRENCY', 5))
+GITHUB_FETCH_MAX_CONCURRENCY = max(GITHUB_FETCH_CONCURRENCY, int(os.environ.get('GITHUB_FETCH_MAX_CONCURRENCY', 32)))
+METADATA_FANOUT = 7
+
+# Rate limit scheduling: requests are paced once the remaining budget falls below
+# RATE_LIMIT_RESERVE_FRACTION of X-RateLimit-Limit (at least RATE_LIMIT_MIN_RESERVE),
+# and waits longer than RATE_LIMIT_MAX_WAIT_SECONDS fail fast instead
+RATE_LIMIT_RESERVE_FRACTION = float(os.environ.get('RATE_LIMIT_RESERVE_FRACTION', 0.02))
+RATE_LIMIT_MIN_RESERVE = int(os.environ.get('RATE_LIMIT_MIN_RESERVE', 5))
+RATE_LIMIT_MAX_WAIT_SECONDS = float(os.environ.get('RATE_LIMIT_MAX_WAIT_SECONDS', 5))
+SECONDARY_LIMIT_DEFAULT_WAIT = 60
+
+# Conditional request cache configuration
+HTTP_CACHE_MAX_ENTRIES = int(os.environ.get('HTTP_CACHE_MAX_ENTRIES', 2000))
+HTTP_CACHE_MAX_BYTES = int(os.environ.get('HTTP_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+HTTP_CACHE_MAX_ENTRY_BYTES = 1024 * 1024
+
+
+class RateLimitExceeded(requests.RequestException):
+    """Raised when the GitHub budget can't be met within the allowed wait"""
+
+    def __init__(self, resource, wait_seconds):
+        super().__init__(f"GitHub {resource} rate limit exhausted, {wait_seconds:.0f}s until reset")
+        self.resource = resource
+        self.wait_seconds = wait_seconds
+
+
+class RateLimitScheduler:
+    """
+    Shared GitHub request budget driven by X-RateLimit-* and Retry-After
+    headers. Each request takes a token from the budget of its resource
+    (core, graphql, ...). Requests run without delay while the budget is
+    plentiful and are spread evenly across the window once it runs low.
+    Waits longer than max_wait raise RateLimitExceeded so callers can
+    degrade instead of burning the Lambda timeout.
+    """
+
+    def __init__(self, reserve_fraction=RATE_LIMIT_RESERVE_FRACTION, min_reserve=RATE_LIMIT_MIN_RESERVE,
+                 max_wait=RATE_LIMIT_MAX_WAIT_SECONDS):
+        self.reserve_fraction = reserve_fraction
+        self.min_reserve = min_reserve
+        self.max_wait = max_wait
+        self.resources = {}  # resource -> {'remaining', 'limit', 'reset', 'next_slot'}
+        self.blocked_until = 0
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'paced': 0, 'waited_seconds': 0.0, 'secondary_limits': 0, 'rejected': 0,
+                      'throttled': 0}
+
+    def acquire(self, resource='core'):
+        """Take one request from the budget, waiting briefly if GitHub requires it"""
+        with self.lock:
+            now = time.time()
+            wait = max(0, self.blocked_until - now)
+            state = self.resources.get(resource)
+            next_slot = None
+
+            if state is not None and state['reset'] <= now:
+                # Window has rolled over; trust the next response's headers
+                del self.resources[resource]
+                state = None
+
+            if state is not None:
+                if state['remaining'] <= 0:
+                    wait = max(wait, state['reset'] - now)
+                elif state['remaining'] < self.reserve_for(state['limit']):
+                    # Spread what's left of the budget evenly over the rest of the window
+                    interval = (state['reset'] - now) / state['remaining']
+                    slot = max(now, state['next_slot'])
+                    next_slot = slot + interval
+                    wait = max(wait, slot - now)
+
+            if wait > self.max_wait:
+                # A rejected request doesn't take a pacing slot from later ones
+                self.stats['rejected'] += 1
+                raise RateLimitExceeded(resource, wait)
+
+            if state is not None:
+                if next_slot is not None:
+                    state['next_slot'] = next_slot
+                    self.stats['paced'] += 1
+                state['remaining'] -= 1
+            self.stats['requests'] += 1
+            self.stats['waited_seconds'] += wait
+
+        if wait > 0:
+            time.sleep(wait)
+
+    def record(self, response):
+        """Update the budget from a response's rate limit headers"""
+        headers = response.headers
+        now = time.time()
+        with self.lock:
+            remaining = headers.get('X-RateLimit-Remaining')
+            reset = headers.get('X-RateLimit-Reset')
+            if remaining is not None and reset is not None:
+                resource = headers.get('X-RateLimit-Resource', 'core')
+                state = self.resources.setdefault(resource, {'next_slot': 0})
+                state['remaining'] = int(remaining)
+                state['limit'] = int(headers.get('X-RateLimit-Limit', 0) or 0)
+                state['reset'] = float(reset)
+
+            if self.is_rate_limited(response):
+                self.stats['throttled'] += 1
+                retry_after = headers.get('Retry-After')
+                if retry_after is not None:
+                    self.blocked_until = max(self.blocked_until, now + float(retry_after))
+                    self.stats['secondary_limits'] += 1
+                elif remaining == '0' and reset is not None:
+                    self.blocked_until = max(self.blocked_until, float(reset))
+                else:
+                    # Secondary limit without Retry-After: GitHub asks for at least a minute
+                    self.blocked_until = max(self.blocked_until, now + SECONDARY_LIMIT_DEFAULT_WAIT)
+                    self.stats['secondary_limits'] += 1
+
+    @staticmethod
+    def is_rate_limited(response):
+        if response.status_code == 429:
+            return True
+        if response.status_code != 403:
+            return False
+        return (response.headers.get('X-RateLimit-Remaining') == '0' or
+                'Retry-After' in response.headers or
+                'rate limit' in response.text.lower())
+
+    def reserve_for(self, limit):
+        """Requests held back from a budget of `limit` per window (0 if unknown)"""
+        return max(self.min_reserve, int(limit * self.reserve_fraction))
+
+    def reserve(self, resource='core'):
+        """Reserve of the resource's current budget"""
+        with self.lock:
+            state = self.resources.get(resource)
+            return self.reserve_for(state['limit'] if state else 0)
+
+    def available(self, resource='core'):
+        """Requests left in the current window, or None if unknown"""
+        with self.lock:
+            if self.blocked_until > time.time():
+                return 0
+            state = self.resources.get(resource)
+            if state is None or state['reset'] <= time.time():
+                return None
+            return max(0, state['remaining'])
+
+    def wait_time(self):
+        with self.lock:
+            return max(0, self.blocked_until - time.time())
+
+
+class ConditionalRequestCache:
+    """
+    Bounded store of GitHub responses with their validators (ETag /
+    Last-Modified). Revalidated entries are served from here when GitHub
+    answers 304 Not Modified, which does not count against the rate limit.
+    """
+
+    def __init__(self, max_entries=HTTP_CACHE_MAX_ENTRIES, max_bytes=HTTP_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+    @staticmethod
+    def cache_key(url, headers):
+        # Raw and JSON representations differ, and so can what each token may see
+        accept = headers.get('Accept', '')
+        auth = hashlib.sha256(headers.get('Authorization', '').encode('utf-8')).hexdigest()[:16]
+        return f"{url}|{accept}|{auth}"
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, response):
+        body = response.content
+        if len(body) > HTTP_CACHE_MAX_ENTRY_BYTES:
+            return
+        entry = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'body': body,
+            'headers': dict(response.headers),
+            'encoding': response.encoding,
+        }
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= len(old['body'])
+            self.entries[key] = entry
+            self.current_bytes += len(body)
+            self.stats['stores'] += 1
+            while self.entries and (len(self.entries) > self.max_entries or self.current_bytes > self.max_bytes):
+                _, evicted = self.entries.popitem(last=False)
+                self.current_bytes -= len(evicted['body'])
+                self.stats['evictions'] += 1
+
+    def record(self, hit):
+        with self.lock:
+            self.stats['hits' if hit else 'misses'] += 1
+
+
+def build_cached_response(url, entry):
+    """Rebuild a 200 response from a cache entry"""
+    response = requests.Response()
+    response.status_code = 200
+    response._content = entry['body']
+    response.headers = CaseInsensitiveDict(entry['headers'])
+    response.encoding = entry['encoding']
+    response.url = url
+    response.from_cache = True
+    response.throttled = 0
+    return response
+
+
+class GitHubClient:
+    """
+    GitHub API client with a pooled keep-alive session. Default headers,
+    authentication, timeouts and the conditional request cache are handled
+    here so every fetch path shares the same connections.
+    """
+
+    def __init__(self, token=None, pool_size=GITHUB_FETCH_MAX_CONCURRENCY + METADATA_FANOUT, cache=None, rate_limiter=None):
+        self.cache = cache
+        self.rate_limiter = rate_limiter or RateLimitScheduler()
+        self.session = requests.Session()
+
+        # Retry connection resets and transient 5xx without re-opening a new pool
+        retries = Retry(total=2, backoff_factor=0.3, status_forcelist=[502, 503, 504], allowed_methods=["GET"])
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=True, max_retries=retries)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Accept": DEFAULT_ACCEPT,
+            "User-Agent": "ai-github-lambda",
+        })
+        self.set_token(token)
+
+    def set_token(self, token):
+        if token:
+            self.session.headers["Authorization"] = f"token {token}"
+        else:
+            self.session.headers.pop("Authorization", None)
+
+    def get(self, url, accept=None, headers=None, timeout=DEFAULT_TIMEOUT, stream=False, **kwargs):
+        """
+        GET a GitHub API path or URL. Returns a requests.Response; 304s are
+        turned into the cached 200 response.
+        """
+        if not url.startswith("http"):
+            url = GITHUB_API_URL + url
+
+        request_headers = dict(headers or {})
+        if accept:
+            request_headers["Accept"] = accept
+
+        # Streamed downloads (tarballs) are never cached
+        if stream or self.cache is None:
+            return self.send('get', url, 'core', headers=request_headers, timeout=timeout, stream=stream, **kwargs)
+
+        key = ConditionalRequestCache.cache_key(url, {**self.session.headers, **request_headers})
+        entry = self.cache.get(key)
+        if entry is not None:
+            if entry['etag']:
+                request_headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                request_headers['If-Modified-Since'] = entry['last_modified']
+
+        response = self.send('get', url, 'core', headers=request_headers, timeout=timeout, **kwargs)
+
+        if response.status_code == 304 and entry is not None:
+            self.cache.record(hit=True)
+            cached = build_cached_response(url, entry)
+            cached.throttled = response.throttled
+            return cached
+
+        self.cache.record(hit=False)
+        if response.status_code == 200 and (response.headers.get('ETag') or response.headers.get('Last-Modified')):
+            self.cache.put(key, response)
+        return response
+
+    def post(self, url, json_body, timeout=DEFAULT_TIMEOUT, **kwargs):
+        """POST JSON to a GitHub API path or URL (used for GraphQL)"""
+        if not url.startswith("http"):
+            url = GITHUB_API_URL + url
+        return self.send('post', url, 'graphql', json=json_body, timeout=timeout, **kwargs)
+
+    def send(self, method, url, resource, **kwargs):
+        """
+        Send a request through the rate limit scheduler, retrying once when
+        GitHub asks for a short back-off. The response's `throttled` counts
+        the rate limited responses GitHub gave this call, including one
+        that was retried.
+        """
+        throttled = 0
+        for attempt in range(2):
+            self.rate_limiter.acquire(resource)
+            response = getattr(self.session, method)(url, **kwargs)
+            self.rate_limiter.record(response)
+            if RateLimitScheduler.is_rate_limited(response):
+                throttled += 1
+                if attempt == 0:
+                    print(f"WARNING: GitHub rate limited {url} ({response.status_code}), "
+                          f"retry in {self.rate_limiter.wait_time():.1f}s")
+                    response.close()
+                    continue
+            break
+        response.throttled = throttled
+        return response
+
+    def has_token(self):
+        return "Authorization" in self.session.headers
+
+
+# Module-level client and cache so connections and validators survive warm invocations
+http_cache = ConditionalRequestCache()
+github = GitHubClient(token=os.environ.get('GITHUB_TOKEN'), cache=http_cache)
+
+
+def get_http_cache_stats():
+    """Return hit/miss counters and current size of the conditional request cache"""
+    with http_cache.lock:
+        return {
+            **http_cache.stats,
+            'entries': len(http_cache.entries),
+            'bytes': http_cache.current_bytes,
+        }
@@ -0,0 +1,191 @@
+import traceback
+
+from github_client import github
+from tracing import debug
+
+README_CANDIDATES = ["README.md", "readme.md", "Readme.md", "README.rst", "README.txt", "README"]
+
+REPOSITORY_METADATA_QUERY = """
+query RepositoryMetadata($owner: String!, $name: String!, %(readme_vars)s) {
+  repository(owner: $owner, name: $name) {
+    name
+    nameWithOwner
+    description
+    url
+    homepageUrl
+    stargazerCount
+    forkCount
+    diskUsage
+    isFork
+    isArchived
+    createdAt
+    updatedAt
+    pushedAt
+    defaultBranchRef { name }
+    primaryLanguage { name }
+    licenseInfo { name spdxId }
+    repositoryTopics(first: 20) { nodes { topic { name } } }
+    openIssues: issues(states: OPEN) { totalCount }
+    openPullRequests: pullRequests(states: OPEN) { totalCount }
+    languages(first: 50, orderBy: {field: SIZE, direction: DESC}) {
+      edges { size node { name } }
+    }
+    issues(first: 30, orderBy: {field: UPDATED_AT, direction: DESC}) {
+      nodes { number title state url createdAt updatedAt closedAt author { login } comments { totalCount } }
+    }
+    pullRequests(first: 10, orderBy: {field: CREATED_AT, direction: DESC}) {
+      nodes { number title state url createdAt updatedAt closedAt mergedAt author { login } }
+    }
+    releases(first: 10, orderBy: {field: CREATED_AT, direction: DESC}) {
+      nodes { name tagName url description createdAt publishedAt isPrerelease isDraft }
+    }
+    %(readme_fields)s
+  }
+}
+"""
+
+
+def build_metadata_query(ref):
+    """Build the metadata query and variables, probing README candidates at `ref`"""
+    readme_vars = ", ".join(f"$readme{i}: String!" for i in range(len(README_CANDIDATES)))
+    readme_fields = "\n    ".join(
+        f"readme{i}: object(expression: $readme{i}) {{ ... on Blob {{ text isBinary }} }}"
+        for i in range(len(README_CANDIDATES))
+    )
+    variables = {f"readme{i}": f"{ref}:{name}" for i, name in enumerate(README_CANDIDATES)}
+    query = REPOSITORY_METADATA_QUERY % {"readme_vars": readme_vars, "readme_fields": readme_fields}
+    return query, variables
+
+
+def login_of(node):
+    author = node.get("author") or {}
+    return {"login": author.get("login")} if author.get("login") else None
+
+
+def to_rest_repo_info(repo):
+    """Map the GraphQL repository node onto the REST /repos/{repo} fields we use"""
+    owner, _, _ = repo["nameWithOwner"].partition("/")
+    return {
+        "name": repo.get("name"),
+        "full_name": repo.get("nameWithOwner"),
+        "owner": {"login": owner},
+        "description": repo.get("description"),
+        "html_url": repo.get("url"),
+        "homepage": repo.get("homepageUrl"),
+        "stargazers_count": repo.get("stargazerCount", 0),
+        "watchers_count": repo.get("stargazerCount", 0),
+        "forks_count": repo.get("forkCount", 0),
+        # REST counts open pull requests as issues too
+        "open_issues_count": (repo.get("openIssues") or {}).get("totalCount", 0)
+            + (repo.get("openPullRequests") or {}).get("totalCount", 0),
+        "size": repo.get("diskUsage") or 0,
+        "fork": repo.get("isFork", False),
+        "archived": repo.get("isArchived", False),
+        "created_at": repo.get("createdAt"),
+        "updated_at": repo.get("updatedAt"),
+        "pushed_at": repo.get("pushedAt"),
+        "default_branch": (repo.get("defaultBranchRef") or {}).get("name"),
+        "language": (repo.get("primaryLanguage") or {}).get("name"),
+        "license": {
+            "name": repo["licenseInfo"].get("name"),
+            "spdx_id": repo["licenseInfo"].get("spdxId"),
+        } if repo.get("licenseInfo") else None,
+        "topics": [node["topic"]["name"] for node in (repo.get("repositoryTopics") or {}).get("nodes", [])],
+    }
+
+
+def to_rest_issue(node):
+    return {
+        "number": node.get("number"),
+        "title": node.get("title"),
+        "state": (node.get("state") or "").lower(),
+        "html_url": node.get("url"),
+        "user": login_of(node),
+        "comments": (node.get("comments") or {}).get("totalCount", 0),
+        "created_at": node.get("createdAt"),
+        "updated_at": node.get("updatedAt"),
+        "closed_at": node.get("closedAt"),
+    }
+
+
+def to_rest_pull_request(node):
+    # REST reports merged pull requests as closed, with merged_at set
+    state = (node.get("state") or "").lower()
+    return {
+        "number": node.get("number"),
+        "title": node.get("title"),
+        "state": "closed" if state == "merged" else state,
+        "html_url": node.get("url"),
+        "user": login_of(node),
+        "created_at": node.get("createdAt"),
+        "updated_at": node.get("updatedAt"),
+        "closed_at": node.get("closedAt"),
+        "merged_at": node.get("mergedAt"),
+    }
+
+
+def to_rest_release(node):
+    return {
+        "name": node.get("name"),
+        "tag_name": node.get("tagName"),
+        "html_url": node.get("url"),
+        "body": node.get("description"),
+        "created_at": node.get("createdAt"),
+        "published_at": node.get("publishedAt"),
+        "prerelease": node.get("isPrerelease", False),
+        "draft": node.get("isDraft", False),
+    }
+
+
+def fetch_metadata_graphql(repo_path, ref="HEAD"):
+    """
+    Fetch repo info, languages, recent issues, pull requests, releases and the
+    README in one GraphQL query. Returns a dict with the same keys and value
+    shapes as the REST path in fetch_repository_data ("readme" is None when no
+    README candidate exists at `ref`), or None if the query failed.
+    """
+    if not github.has_token():
+        debug("GraphQL metadata backend needs a GitHub token, using REST")
+        return None
+
+    owner, _, name = repo_path.partition("/")
+    query, variables = build_metadata_query(ref)
+    variables.update({"owner": owner, "name": name})
+
+    try:
+        response = github.post("/graphql", {"query": query, "variables": variables}, timeout=15)
+        if response.status_code != 200:
+            print(f"WARNING: GraphQL metadata query failed: {response.status_code}")
+            return None
+
+        payload = response.json()
+        repo = (payload.get("data") or {}).get("repository")
+        if payload.get("errors") or not repo:
+            print(f"WARNING: GraphQL metadata query returned errors: {payload.get('errors')}")
+            return None
+
+        readme = None
+        for i in range(len(README_CANDIDATES)):
+            blob = repo.get(f"readme{i}")
+            if blob and not blob.get("isBinary") and blob.get("text") is not None:
+                readme = blob["text"]
+                break
+
+        metadata = {
+            "repo_info": to_rest_repo_info(repo),
+            "readme": readme,
+            "languages": {
+                edge["node"]["name"]: edge["size"]
+                for edge in (repo.get("languages") or {}).get("edges", [])
+            },
+            "recent_issues": [to_rest_issue(node) for node in (repo.get("issues") or {}).get("nodes", [])],
+            "pull_requests": [to_rest_pull_request(node) for node in (repo.get("pullRequests") or {}).get("nodes", [])],
+            "releases": [to_rest_release(node) for node in (repo.get("releases") or {}).get("nodes", [])],
+        }
+        debug(f"Fetched metadata for {repo_path} with one GraphQL query")
+        return metadata
+
+    except Exception as e:
+        print(f"ERROR: GraphQL metadata query failed for {repo_path}: {str(e)}")
+        traceback.print_exc()
+        return None
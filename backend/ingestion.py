@@ -0,0 +1,352 @@
+import json
+import os
+import queue
+import threading
+import time
+import traceback
+
+import botocore.exceptions
+
+from resources import get_client, get_table
+from tracing import debug, trace_request
+
+# Ingestion configuration. "sqs" hands jobs to the worker Lambda through
+# INGESTION_QUEUE_URL, "local" runs them on in-process worker threads, and
+# "inline" disables background ingestion (chat requests fetch directly).
+# Lambda freezes the execution environment between invocations, so worker
+# threads would stall there; without a queue, Lambda fetches inline.
+ON_LAMBDA = bool(os.environ.get('AWS_LAMBDA_FUNCTION_NAME'))
+INGESTION_QUEUE_URL = os.environ.get('INGESTION_QUEUE_URL')
+INGESTION_BACKEND = os.environ.get('INGESTION_BACKEND', 'sqs' if INGESTION_QUEUE_URL else 'inline' if ON_LAMBDA else 'local')
+INGESTION_JOBS_TABLE = os.environ.get('INGESTION_JOBS_TABLE')
+INGESTION_WORKERS = int(os.environ.get('INGESTION_WORKERS', 2))
+INGESTION_MAX_ATTEMPTS = int(os.environ.get('INGESTION_MAX_ATTEMPTS', 3))
+INGESTION_RETRY_DELAY_SECONDS = 5
+INGESTION_WAIT_SECONDS = float(os.environ.get('INGESTION_WAIT_SECONDS', 25))
+INGESTION_POLL_SECONDS = 0.5
+INGESTION_JOB_TIMEOUT_SECONDS = 960  # Running jobs not updated for this long are considered abandoned
+INGESTION_JOB_TTL_SECONDS = 24 * 3600
+
+# Job statuses
+QUEUED = 'queued'
+RUNNING = 'running'
+PARTIAL = 'partial'  # Still running, with a partial snapshot already published
+READY = 'ready'
+FAILED = 'failed'
+
+
+class IngestionFailed(Exception):
+    """Raised by a snapshot builder; `retriable` says whether another attempt may succeed"""
+
+    def __init__(self, message, retriable=True):
+        super().__init__(message)
+        self.retriable = retriable
+
+
+class IngestionPending(Exception):
+    """Raised when neither a complete nor a partial snapshot is ready yet"""
+
+    def __init__(self, job):
+        super().__init__(f"Ingestion of {job.get('repoPath')} is still {job.get('status')}")
+        self.job = job
+
+
+def job_key(repo_path, sha):
+    return f"{repo_path.lower()}@{sha}"
+
+
+def new_job(repo_path, sha):
+    now = time.time()
+    return {
+        'jobKey': job_key(repo_path, sha),
+        'repoPath': repo_path,
+        'sha': sha,
+        'status': QUEUED,
+        'stage': QUEUED,
+        'attempts': 0,
+        'error': None,
+        'createdAt': now,
+        'updatedAt': now,
+    }
+
+
+def is_claimable(job, refresh):
+    """Whether a new job may replace `job`: failed, abandoned, or ready but asked to rebuild"""
+    if job is None or job['status'] == FAILED:
+        return True
+    if job['status'] == READY:
+        return refresh
+    return time.time() - float(job['updatedAt']) > INGESTION_JOB_TIMEOUT_SECONDS
+
+
+class InMemoryJobStore:
+    """Job status kept in process memory (pairs with the local queue)"""
+
+    def __init__(self):
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def claim(self, repo_path, sha, refresh=False):
+        """Create a job unless an equivalent one exists; returns (job, created)"""
+        key = job_key(repo_path, sha)
+        with self.lock:
+            existing = self.jobs.get(key)
+            if not is_claimable(existing, refresh):
+                return dict(existing), False
+            job = new_job(repo_path, sha)
+            self.jobs[key] = job
+            return dict(job), True
+
+    def get(self, key):
+        with self.lock:
+            job = self.jobs.get(key)
+            return dict(job) if job else None
+
+    def update(self, key, **fields):
+        with self.lock:
+            job = self.jobs.get(key)
+            if job is not None:
+                job.update(fields, updatedAt=time.time())
+
+
+class DynamoDBJobStore:
+    """
+    Job status in a DynamoDB table shared by the API and worker Lambdas.
+    Claims use a conditional write so concurrent requests enqueue one job.
+    """
+
+    def __init__(self, table_name):
+        self.table_name = table_name
+
+    @property
+    def table(self):
+        return get_table(self.table_name)
+
+    @staticmethod
+    def from_item(item):
+        if item is None:
+            return None
+        job = dict(item)
+        job['attempts'] = int(job.get('attempts', 0))
+        for field in ('createdAt', 'updatedAt'):
+            job[field] = float(job.get(field, 0))
+        return job
+
+    def claim(self, repo_path, sha, refresh=False):
+        job = new_job(repo_path, sha)
+        condition = "attribute_not_exists(jobKey) OR #status = :failed OR (#status <> :ready AND updatedAt < :stale)"
+        values = {':failed': FAILED, ':ready': READY, ':stale': int(time.time() - INGESTION_JOB_TIMEOUT_SECONDS)}
+        if refresh:
+            condition += " OR #status = :ready"
+        try:
+            self.table.put_item(
+                Item={
+                    **job,
+                    'createdAt': int(job['createdAt']),
+                    'updatedAt': int(job['updatedAt']),
+                    'expiresAt': int(time.time() + INGESTION_JOB_TTL_SECONDS),
+                },
+                ConditionExpression=condition,
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues=values
+            )
+            return job, True
+        except botocore.exceptions.ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            return self.get(job['jobKey']), False
+
+    def get(self, key):
+        return self.from_item(self.table.get_item(Key={'jobKey': key}, ConsistentRead=True).get('Item'))
+
+    def update(self, key, **fields):
+        fields['updatedAt'] = int(time.time())
+        names = {f"#{name}": name for name in fields}
+        values = {f":{name}": value for name, value in fields.items()}
+        self.table.update_item(
+            Key={'jobKey': key},
+            UpdateExpression="SET " + ", ".join(f"#{name} = :{name}" for name in fields),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values
+        )
+
+
+class LocalIngestionQueue:
+    """In-process stand-in for SQS: a queue drained by daemon worker threads"""
+
+    def __init__(self, workers=INGESTION_WORKERS):
+        self.workers = workers
+        self.messages = queue.Queue()
+        self.handler = None
+        self.threads = []
+        self.lock = threading.Lock()
+
+    def start(self, handler):
+        self.handler = handler
+
+    def send(self, message, delay=0):
+        self.ensure_workers()
+        if delay:
+            timer = threading.Timer(delay, self.messages.put, [message])
+            timer.daemon = True
+            timer.start()
+        else:
+            self.messages.put(message)
+
+    def ensure_workers(self):
+        with self.lock:
+            while len(self.threads) < self.workers:
+                thread = threading.Thread(target=self.work, daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def work(self):
+        while True:
+            message = self.messages.get()
+            try:
+                self.handler(message)
+            except Exception as e:
+                print(f"ERROR: Ingestion worker failed: {str(e)}")
+                traceback.print_exc()
+
+
+class SQSIngestionQueue:
+    """Ingestion jobs sent to an SQS queue consumed by the worker Lambda"""
+
+    def __init__(self, queue_url):
+        self.queue_url = queue_url
+
+    @property
+    def sqs(self):
+        return get_client('sqs')
+
+    def start(self, handler):
+        pass  # Messages arrive as SQS events through lambda_handler
+
+    def send(self, message, delay=0):
+        self.sqs.send_message(
+            QueueUrl=self.queue_url,
+            MessageBody=json.dumps(message),
+            DelaySeconds=min(900, int(delay))
+        )
+
+
+class IngestionService:
+    """
+    Builds repository snapshots in the background. Jobs are keyed by
+    (repo_path, sha), so a commit is ingested once no matter how many
+    requests ask for it. `build_snapshot(repo_path, sha, progress)` does the
+    work and raises IngestionFailed (or any error) to fail an attempt;
+    retriable failures are re-queued with backoff up to max_attempts.
+    """
+
+    def __init__(self, job_store, job_queue, build_snapshot, max_attempts=INGESTION_MAX_ATTEMPTS):
+        self.job_store = job_store
+        self.job_queue = job_queue
+        self.build_snapshot = build_snapshot
+        self.max_attempts = max_attempts
+        self.job_queue.start(self.run_job)
+
+    def ensure_job(self, repo_path, sha, refresh=False):
+        """
+        Queue ingestion of the snapshot unless it is already queued, running,
+        or (without `refresh`) done. Returns the current job.
+        """
+        job, created = self.job_store.claim(repo_path, sha, refresh)
+        if created:
+            debug(f"Queued ingestion of {repo_path}@{sha[:7]}")
+            self.job_queue.send({'jobKey': job['jobKey'], 'repoPath': repo_path, 'sha': sha})
+        return job
+
+    def get_job(self, repo_path, sha):
+        return self.job_store.get(job_key(repo_path, sha))
+
+    def wait(self, repo_path, sha, timeout=INGESTION_WAIT_SECONDS, on_stage=None):
+        """
+        Wait until the job is ready or failed, or `timeout` passes. `on_stage`
+        is called with each new stage the worker reports. Returns the job.
+        """
+        key = job_key(repo_path, sha)
+        deadline = time.time() + timeout
+        last_stage = None
+        while True:
+            job = self.job_store.get(key)
+            if job is None:
+                return None
+            if on_stage and job['stage'] != last_stage:
+                last_stage = job['stage']
+                on_stage(last_stage)
+            if job['status'] in (READY, FAILED) or time.time() >= deadline:
+                return job
+            time.sleep(INGESTION_POLL_SECONDS)
+
+    def run_job(self, message):
+        """Run one attempt of an ingestion job, traced like a request"""
+        with trace_request('ingestion'):
+            self.run_attempt(message)
+
+    def run_attempt(self, message):
+        key, repo_path, sha = message['jobKey'], message['repoPath'], message['sha']
+        job = self.job_store.get(key)
+        if job is None or job['status'] in (READY, FAILED):
+            debug(f"Skipping ingestion of {key}, job is {job and job['status']}")
+            return
+
+        attempt = job['attempts'] + 1
+        self.job_store.update(key, status=RUNNING, stage='starting', attempts=attempt, error=None)
+        start_time = time.time()
+        debug(f"Ingesting {repo_path}@{sha[:7]} (attempt {attempt}/{self.max_attempts})")
+
+        def progress(stage, **details):
+            if stage == 'partial_snapshot':
+                self.job_store.update(key, status=PARTIAL, stage=stage)
+            else:
+                self.job_store.update(key, stage=stage)
+
+        try:
+            self.build_snapshot(repo_path, sha, progress)
+            self.job_store.update(key, status=READY, stage=READY)
+            debug(f"Ingested {repo_path}@{sha[:7]} in {time.time() - start_time:.2f}s")
+        except Exception as e:
+            retriable = getattr(e, 'retriable', True)
+            print(f"ERROR: Ingestion of {repo_path}@{sha[:7]} failed on attempt {attempt}: {str(e)}")
+            if not isinstance(e, IngestionFailed):
+                traceback.print_exc()
+            if retriable and attempt < self.max_attempts:
+                self.job_store.update(key, status=QUEUED, stage='retrying', error=str(e))
+                self.job_queue.send(message, delay=INGESTION_RETRY_DELAY_SECONDS * (2 ** (attempt - 1)))
+            else:
+                self.job_store.update(key, status=FAILED, stage=FAILED, error=str(e))
+
+    def handle_sqs_event(self, event):
+        """Process an SQS batch, reporting records that could not be handled for redelivery"""
+        failures = []
+        for record in event.get('Records', []):
+            try:
+                self.run_job(json.loads(record['body']))
+            except Exception as e:
+                print(f"ERROR: Failed to process ingestion message {record.get('messageId')}: {str(e)}")
+                traceback.print_exc()
+                failures.append({'itemIdentifier': record.get('messageId')})
+        return {'batchItemFailures': failures}
+
+
+def is_sqs_event(event):
+    records = event.get('Records') or []
+    return bool(records) and records[0].get('eventSource') == 'aws:sqs'
+
+
+def create_ingestion_service(build_snapshot, backend=INGESTION_BACKEND, on_lambda=ON_LAMBDA):
+    """Build the ingestion service from environment configuration, or None for inline fetching"""
+    if backend == 'inline':
+        return None
+    if backend == 'sqs':
+        if INGESTION_QUEUE_URL and INGESTION_JOBS_TABLE:
+            return IngestionService(DynamoDBJobStore(INGESTION_JOBS_TABLE), SQSIngestionQueue(INGESTION_QUEUE_URL), build_snapshot)
+        # Workers in another Lambda can't see in-process job status
+        print("WARNING: SQS ingestion needs INGESTION_QUEUE_URL and INGESTION_JOBS_TABLE, falling back")
+    if on_lambda:
+        # Worker threads freeze with the execution environment once the invocation returns
+        print("WARNING: Local ingestion workers don't run between Lambda invocations, fetching inline")
+        return None
+    return IngestionService(InMemoryJobStore(), LocalIngestionQueue(), build_snapshot)
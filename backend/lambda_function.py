@@ -1,41 +1,94 @@
 import json
 import os
-import requests
-import boto3
 import traceback
 import base64
 import time
+import tarfile
 from urllib.parse import parse_qs
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from collections import deque
 import random
+import queue
+import threading
 import botocore.exceptions
 import logging
-import pytz
-from datetime import datetime
+from tracing import debug, span, traced, propagate, trace_request, current_request_id, LOG_LEVEL
+from resources import get_client, get_table, get_secret, new_session, prewarm, PREWARM_RESOURCES, ResourceUnavailable
+from snapshot_cache import create_snapshot_cache, SNAPSHOT_CACHE_TTL_SECONDS
+from snapshot_refresh import parse_compare, patch_file_structure, REFRESH_MAX_SIZE_LISTINGS
+from answer_cache import answer_cache_key, create_answer_cache
+from ingestion import (
+    IngestionFailed, IngestionPending, READY, FAILED,
+    create_ingestion_service, is_sqs_event, INGESTION_WAIT_SECONDS
+)
+from github_client import (
+    github, get_http_cache_stats, RateLimitScheduler
+)
+from github_graphql import fetch_metadata_graphql
+from retrieval_index import RetrievalIndex
+from conversation_history import list_conversations, get_conversation, compress_response, InvalidCursor
+from conversation_store import build_item, conversation_title, create_conversation_writer
+from file_tree import FileTree, as_file_tree
+from file_ranking import rank_files, build_ranking_hints, remember_hints, recall_hints
+from blob_store import FileContents, as_file_contents, reuse_known_blobs
+from file_fetch import FetchBudget, read_capped, file_chunks, body_cap, content_entry
+from fetch_engine import fetch_files
+from context_packer import ContextPacker, PROMPT_TOKEN_BUDGET, RETRIEVAL_TOKEN_BUDGET
 
 # Configure logging
 logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+logger.setLevel(LOG_LEVEL)
 
 # Constants for file processing
-PRIORITY_EXTENSIONS = ['.md', '.py', '.js', '.java', '.ts', '.jsx', '.tsx', '.html', '.css', 'Dockerfile', '.yml', '.yaml', '.json']
 MEDIA_EXTENSIONS = ['.png', '.jpg', '.jpeg', '.gif', '.svg', '.mp4', '.mov', '.webm']
 BINARY_EXTENSIONS = ['.jar', '.zip', '.tar.gz', '.class', '.pyc', '.so', '.dll', '.exe', '.bin']
+MAX_FILES_TO_FETCH = 500
+MAX_TOTAL_CONTENT_SIZE = 10 * 1024 * 1024  # 10MB total content limit
+# Metadata backend: "graphql" batches most metadata into one query and falls back to "rest"
+GITHUB_METADATA_BACKEND = os.environ.get('GITHUB_METADATA_BACKEND', 'graphql')
+INGESTION_PENDING_ANSWER = ("I'm still reading this repository for the first time. "
+                            "Please ask again in a moment and I'll answer from its code.")
+CLAUDE_MODEL_ID = os.environ.get('CLAUDE_MODEL_ID', 'us.anthropic.claude-3-5-haiku-20241022-v1:0')
+PROMPT_CACHE_ENABLED = os.environ.get('PROMPT_CACHE_ENABLED', 'true').lower() == 'true'
+PROMPT_VERSION = 2  # Bump when the prompt changes so cached answers are not reused
+RETRIEVAL_TOP_K = 40  # Chunks ranked against the question for the prompt
+MAX_README_CHARS = 12000
+README_HEAD_CHARS = 4000
+MAX_FILE_CHARS = 5000  # Per-file cap for files not selected by retrieval
+METADATA_DEADLINE_SECONDS = float(os.environ.get('METADATA_DEADLINE_SECONDS', 12))
 
-# Initialize clients
-ssm = boto3.client('ssm')
-secrets_manager = boto3.client('secretsmanager')
-bedrock_runtime = boto3.client('bedrock-runtime')
+# File ingestion: "tarball" downloads one archive, "contents" fetches each file,
+# "auto" uses the tarball unless the repository is larger than TARBALL_MAX_REPO_KB
+FILE_INGESTION_MODE = os.environ.get('FILE_INGESTION_MODE', 'auto')
+TARBALL_MAX_REPO_KB = int(os.environ.get('TARBALL_MAX_REPO_KB', 150 * 1024))
+
+# Fields of an in-progress fetch published as a partial snapshot
+PARTIAL_SNAPSHOT_KEYS = ("repo_info", "readme", "languages", "recent_issues", "pull_requests",
+                         "releases", "contributors", "file_structure")
+
+# Repository snapshot cache, kept at module level so it survives warm invocations
+snapshot_cache = create_snapshot_cache()
+
+# Answers keyed by repository SHA and normalized question (None when disabled)
+answer_cache = create_answer_cache()
+
+# Background snapshot ingestion (None when INGESTION_BACKEND is "inline").
+# build_snapshot is defined below, so it is looked up when a job runs.
+ingestion = create_ingestion_service(lambda repo_path, sha, progress: build_snapshot(repo_path, sha, progress))
+
+# Bedrock input token usage across warm invocations, including prompt cache reads and writes
+prompt_cache_stats = {'requests': 0, 'input_tokens': 0, 'cache_read_input_tokens': 0, 'cache_creation_input_tokens': 0}
+prompt_cache_lock = threading.Lock()
 
 # Initialize DynamoDB table with explicit verification
-def get_dynamodb_table():
+def create_conversation_table():
     """
     Initialize DynamoDB table with proper error handling
     """
     try:
         print("Initializing DynamoDB table 'ConversationHistory'")
         region = os.environ.get('AWS_REGION', 'us-east-1')
-        dynamodb_resource = boto3.resource('dynamodb', region_name=region)
+        dynamodb_resource = new_session().resource('dynamodb', region_name=region)
         table = dynamodb_resource.Table('ConversationHistory')
         
         # Verify table exists
@@ -47,40 +100,41 @@ def get_dynamodb_table():
         traceback.print_exc()
         return None
 
-# Initialize DynamoDB table
-try:
-    conversation_table = get_dynamodb_table()
-    if conversation_table:
-        print("DynamoDB table initialized successfully GLOBALLY") # Added for clarity
-    else:
-        print("Failed to initialize DynamoDB table GLOBALLY") # Added for clarity
-except Exception as e:
-    print(f"ERROR: Global DynamoDB initialization failed: {str(e)}")
-    traceback.print_exc()
-    conversation_table = None
+def get_dynamodb_table():
+    """Return the conversation table, created on first use (None if it could not be reached)"""
+    return get_table('ConversationHistory', factory=create_conversation_table)
 
 # Get API keys from Secrets Manager
-def get_secret(secret_name):
+def configure_github_token():
+    """
+    Point the GitHub client at the token in Secrets Manager. The secret is
+    memoized by the resource registry and re-read every SECRETS_TTL_SECONDS,
+    so warm containers pick up a rotated token.
+    """
+    global GITHUB_TOKEN
     try:
-        print(f"DEBUG: Getting secret: {secret_name}")
-        response = secrets_manager.get_secret_value(SecretId=secret_name)
-        secret_value = json.loads(response['SecretString'])
-        print(f"DEBUG: Secret retrieved successfully")
-        return secret_value
+        token = get_secret('AIGithubSecrets').get('GITHUB_TOKEN')
+    except ResourceUnavailable as e:
+        # Failed moments ago and already reported; keep the fallback until the retry
+        debug(str(e))
+        token = os.environ.get('GITHUB_TOKEN')
     except Exception as e:
-        print(f"ERROR: Failed to get secret {secret_name}: {e}")
-        traceback.print_exc()
-        raise e
-
-# Initialize API keys
-try:
-    secrets = get_secret('AIGithubSecrets')
-    GITHUB_TOKEN = secrets.get('GITHUB_TOKEN')
-    print(f"DEBUG: GitHub token set: {'Yes' if GITHUB_TOKEN else 'No'}, first chars: {GITHUB_TOKEN[:4] if GITHUB_TOKEN else 'None'}")
-except Exception:
-    # Fallback to environment variables for testing
-    GITHUB_TOKEN = os.environ.get('GITHUB_TOKEN')
-    print(f"DEBUG: Using environment GitHub token: {'Yes' if GITHUB_TOKEN else 'No'}")
+        # Fallback to environment variables for testing
+        print(f"ERROR: Failed to get secret AIGithubSecrets: {e}")
+        token = os.environ.get('GITHUB_TOKEN')
+    if token != GITHUB_TOKEN:
+        GITHUB_TOKEN = token
+        github.set_token(token)
+        debug(f"GitHub token set: {'Yes' if token else 'No'}")
+
+GITHUB_TOKEN = os.environ.get('GITHUB_TOKEN')
+
+# Conversation turns are saved after the response is sent; created at import so the Lambda extension registers during init
+conversation_writer = create_conversation_writer(get_dynamodb_table)
+
+# Create clients, tables and secrets named in PREWARM_RESOURCES in parallel at import
+if PREWARM_RESOURCES:
+    prewarm()
 
 def get_cognito_user_pool_id():
     """Dynamically detect Cognito User Pool ID"""
@@ -90,7 +144,7 @@ def get_cognito_user_pool_id():
     
     try:
         # List user pools and find one with correct name
-        cognito_client = boto3.client('cognito-idp')
+        cognito_client = get_client('cognito-idp')
         response = cognito_client.list_user_pools(MaxResults=60)
         
         for pool in response['UserPools']:
@@ -120,7 +174,7 @@ def verify_jwt_token(token):
         # Add padding if needed
         padding = '=' * ((4 - len(payload_base64) % 4) % 4) 
         payload = json.loads(base64.b64decode(payload_base64 + padding).decode('utf-8'))
-        print(f"DEBUG: Successfully decoded JWT payload, found keys: {list(payload.keys())}")
+        debug(f"Successfully decoded JWT payload, found keys: {list(payload.keys())}")
         return payload
     except Exception as e:
         print(f"ERROR: Invalid token: {str(e)}")
@@ -129,20 +183,11 @@ def verify_jwt_token(token):
 
 def save_conversation(user_id, conversation_id, repo_path, messages, title=None):
     """
-    Save conversation to DynamoDB with properly formatted timestamp
+    Queue a conversation turn for saving. The write happens after the
+    response is sent (see conversation_store.py); returns False if the turn
+    could not be queued.
     """
     try:
-        # Check if table is initialized
-        if conversation_table is None:
-            print("ERROR: DynamoDB table not initialized, cannot save conversation")
-            return False
-            
-        print(f"SAVE CONVERSATION: Starting for user {user_id}, conversation ID {conversation_id}")
-        
-        # Get current time in Eastern Time and format it correctly
-        et_timezone = pytz.timezone('US/Eastern')
-        timestamp = datetime.now(et_timezone).strftime('%Y-%m-%d %H:%M:%S')
-        
         # Extract question and response from messages
         user_message = ""
         assistant_response = ""
@@ -153,41 +198,83 @@ def save_conversation(user_id, conversation_id, repo_path, messages, title=None)
             elif msg.get('role') == 'assistant':
                 assistant_response = msg.get('content', '')
         
-        # Prepare item with the required schema
-        item = {
-            'userId': user_id,
-            'timestamp': timestamp,
-            'conversationId': conversation_id,
-            'repoPath': repo_path,
-            'question': user_message,
-            'response': assistant_response
-        }
-        
-        print(f"SAVE CONVERSATION: Putting item into DynamoDB - userId:{user_id}, timestamp:{timestamp}")
-        
-        # Try to put item
-        try:
-            # Save to DynamoDB
-            response = conversation_table.put_item(Item=item)
-            print(f"SAVE CONVERSATION: DynamoDB response: {response}")
-            print(f"SAVE CONVERSATION: Successfully saved conversation {conversation_id} for user {user_id}")
-            return True
-        except Exception as db_error:
-            print(f"ERROR: DynamoDB put_item failed: {str(db_error)}")
-            traceback.print_exc()
-            return False
+        item = build_item(user_id, conversation_id, repo_path, user_message, assistant_response, title)
+        conversation_writer.submit(item)
+        debug(f"Save conversation: Queued conversation {conversation_id} for user {user_id} at {item['timestamp']}")
+        return True
             
     except Exception as e:
         print(f"ERROR: Failed to save conversation: {str(e)}")
         traceback.print_exc()
         return False
 
+def get_user_id(request_headers):
+    """
+    Return the authenticated user's ID from the Authorization header, or None
+    """
+    with span('auth'):
+        return extract_user_id(request_headers)
+
+def extract_user_id(request_headers):
+    auth_header = None
+    if request_headers:
+        debug(f"Headers present: {list(request_headers.keys())}")
+        auth_header = request_headers.get('Authorization') or request_headers.get('authorization')
+    
+    user_id = None
+    
+    # If auth header exists, verify token
+    if auth_header and auth_header.startswith('Bearer '):
+        token = auth_header.split('Bearer ')[1]
+        
+        claims = verify_jwt_token(token) or {}
+        user_id = claims.get('email') or claims.get('sub')
+            
+        if user_id:
+            debug(f"Authenticated user: {user_id}")
+        else:
+            debug("Failed to extract user ID from token")
+    else:
+        debug("No valid Authorization header found")
+    
+    return user_id
+
 def lambda_handler(event, context):
     """
     Main Lambda handler function that processes API Gateway events
     """
     try:
-        print(f"DEBUG: Event received: \n{json.dumps(event, indent=4)}")
+        # Ingestion jobs delivered by SQS to the worker function
+        if ingestion is not None and is_sqs_event(event):
+            configure_github_token()
+            return ingestion.handle_sqs_event(event)
+        
+        # One trace per request, tagged with the Lambda request ID when there is one
+        request_id = getattr(context, 'aws_request_id', None)
+        with trace_request(route_name(event), request_id) as trace:
+            response = route_request(event)
+            response['headers'] = {**response.get('headers', {}), 'X-Request-Id': trace.request_id}
+            return response
+    finally:
+        # Queued conversation turns are written once the response is ready
+        conversation_writer.invocation_done(context)
+
+def route_name(event):
+    """Low-cardinality route label used as the metrics dimension"""
+    if event.get('httpMethod') == 'OPTIONS':
+        return 'options'
+    path = event.get('path', '')
+    for route in ('chat-stream', 'chat', 'repo-info', 'ingestion-status', 'conversation-history', 'get-conversation'):
+        if f"/{route}" in path:
+            return route
+    return 'other'
+
+def route_request(event):
+    """
+    Parse an API Gateway event and dispatch it to the route handler
+    """
+    try:
+        debug(f"Event received: {event.get('httpMethod')} {event.get('path')}")
         
         # Enable CORS
         headers = {
@@ -205,52 +292,46 @@ def lambda_handler(event, context):
                 'body': ''
             }
         
+        configure_github_token()
+        
         # Parse path parameter to determine API route
         path = event.get('path', '')
         http_method = event.get('httpMethod', '')
-        print(f"DEBUG: Request path: {path}, method: {http_method}")
+        debug(f"Request path: {path}, method: {http_method}")
         
         # Parse request body
         body = {}
         if event.get('body'):
-            print(f"DEBUG: Raw body length: {len(event.get('body'))}")
+            debug(f"Raw body length: {len(event.get('body'))}")
             try:
-                body = json.loads(event.get('body', '{}'))
+                raw_body = event['body']
+                if event.get('isBase64Encoded'):
+                    # Bodies of a binary media type arrive base64-encoded
+                    raw_body = base64.b64decode(raw_body).decode('utf-8')
+                body = json.loads(raw_body)
                 if 'save-conversation' in path:
-                    print(f"DEBUG: Save conversation body keys: {list(body.keys())}")
+                    debug(f"Save conversation body keys: {list(body.keys())}")
             except Exception as e:
                 print(f"ERROR: Failed to parse body JSON: {e}")
                 body = {}
         
         # Extract authorization token
-        auth_header = None
-        if event.get('headers'):
-            print(f"DEBUG: Headers present: {list(event['headers'].keys())}")
-            auth_header = event.get('headers', {}).get('Authorization') or event.get('headers', {}).get('authorization')
-        
-        claims = {}
-        user_id = None
-        
-        # If auth header exists, verify token
-        if auth_header and auth_header.startswith('Bearer '):
-            token = auth_header.split('Bearer ')[1]
-            print(f"DEBUG: Found token (first few chars): {token[:20]}...")
-            
-            claims = verify_jwt_token(token) or {}
-            user_id = claims.get('email') or claims.get('sub')
-                
-            if user_id:
-                print(f"DEBUG: Authenticated user: {user_id}")
-            else:
-                print("DEBUG: Failed to extract user ID from token")
-        else:
-            print("DEBUG: No valid Authorization header found")
+        user_id = get_user_id(event.get('headers'))
         
         # Route the request based on path
-        if '/chat' in path:
+        if '/chat-stream' in path:
+            return handle_chat_stream_request(body, headers, user_id)
+        elif '/chat' in path:
             return handle_chat_request(body, headers, user_id)
         elif '/repo-info' in path:
             return handle_repo_info_request(body, headers)
+        elif '/ingestion-status' in path:
+            return handle_ingestion_status_request(body, headers)
+        elif '/conversation-history' in path:
+            params = event.get('queryStringParameters') or {}
+            return compress_response(handle_conversation_history_request(params, headers, user_id), event.get('headers'))
+        elif '/get-conversation' in path:
+            return compress_response(handle_get_conversation_request(body, headers, user_id), event.get('headers'))
         else:
             print(f"ERROR: No matching route for path: {path}")
             return {
@@ -276,7 +357,7 @@ def handle_repo_info_request(body, headers):
     Handle requests to get repository information
     """
     repo_path = body.get('repoPath')
-    print(f"DEBUG: Handling repo info request for: {repo_path}")
+    debug(f"Handling repo info request for: {repo_path}")
     
     if not repo_path or '\${' in repo_path:
         print(f"ERROR: Invalid repository path: {repo_path}")
@@ -288,18 +369,10 @@ def handle_repo_info_request(body, headers):
     
     try:
         # Fetch repository information from GitHub API
-        github_headers = {"Accept": "application/vnd.github.v3+json"}
-        if GITHUB_TOKEN:
-            github_headers["Authorization"] = f"token {GITHUB_TOKEN}"
+        debug(f"Fetching repo info from GitHub API: {repo_path}")
+        github_response = github.get(f"/repos/{repo_path}")
         
-        print(f"DEBUG: Fetching repo info from GitHub API: {repo_path}")
-        github_response = requests.get(
-            f"https://api.github.com/repos/{repo_path}",
-            headers=github_headers,
-            timeout=10
-        )
-        
-        print(f"DEBUG: GitHub API response status: {github_response.status_code}")
+        debug(f"GitHub API response status: {github_response.status_code}")
         
         if github_response.status_code != 200:
             print(f"ERROR: GitHub API error: {github_response.status_code} {github_response.text}")
@@ -310,7 +383,7 @@ def handle_repo_info_request(body, headers):
             }
         
         repo_data = github_response.json()
-        print(f"DEBUG: Successfully fetched repo info for {repo_data.get('full_name')}")
+        debug(f"Successfully fetched repo info for {repo_data.get('full_name')}")
         
         # Format the response
         response_data = {
@@ -325,6 +398,9 @@ def handle_repo_info_request(body, headers):
             'topics': repo_data.get('topics', []),
         }
         
+        # Start building the snapshot now so the first question finds it ready
+        response_data['ingestion'] = ingestion_summary(start_ingestion(repo_path))
+        
         return {
             'statusCode': 200,
             'headers': headers,
@@ -340,6 +416,127 @@ def handle_repo_info_request(body, headers):
             'body': json.dumps({'error': str(e)})
         }
 
+def handle_ingestion_status_request(body, headers):
+    """
+    Report the background ingestion status of a repository's current HEAD
+    """
+    repo_path = body.get('repoPath')
+    if not repo_path or '\${' in repo_path:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({'error': 'Repository path is required and must be valid'})
+        }
+    
+    try:
+        head_sha = resolve_head_sha(repo_path)
+        job = ingestion.get_job(repo_path, head_sha) if ingestion and head_sha else None
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': json.dumps({'repoPath': repo_path, 'sha': head_sha, 'ingestion': ingestion_summary(job)})
+        }
+    
+    except Exception as e:
+        print(f"ERROR: Error fetching ingestion status: {str(e)}")
+        traceback.print_exc()
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'body': json.dumps({'error': str(e)})
+        }
+
+def handle_conversation_history_request(params, headers, user_id=None):
+    """
+    List the caller's conversations, newest first, one page at a time.
+    Query parameters: `limit` (turns per page) and `cursor` from the previous page's `nextCursor`.
+    """
+    if not user_id:
+        return {
+            'statusCode': 401,
+            'headers': headers,
+            'body': json.dumps({'error': 'Authentication required'})
+        }
+    
+    try:
+        conversation_table = get_dynamodb_table()
+        if conversation_table is None:
+            raise RuntimeError("DynamoDB table not initialized")
+        page = list_conversations(conversation_table, user_id, params.get('cursor'), params.get('limit'))
+        debug(f"Listed {len(page['conversations'])} conversations for user {user_id}")
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': json.dumps(page)
+        }
+    
+    except InvalidCursor as e:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({'error': str(e)})
+        }
+    except Exception as e:
+        print(f"ERROR: Error listing conversation history: {str(e)}")
+        traceback.print_exc()
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'body': json.dumps({'error': str(e)})
+        }
+
+def handle_get_conversation_request(body, headers, user_id=None):
+    """
+    Return the turns of one of the caller's conversations, oldest first, one page at a time.
+    Body: `conversationId`, and optionally `limit` and `cursor` from the previous page's `nextCursor`.
+    """
+    if not user_id:
+        return {
+            'statusCode': 401,
+            'headers': headers,
+            'body': json.dumps({'error': 'Authentication required'})
+        }
+    
+    conversation_id = body.get('conversationId')
+    if not conversation_id:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({'error': 'conversationId is required'})
+        }
+    
+    try:
+        conversation_table = get_dynamodb_table()
+        if conversation_table is None:
+            raise RuntimeError("DynamoDB table not initialized")
+        conversation = get_conversation(conversation_table, user_id, conversation_id, body.get('cursor'), body.get('limit'))
+        if conversation is None:
+            return {
+                'statusCode': 404,
+                'headers': headers,
+                'body': json.dumps({'error': 'Conversation not found'})
+            }
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': json.dumps(conversation)
+        }
+    
+    except InvalidCursor as e:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({'error': str(e)})
+        }
+    except Exception as e:
+        print(f"ERROR: Error fetching conversation {conversation_id}: {str(e)}")
+        traceback.print_exc()
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'body': json.dumps({'error': str(e)})
+        }
+
 def handle_chat_request(body, headers, user_id=None):
     """
     Handle chat requests
@@ -347,8 +544,8 @@ def handle_chat_request(body, headers, user_id=None):
     repo_path = body.get('repoPath')
     message = body.get('message')
     conversation_id = body.get('conversationId', f"conv_{int(time.time())}_{random.randint(1000, 9999)}")
-    print(f"DEBUG: Handling chat request for repo: {repo_path}, message: {message}, conversation_id: {conversation_id}")
-    print(f"DEBUG: User ID passed to handle_chat_request: {user_id}")
+    debug(f"Handling chat request for repo: {repo_path}, message: {message}, conversation_id: {conversation_id}")
+    debug(f"User ID passed to handle_chat_request: {user_id}")
     
     if not repo_path or not message or '\${' in repo_path:
         print(f"ERROR: Invalid repository path: {repo_path} or message: {message}")
@@ -359,45 +556,46 @@ def handle_chat_request(body, headers, user_id=None):
         }
     
     try:
-        # Fetch repository data
-        repo_data = fetch_repository_data(repo_path)
+        # Answer repeated questions about the same commit from the answer cache
+        head_sha = resolve_head_sha(repo_path)
+        cache_key = get_answer_cache_key(repo_path, head_sha, message)
+        with span('answer_cache'):
+            response = answer_cache.get(cache_key) if cache_key else None
+        cached = response is not None
+        
+        if not cached:
+            # Fetch repository data (served from the snapshot cache when HEAD is unchanged)
+            repo_data = get_repository_snapshot(repo_path, head_sha=head_sha)
+            
+            # Process with Claude
+            debug(f"Processing with Claude for repo: {repo_path}")
+            response = process_with_claude(repo_path, repo_data, message, cache_key=cache_key)
         
-        # Process with Claude
-        print(f"DEBUG: Processing with Claude for repo: {repo_path}")
-        response = process_with_claude(repo_path, repo_data, message)
+        if answer_cache:
+            debug(f"Answer cache {'hit' if cached else 'miss'}: {answer_cache.summary()}")
         
         # Auto-save conversation if user is authenticated
-        if user_id:
-            print(f"DEBUG: Auto-saving conversation for user: {user_id}")
-            
-            # Create messages array with user question and AI response
-            messages = [
-                {"role": "user", "content": message},
-                {"role": "assistant", "content": response}
-            ]
-            
-            # Save to DynamoDB
-            save_result = save_conversation(
-                user_id=user_id,
-                conversation_id=conversation_id,
-                repo_path=repo_path,
-                messages=messages,
-                title=message[:50] + ('...' if len(message) > 50 else '')
-            )
-            
-            if save_result:
-                print(f"DEBUG: Successfully saved conversation {conversation_id}")
-            else:
-                print(f"ERROR: Failed to save conversation {conversation_id}")
-        else:
-            print("DEBUG: No authenticated user, skipping conversation save")
+        save_chat_turn(user_id, conversation_id, repo_path, message, response)
         
         return {
             'statusCode': 200,
             'headers': headers,
             'body': json.dumps({
                 'answer': response,
-                'conversationId': conversation_id
+                'conversationId': conversation_id,
+                'cached': cached
+            })
+        }
+    
+    except IngestionPending as e:
+        debug(f"{str(e)}")
+        return {
+            'statusCode': 202,
+            'headers': headers,
+            'body': json.dumps({
+                'answer': INGESTION_PENDING_ANSWER,
+                'conversationId': conversation_id,
+                'ingestion': ingestion_summary(e.job)
             })
         }
     
@@ -410,12 +608,365 @@ def handle_chat_request(body, headers, user_id=None):
             'body': json.dumps({'error': str(e)})
         }
 
+def save_chat_turn(user_id, conversation_id, repo_path, message, response):
+    """
+    Save a question and answer to the user's history if they are authenticated
+    """
+    if not user_id:
+        debug("No authenticated user, skipping conversation save")
+        return
+    
+    debug(f"Auto-saving conversation for user: {user_id}")
+    
+    # Create messages array with user question and AI response
+    messages = [
+        {"role": "user", "content": message},
+        {"role": "assistant", "content": response}
+    ]
+    
+    # Save to DynamoDB
+    save_result = save_conversation(
+        user_id=user_id,
+        conversation_id=conversation_id,
+        repo_path=repo_path,
+        messages=messages,
+        title=conversation_title(message)
+    )
+    
+    if save_result:
+        debug(f"Successfully saved conversation {conversation_id}")
+    else:
+        print(f"ERROR: Failed to save conversation {conversation_id}")
+
+def format_sse(event_type, data):
+    """Format one server-sent event"""
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+def chat_stream_events(body, user_id=None):
+    """
+    Generate server-sent events for a chat request: `progress` events for each
+    fetch stage, `delta` events with answer text as the model produces it, and
+    a final `done` (or `error`) event. The full answer is saved once complete.
+    """
+    repo_path = body.get('repoPath')
+    message = body.get('message')
+    conversation_id = body.get('conversationId', f"conv_{int(time.time())}_{random.randint(1000, 9999)}")
+    debug(f"Handling streaming chat request for repo: {repo_path}, conversation_id: {conversation_id}")
+    
+    if not repo_path or not message or '\${' in repo_path:
+        yield format_sse('error', {'error': 'Repository path and message are required and must be valid'})
+        return
+    
+    try:
+        yield format_sse('progress', {'stage': 'resolving_head'})
+        head_sha = resolve_head_sha(repo_path)
+        cache_key = get_answer_cache_key(repo_path, head_sha, message)
+        with span('answer_cache'):
+            cached_answer = answer_cache.get(cache_key) if cache_key else None
+        if cached_answer is not None:
+            debug(f"Answer cache hit: {answer_cache.summary()}")
+            yield format_sse('delta', {'text': cached_answer})
+            save_chat_turn(user_id, conversation_id, repo_path, message, cached_answer)
+            yield format_sse('done', {'conversationId': conversation_id, 'cached': True})
+            return
+        
+        # Run the fetch in the background and relay its progress as it happens
+        progress_events = queue.Queue()
+        def report(stage, **details):
+            progress_events.put({'stage': stage, **details})
+        
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            snapshot_future = executor.submit(propagate(get_repository_snapshot), repo_path, report, head_sha)
+            while not snapshot_future.done() or not progress_events.empty():
+                try:
+                    yield format_sse('progress', progress_events.get(timeout=0.1))
+                except queue.Empty:
+                    pass
+            repo_data = snapshot_future.result()
+        
+        yield format_sse('progress', {'stage': 'generating'})
+        answer_parts = []
+        for text in stream_with_claude(repo_path, repo_data, message):
+            answer_parts.append(text)
+            yield format_sse('delta', {'text': text})
+        
+        response = "".join(answer_parts)
+        if cache_key and repo_data.get("head_sha") and response:
+            answer_cache.put(cache_key, response)
+        save_chat_turn(user_id, conversation_id, repo_path, message, response)
+        yield format_sse('done', {'conversationId': conversation_id, 'cached': False})
+    
+    except IngestionPending as e:
+        debug(f"{str(e)}")
+        yield format_sse('delta', {'text': INGESTION_PENDING_ANSWER})
+        yield format_sse('done', {'conversationId': conversation_id, 'ingestion': ingestion_summary(e.job)})
+    
+    except Exception as e:
+        print(f"ERROR: Error in streaming chat request: {str(e)}")
+        traceback.print_exc()
+        yield format_sse('error', {'error': str(e)})
+
+def handle_chat_stream_request(body, headers, user_id=None):
+    """
+    Handle streaming chat requests behind API Gateway. The REST API buffers
+    proxy responses, so the events are returned together as one
+    text/event-stream body; stream_server.py delivers them incrementally.
+    """
+    return {
+        'statusCode': 200,
+        'headers': {**headers, 'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache'},
+        'body': "".join(chat_stream_events(body, user_id))
+    }
+
+def report_progress(progress, stage, **details):
+    """Send a fetch progress update to the optional callback"""
+    if progress:
+        progress(stage, **details)
+
+def get_answer_cache_key(repo_path, head_sha, message):
+    """Return the answer cache key for this question, or None if answers can't be cached"""
+    if answer_cache is None or not head_sha:
+        return None
+    return answer_cache_key(repo_path, head_sha, message, CLAUDE_MODEL_ID, PROMPT_VERSION)
+
+def resolve_head_sha(repo_path):
+    """
+    Resolve the default-branch HEAD commit SHA with a single lightweight request
+    """
+    try:
+        with span('resolve_head'):
+            response = github.get(f"/repos/{repo_path}/commits/HEAD", accept="application/vnd.github.sha")
+        if response.status_code == 200:
+            return response.text.strip()
+        print(f"WARNING: Could not resolve HEAD for {repo_path}: {response.status_code}")
+    except Exception as e:
+        print(f"ERROR: Failed to resolve HEAD for {repo_path}: {str(e)}")
+    return None
+
+@traced('snapshot')
+def get_repository_snapshot(repo_path, progress=None, head_sha=None):
+    """
+    Return repository data for the current default-branch HEAD, using the
+    snapshot cache when the commit has already been fetched.
+    `progress` is an optional callback receiving (stage, **details) updates;
+    `head_sha` skips resolving HEAD when the caller already has it.
+    """
+    if head_sha is None:
+        report_progress(progress, 'resolving_head')
+        head_sha = resolve_head_sha(repo_path)
+    if head_sha:
+        with span('snapshot_cache'):
+            cached = snapshot_cache.get(repo_path, head_sha)
+        if cached is not None and not cached.get("partial"):
+            report_progress(progress, 'cached_snapshot', sha=head_sha)
+            return cached
+        
+        # Patch the previous snapshot when only a few files changed since
+        refreshed = refresh_snapshot(repo_path, head_sha)
+        if refreshed is not None:
+            report_progress(progress, 'refreshed_snapshot', sha=head_sha)
+            return refreshed
+        
+        if ingestion is not None:
+            # Let the ingestion workers build the snapshot and wait for it briefly
+            ingestion.ensure_job(repo_path, head_sha, refresh=True)
+            with span('ingestion_wait'):
+                job = ingestion.wait(repo_path, head_sha, INGESTION_WAIT_SECONDS,
+                                     on_stage=lambda stage: report_progress(progress, stage))
+            if job is not None and job['status'] != FAILED:
+                snapshot = snapshot_cache.get(repo_path, head_sha)
+                if snapshot is not None:
+                    if snapshot.get("partial"):
+                        debug(f"Serving partial snapshot of {repo_path}@{head_sha[:7]} while ingestion finishes")
+                    return snapshot
+                if job['status'] != READY:
+                    raise IngestionPending(job)
+            print(f"WARNING: Ingestion of {repo_path}@{head_sha[:7]} failed, fetching inline")
+
+    repo_data = fetch_repository_data(repo_path, ref=head_sha, progress=progress)
+
+    # Only cache complete snapshots that actually reached GitHub
+    if head_sha and repo_data.get("repo_info") and not repo_data.get("missing_metadata"):
+        repo_data["head_sha"] = head_sha
+        snapshot_cache.put(repo_path, head_sha, repo_data)
+
+    return repo_data
+
+def build_snapshot(repo_path, sha, progress):
+    """
+    Ingestion job: fetch the repository at `sha` and store the snapshot. A
+    partial snapshot (metadata and file tree, no contents) is published as
+    soon as the tree is known so chat requests can use it in the meantime.
+    """
+    def publish_partial(result):
+        # Copy only settled fields; metadata fetches may still be writing to `result`
+        partial = {key: result[key] for key in PARTIAL_SNAPSHOT_KEYS}
+        partial.update(file_contents={}, media_files=[], partial=True)
+        snapshot_cache.put(repo_path, sha, partial)
+        progress('partial_snapshot', entries=len(result["file_structure"]))
+    
+    repo_data = fetch_repository_data(repo_path, ref=sha, progress=progress, on_partial=publish_partial)
+    if not repo_data.get("repo_info"):
+        raise IngestionFailed(f"Repository {repo_path} not found or not accessible", retriable=False)
+    if repo_data.get("missing_metadata"):
+        raise IngestionFailed(f"Missing metadata: {', '.join(repo_data['missing_metadata'])}")
+    
+    repo_data["head_sha"] = sha
+    snapshot_cache.put(repo_path, sha, repo_data)
+
+@traced('refresh')
+def refresh_snapshot(repo_path, head_sha):
+    """
+    Build the snapshot for `head_sha` from the latest cached snapshot of the
+    repository and the compare API, fetching only the files that changed.
+    The retrieval index is patched the same way if it was built. Returns None
+    when there is no usable base or the diff is too large for a patch.
+    """
+    try:
+        base_sha = snapshot_cache.get_latest_sha(repo_path)
+        if not base_sha or base_sha == head_sha:
+            return None
+        base = snapshot_cache.get(repo_path, base_sha)
+        # Metadata isn't re-fetched, so its age still bounds the patched snapshot
+        if base is None or base.get("partial") or time.time() - base.get("fetched_at", 0) > SNAPSHOT_CACHE_TTL_SECONDS:
+            return None
+        
+        compare_response = github.get(f"/repos/{repo_path}/compare/{base_sha}...{head_sha}")
+        if compare_response.status_code != 200:
+            print(f"WARNING: Compare {base_sha[:7]}...{head_sha[:7]} failed: {compare_response.status_code}")
+            return None
+        changes = parse_compare(compare_response.json())
+        if changes is None:
+            return None
+        
+        file_structure, changed, removed = patch_file_structure(
+            as_file_tree(base["file_structure"], repo_path, base_sha),
+            changes,
+            lambda path, item_type, sha, size: tree_entry(repo_path, head_sha, path, item_type, sha, size),
+            is_ignored_path
+        )
+        file_structure.ref = head_sha
+        fetch_added_file_sizes(repo_path, head_sha, file_structure,
+                               [path for path in changed if file_structure[path]["size"] == 0])
+        
+        # Re-fetch changed files that would be selected for contents; drop the rest
+        selected = {path for path, _, _ in select_files_to_fetch(file_structure, base.get("repo_info"), base.get("ranking_hints"))}
+        file_contents = as_file_contents(base["file_contents"]).copy()
+        for path in removed | (changed - selected):
+            file_contents.pop(path, None)
+        
+        # Changed files whose new blob is already in the blob store (e.g. a revert) aren't downloaded
+        wanted = [(path, file_structure[path], None) for path in changed if path in selected]
+        to_fetch = [path for path, _, _ in reuse_known_blobs(wanted, file_contents)]
+        fetched = {}
+        binary = set()
+        for path in (selected & changed) - set(to_fetch):
+            size = len(file_contents[path]["content"].encode('utf-8'))
+            file_contents.set_size(path, size)
+            file_structure.set_size(path, size)
+            fetched[path] = file_contents[path]
+        if to_fetch:
+            results = fetch_files(repo_path, [(path, file_structure[path]) for path in to_fetch], head_sha)
+            for path, content in results.items():
+                if content is None:
+                    print(f"WARNING: Could not fetch changed file {path}, doing a full fetch instead")
+                    return None
+                if content.get("binary"):
+                    file_contents.pop(path, None)
+                    binary.add(path)
+                    continue
+                file_structure.set_size(path, content["size"])
+                fetched[path] = content
+        file_contents.update(fetched)
+        
+        repo_data = {
+            **base,
+            "file_structure": file_structure,
+            "file_contents": file_contents,
+            "media_files": find_media_files(file_structure),
+            "ranking_hints": build_ranking_hints(file_structure, file_contents),
+            "head_sha": head_sha,
+        }
+        remember_hints(repo_path, repo_data["ranking_hints"])
+        if any('/' not in path and path.lower().startswith('readme') for path in changed | removed):
+            repo_data["readme"] = fetch_readme(repo_path) or "No README found."
+        
+        snapshot_cache.put(repo_path, head_sha, repo_data)
+        
+        base_index = snapshot_cache.peek_derived(repo_path, base_sha, "retrieval_index")
+        if base_index is not None:
+            snapshot_cache.get_derived(
+                repo_path, head_sha, "retrieval_index",
+                lambda: base_index.updated(removed | (changed - selected) | binary, fetched)
+            )
+        
+        debug(f"Refreshed {repo_path} {base_sha[:7]}...{head_sha[:7]}: "
+              f"{len(changed)} changed, {len(removed)} removed, {len(fetched)} fetched")
+        return repo_data
+    
+    except Exception as e:
+        print(f"ERROR: Incremental refresh of {repo_path} failed: {str(e)}")
+        traceback.print_exc()
+        return None
+
+def fetch_added_file_sizes(repo_path, ref, file_structure, paths):
+    """
+    Set the sizes of files added by a refresh from the contents listings of
+    their directories at `ref`, listing at most REFRESH_MAX_SIZE_LISTINGS
+    directories concurrently
+    """
+    directories = sorted({path.rsplit('/', 1)[0] if '/' in path else '' for path in paths})
+    if not directories:
+        return
+    if len(directories) > REFRESH_MAX_SIZE_LISTINGS:
+        print(f"WARNING: Files were added in {len(directories)} directories, "
+              f"sizing those in the first {REFRESH_MAX_SIZE_LISTINGS}")
+        directories = directories[:REFRESH_MAX_SIZE_LISTINGS]
+    
+    def list_directory(directory):
+        response = github.get(f"/repos/{repo_path}/contents/{directory}?ref={ref}")
+        if response.status_code != 200:
+            print(f"WARNING: Could not list {directory or 'root'} for sizes: {response.status_code}")
+            return []
+        listing = response.json()
+        return listing if isinstance(listing, list) else [listing]
+    
+    wanted = set(paths)
+    with ThreadPoolExecutor(max_workers=len(directories)) as executor:
+        for listing in executor.map(propagate(list_directory), directories):
+            for item in listing:
+                if item.get("path") in wanted:
+                    file_structure.set_size(item["path"], item.get("size", 0))
+
+def start_ingestion(repo_path):
+    """Queue background ingestion of the repository's current HEAD; returns the job or None"""
+    if ingestion is None:
+        return None
+    try:
+        head_sha = resolve_head_sha(repo_path)
+        return ingestion.ensure_job(repo_path, head_sha) if head_sha else None
+    except Exception as e:
+        print(f"ERROR: Failed to queue ingestion for {repo_path}: {str(e)}")
+        traceback.print_exc()
+        return None
+
+def ingestion_summary(job):
+    """Client-facing view of an ingestion job"""
+    if not job:
+        return None
+    return {'status': job['status'], 'stage': job['stage'], 'sha': job['sha'], 'attempts': job['attempts'], 'error': job.get('error')}
+
 # Include all your existing functions (fetch_repository_data, etc.)
-def fetch_repository_data(repo_path):
+def fetch_repository_data(repo_path, ref=None, progress=None, on_partial=None):
     """
-    Comprehensive repository data fetching without arbitrary limits
+    Comprehensive repository data fetching without arbitrary limits.
+    `ref` pins the tree and file contents to a commit; defaults to the default branch.
+    `progress` is an optional callback receiving (stage, **details) updates,
+    and `on_partial` is called with the result once the file tree is known.
+    After the repo info check, the metadata fetches run concurrently with the
+    tree and file content phase, each bounded by METADATA_DEADLINE_SECONDS.
     """
-    print(f"DEBUG: Fetching repository data for {repo_path}")
+    debug(f"Fetching repository data for {repo_path}")
     result = {
         "repo_info": {},
         "readme": "No README found.",
@@ -423,157 +974,89 @@ def fetch_repository_data(repo_path):
         "pull_requests": [],
         "releases": [],
         "contributors": [],
-        "file_structure": {},
-        "file_contents": {},
+        "file_structure": FileTree(repo_path, ref or "HEAD"),
+        "file_contents": FileContents(),
         "media_files": [],
         "languages": {},
+        "fetched_at": time.time(),
     }
     
-    # Set up GitHub API headers
-    github_headers = {"Accept": "application/vnd.github.v3+json"}
-    if GITHUB_TOKEN:
-        github_headers["Authorization"] = f"token {GITHUB_TOKEN}"
-    
     try:
-        # 1. Fetch basic repo info
-        print(f"DEBUG: Fetching basic repo info for {repo_path}")
-        repo_url = f"https://api.github.com/repos/{repo_path}"
-        repo_response = requests.get(repo_url, headers=github_headers, timeout=10)
+        metadata_fetchers = {
+            "readme": fetch_readme,
+            "languages": fetch_languages,
+            "recent_issues": fetch_recent_issues,
+            "pull_requests": fetch_pull_requests,
+            "releases": fetch_releases,
+            "contributors": fetch_contributors,
+        }
         
-        if repo_response.status_code == 200:
-            result["repo_info"] = repo_response.json()
-            print(f"DEBUG: Successfully fetched repo info: {result['repo_info'].get('full_name')}")
-        else:
-            print(f"ERROR: Failed to fetch repo info: {repo_response.status_code} - {repo_response.text}")
-            return result
+        report_progress(progress, 'repository_metadata')
         
-        # 2. Fetch README
-        print(f"DEBUG: Fetching README for {repo_path}")
-        readme_headers = github_headers.copy()
-        readme_headers["Accept"] = "application/vnd.github.raw"
-        readme_response = requests.get(
-            f"https://api.github.com/repos/{repo_path}/readme",
-            headers=readme_headers,
-            timeout=10
-        )
+        # 1-6. Try repo info, README, languages, issues, PRs and releases in one GraphQL query
+        graphql_metadata = None
+        if GITHUB_METADATA_BACKEND == "graphql":
+            with span('repo_info', backend='graphql'):
+                graphql_metadata = fetch_metadata_graphql(repo_path, ref or "HEAD")
         
-        if readme_response.status_code == 200:
-            result["readme"] = readme_response.text
-            print(f"DEBUG: Successfully fetched README, length: {len(result['readme'])}")
+        if graphql_metadata:
+            for key, value in graphql_metadata.items():
+                if value is not None:
+                    result[key] = value
+                    metadata_fetchers.pop(key, None)
+            debug(f"Successfully fetched repo info: {result['repo_info'].get('full_name')}")
         else:
-            print(f"DEBUG: No standard README found, trying alternate locations")
-            # Try alternate README locations
-            for readme_name in ["readme.md", "README.md", "Readme.md"]:
-                try:
-                    alt_readme_response = requests.get(
-                        f"https://api.github.com/repos/{repo_path}/contents/{readme_name}",
-                        headers=github_headers,
-                        timeout=10
-                    )
-                    if alt_readme_response.status_code == 200:
-                        content_data = alt_readme_response.json()
-                        if content_data.get("encoding") == "base64" and content_data.get("content"):
-                            result["readme"] = base64.b64decode(content_data["content"]).decode('utf-8', errors='replace')
-                            print(f"DEBUG: Successfully fetched README from {readme_name}")
-                            break
-                except Exception as e:
-                    print(f"DEBUG: Error checking alternate README {readme_name}: {str(e)}")
-        
-        # 3. Fetch languages
-        languages_response = requests.get(
-            f"https://api.github.com/repos/{repo_path}/languages",
-            headers=github_headers,
-            timeout=10
-        )
+            # 1. Fetch basic repo info over REST (fails fast for missing or private repos)
+            debug(f"Fetching basic repo info for {repo_path}")
+            with span('repo_info', backend='rest'):
+                repo_response = github.get(f"/repos/{repo_path}")
+            
+            if repo_response.status_code == 200:
+                result["repo_info"] = repo_response.json()
+                debug(f"Successfully fetched repo info: {result['repo_info'].get('full_name')}")
+            else:
+                print(f"ERROR: Failed to fetch repo info: {repo_response.status_code} - {repo_response.text}")
+                return result
         
-        if languages_response.status_code == 200:
-            result["languages"] = languages_response.json()
-            print(f"DEBUG: Successfully fetched languages: {list(result['languages'].keys())}")
+        tree_ref = ref or result["repo_info"].get("default_branch") or "HEAD"
         
-        # 4. Fetch issues with pagination
-        print(f"DEBUG: Fetching issues for {repo_path}")
-        all_issues = []
-        page = 1
-        while page <= 3:  # Limit to 3 pages (30 issues) to avoid excessive API calls
-            issues_response = requests.get(
-                f"https://api.github.com/repos/{repo_path}/issues?state=all&per_page=10&page={page}",
-                headers=github_headers,
-                timeout=10
-            )
+        # 2-7. Fan out the remaining metadata fetches alongside 8-9, the tree and file contents.
+        # These stay off the fetch engine: they are a handful of fixed calls, each fetcher pages
+        # and parses its own responses, and METADATA_DEADLINE_SECONDS (not the file byte budget)
+        # bounds them. Their throttles still reach the shared RateLimitScheduler.
+        executor = ThreadPoolExecutor(max_workers=len(metadata_fetchers) + 1)
+        try:
+            file_future = executor.submit(propagate(fetch_repository_files), repo_path, tree_ref, result, progress, on_partial)
+            metadata_futures = {
+                executor.submit(propagate(fetcher), repo_path): key
+                for key, fetcher in metadata_fetchers.items()
+            }
             
-            if issues_response.status_code != 200 or not issues_response.json():
-                break
-                
-            issues_page = issues_response.json()
-            all_issues.extend(issues_page)
-            page += 1
+            # Keep whatever finished before the deadline; defaults stand in for the rest
+            deadline = time.time() + METADATA_DEADLINE_SECONDS
+            for future, key in metadata_futures.items():
+                try:
+                    value = future.result(timeout=max(0, deadline - time.time()))
+                    if value is not None:
+                        result[key] = value
+                except FuturesTimeoutError:
+                    print(f"WARNING: Fetching {key} for {repo_path} missed the {METADATA_DEADLINE_SECONDS}s deadline")
+                    result.setdefault("missing_metadata", []).append(key)
+                except Exception as e:
+                    print(f"ERROR: Failed to fetch {key} for {repo_path}: {str(e)}")
+                    result.setdefault("missing_metadata", []).append(key)
             
-            if len(issues_page) < 10:  # Last page has fewer than 10 items
-                break
-        
-        # Filter out pull requests
-        result["recent_issues"] = [issue for issue in all_issues if "pull_request" not in issue]
-        print(f"DEBUG: Successfully fetched {len(result['recent_issues'])} issues")
-        
-        # 5. Fetch pull requests
-        print(f"DEBUG: Fetching pull requests for {repo_path}")
-        prs_response = requests.get(
-            f"https://api.github.com/repos/{repo_path}/pulls?state=all&per_page=10",
-            headers=github_headers,
-            timeout=10
-        )
-        
-        if prs_response.status_code == 200:
-            result["pull_requests"] = prs_response.json()
-            print(f"DEBUG: Successfully fetched {len(result['pull_requests'])} pull requests")
-        
-        # 6. Fetch releases
-        releases_response = requests.get(
-            f"https://api.github.com/repos/{repo_path}/releases?per_page=10",
-            headers=github_headers,
-            timeout=10
-        )
-        
-        if releases_response.status_code == 200:
-            result["releases"] = releases_response.json()
-            print(f"DEBUG: Successfully fetched {len(result['releases'])} releases")
-        
-        # 7. Fetch contributors
-        contributors_response = requests.get(
-            f"https://api.github.com/repos/{repo_path}/contributors?per_page=15",
-            headers=github_headers,
-            timeout=10
-        )
-        
-        if contributors_response.status_code == 200:
-            result["contributors"] = contributors_response.json()
-            print(f"DEBUG: Successfully fetched {len(result['contributors'])} contributors")
-        
-        # 8. Fetch file structure recursively with no depth limit
-        # Using a queue-based approach to avoid recursion limits
-        print(f"DEBUG: Fetching complete file structure for {repo_path}")
-        fetch_directory_content_complete(repo_path, result["file_structure"], github_headers)
-        print(f"DEBUG: Fetched complete file structure with {len(result['file_structure'])} entries")
-        
-        # 9. Fetch file contents in parallel
-        print(f"DEBUG: Fetching important file contents in parallel")
-        fetch_important_file_contents_parallel(repo_path, result["file_structure"], result["file_contents"], github_headers)
-        print(f"DEBUG: Fetched {len(result['file_contents'])} file contents")
+            file_future.result()
+        finally:
+            # Don't block on metadata calls that overran their deadline
+            executor.shutdown(wait=False)
         
         # 10. Find media files
-        for path, info in result["file_structure"].items():
-            if info.get("type") == "file":
-                for ext in MEDIA_EXTENSIONS:
-                    if path.lower().endswith(ext):
-                        result["media_files"].append({
-                            "path": path,
-                            "name": info.get("name"),
-                            "type": ext.lstrip('.'),
-                            "url": info.get("html_url")
-                        })
-                        break
+        result["media_files"] = find_media_files(result["file_structure"])
         
-        print(f"DEBUG: Found {len(result['media_files'])} media files")
+        debug(f"Found {len(result['media_files'])} media files")
+        debug(f"GitHub conditional request cache: {get_http_cache_stats()}")
+        debug(f"GitHub rate limit scheduler: {github.rate_limiter.stats}")
         
     except Exception as e:
         print(f"ERROR: Error in fetch_repository_data: {str(e)}")
@@ -581,32 +1064,263 @@ def fetch_repository_data(repo_path):
     
     return result
 
-def fetch_directory_content_complete(repo_path, file_structure, headers):
+def find_media_files(file_structure):
+    """List the image and video files in the file structure"""
+    tree = as_file_tree(file_structure)
+    media_files = []
+    for row in tree.rows_with_suffixes(MEDIA_EXTENSIONS, item_type="file"):
+        media_files.append({
+            "path": tree.paths[row],
+            "name": tree.paths[row].rsplit('/', 1)[-1],
+            "type": tree.extensions[tree.ext_ids[row]].lstrip('.'),
+            "url": tree.html_url(row)
+        })
+    return media_files
+
+def fetch_readme(repo_path):
+    """Fetch the README as raw text, trying alternate locations if needed"""
+    debug(f"Fetching README for {repo_path}")
+    readme_response = github.get(f"/repos/{repo_path}/readme", accept="application/vnd.github.raw")
+    
+    if readme_response.status_code == 200:
+        debug(f"Successfully fetched README, length: {len(readme_response.text)}")
+        return readme_response.text
+    
+    debug(f"No standard README found, trying alternate locations")
+    for readme_name in ["readme.md", "README.md", "Readme.md"]:
+        try:
+            alt_readme_response = github.get(f"/repos/{repo_path}/contents/{readme_name}")
+            if alt_readme_response.status_code == 200:
+                content_data = alt_readme_response.json()
+                if content_data.get("encoding") == "base64" and content_data.get("content"):
+                    debug(f"Successfully fetched README from {readme_name}")
+                    return base64.b64decode(content_data["content"]).decode('utf-8', errors='replace')
+        except Exception as e:
+            debug(f"Error checking alternate README {readme_name}: {str(e)}")
+    return None
+
+@traced('languages')
+def fetch_languages(repo_path):
+    """Fetch the language breakdown in bytes"""
+    languages_response = github.get(f"/repos/{repo_path}/languages")
+    if languages_response.status_code == 200:
+        languages = languages_response.json()
+        debug(f"Successfully fetched languages: {list(languages.keys())}")
+        return languages
+    return None
+
+@traced('issues')
+def fetch_recent_issues(repo_path):
+    """Fetch up to 3 pages of recent issues, excluding pull requests"""
+    debug(f"Fetching issues for {repo_path}")
+    all_issues = []
+    page = 1
+    while page <= 3:  # Limit to 3 pages (30 issues) to avoid excessive API calls
+        issues_response = github.get(f"/repos/{repo_path}/issues?state=all&per_page=10&page={page}")
+        
+        if issues_response.status_code != 200 or not issues_response.json():
+            break
+            
+        issues_page = issues_response.json()
+        all_issues.extend(issues_page)
+        page += 1
+        
+        if len(issues_page) < 10:  # Last page has fewer than 10 items
+            break
+    
+    # Filter out pull requests
+    issues = [issue for issue in all_issues if "pull_request" not in issue]
+    debug(f"Successfully fetched {len(issues)} issues")
+    return issues
+
+@traced('pull_requests')
+def fetch_pull_requests(repo_path):
+    """Fetch recent pull requests"""
+    debug(f"Fetching pull requests for {repo_path}")
+    prs_response = github.get(f"/repos/{repo_path}/pulls?state=all&per_page=10")
+    if prs_response.status_code == 200:
+        debug(f"Successfully fetched {len(prs_response.json())} pull requests")
+        return prs_response.json()
+    return None
+
+@traced('releases')
+def fetch_releases(repo_path):
+    """Fetch recent releases"""
+    releases_response = github.get(f"/repos/{repo_path}/releases?per_page=10")
+    if releases_response.status_code == 200:
+        debug(f"Successfully fetched {len(releases_response.json())} releases")
+        return releases_response.json()
+    return None
+
+@traced('contributors')
+def fetch_contributors(repo_path):
+    """Fetch top contributors"""
+    contributors_response = github.get(f"/repos/{repo_path}/contributors?per_page=15")
+    if contributors_response.status_code == 200:
+        debug(f"Successfully fetched {len(contributors_response.json())} contributors")
+        return contributors_response.json()
+    return None
+
+def fetch_repository_files(repo_path, tree_ref, result, progress=None, on_partial=None):
+    """
+    Fetch the file structure and the important file contents into `result`
+    """
+    # 8. Fetch the complete file structure from the Git Trees API,
+    # falling back to walking the contents API directory by directory
+    debug(f"Fetching complete file structure for {repo_path}")
+    report_progress(progress, 'file_structure')
+    result["file_structure"] = FileTree(repo_path, tree_ref)
+    with span('tree_walk') as tree_span:
+        if not fetch_repository_tree(repo_path, tree_ref, result["file_structure"]):
+            print(f"WARNING: Git Trees API unavailable for {repo_path}, walking contents API")
+            fetch_directory_content_complete(repo_path, result["file_structure"])
+        tree_span['entries'] = len(result["file_structure"])
+    debug(f"Fetched complete file structure with {len(result['file_structure'])} entries")
+    
+    # 9. Fetch file contents (single tarball stream, or per-file in parallel)
+    debug(f"Fetching important file contents")
+    if on_partial:
+        on_partial(result)
+    report_progress(progress, 'file_contents', entries=len(result["file_structure"]))
+    with span('file_fetch') as fetch_span:
+        fetch_file_contents(repo_path, tree_ref, result["repo_info"], result["file_structure"], result["file_contents"],
+                            recall_hints(repo_path))
+        fetch_span['files'] = len(result["file_contents"])
+        fetch_span['bytes'] = result["file_contents"].total_size()
+    debug(f"Fetched {len(result['file_contents'])} file contents")
+    
+    # Import graph and entry points of what was fetched, to rank the next fetch of this repository
+    result["ranking_hints"] = build_ranking_hints(result["file_structure"], result["file_contents"])
+    remember_hints(repo_path, result["ranking_hints"])
+    report_progress(progress, 'files_ready', files=len(result["file_contents"]))
+
+def fetch_git_tree(repo_path, tree_sha, recursive):
+    """Fetch a single Git tree object, optionally with all of its descendants"""
+    tree_url = f"/repos/{repo_path}/git/trees/{tree_sha}"
+    if recursive:
+        tree_url += "?recursive=1"
+    response = github.get(tree_url, timeout=15)
+    if response.status_code != 200:
+        print(f"WARNING: Could not fetch tree {tree_sha}: {response.status_code}")
+        return None
+    return response.json()
+
+def add_tree_entries(prefix, entries, file_structure):
+    """
+    Add Git tree entries to the file structure, keeping blob SHAs and sizes.
+    Returns the (path, sha) pairs of subtrees found in the entries.
+    """
+    subtrees = []
+    for entry in entries:
+        item_path = prefix + entry.get("path", "")
+        entry_type = entry.get("type")
+
+        # Skip very large binary files and git-related files
+        if is_ignored_path(item_path):
+            continue
+
+        if entry_type == "tree":
+            item_type = "dir"
+            subtrees.append((item_path, entry.get("sha")))
+        elif entry_type == "commit":
+            item_type = "submodule"
+        elif entry.get("mode") == "120000":
+            item_type = "symlink"
+        else:
+            item_type = "file"
+
+        file_structure.add(item_path, item_type, entry.get("size", 0), entry.get("sha"))
+    return subtrees
+
+def is_ignored_path(path):
+    """Whether the tree walk leaves a path out of the file structure"""
+    return path.startswith('.git') or any(path.lower().endswith(ext) for ext in BINARY_EXTENSIONS)
+
+def tree_entry(repo_path, ref, item_path, item_type, sha, size=0):
+    """Build a file structure entry"""
+    url_kind = "tree" if item_type == "dir" else "blob"
+    return {
+        "name": item_path.rsplit('/', 1)[-1],
+        "path": item_path,
+        "type": item_type,
+        "size": size,
+        "sha": sha,
+        "html_url": f"https://github.com/{repo_path}/{url_kind}/{ref}/{item_path}"
+    }
+
+def fetch_repository_tree(repo_path, ref, file_structure):
+    """
+    Fetch the complete file structure with the Git Trees API in as few calls as
+    possible. When GitHub truncates the recursive listing, the truncated tree is
+    listed one level at a time and each subtree is fetched recursively on its own.
+    Returns False if the tree could not be fetched at all.
+    """
+    try:
+        root = fetch_git_tree(repo_path, ref, recursive=True)
+        if root is None:
+            return False
+
+        add_tree_entries("", root.get("tree", []), file_structure)
+        if not root.get("truncated"):
+            debug(f"Fetched complete tree in one request ({len(file_structure)} entries)")
+            return True
+
+        print(f"WARNING: Recursive tree for {repo_path} was truncated, fetching per subtree")
+        requests_count = 1
+        pending = deque([("", root.get("sha"))])
+        while pending:
+            prefix, tree_sha = pending.popleft()
+
+            # List this level only, then try each subtree as a recursive fetch
+            level = fetch_git_tree(repo_path, tree_sha, recursive=False)
+            requests_count += 1
+            if level is None:
+                continue
+            subtrees = add_tree_entries(prefix, level.get("tree", []), file_structure)
+
+            for subtree_path, subtree_sha in subtrees:
+                subtree = fetch_git_tree(repo_path, subtree_sha, recursive=True)
+                requests_count += 1
+                if subtree is None:
+                    continue
+                if subtree.get("truncated"):
+                    pending.append((subtree_path + "/", subtree_sha))
+                else:
+                    add_tree_entries(subtree_path + "/", subtree.get("tree", []), file_structure)
+
+        debug(f"Fetched truncated tree in {requests_count} requests ({len(file_structure)} entries)")
+        return True
+
+    except Exception as e:
+        print(f"ERROR: Failed to fetch repository tree: {str(e)}")
+        traceback.print_exc()
+        return False
+
+def fetch_directory_content_complete(repo_path, file_structure):
     """
     Non-recursive directory content fetching using a queue-based approach
     to handle repositories of any depth
     """
     try:
         # Use a queue to store directories that need to be processed
-        queue = [("", 0)]  # (path, depth) pairs
+        queue = deque([("", 0)])  # (path, depth) pairs
         requests_count = 0
         
         # Process directories until queue is empty or we hit rate limits
         while queue and requests_count < 60:  # Soft limit on total requests to prevent timeouts
-            current_path, depth = queue.pop(0)
+            current_path, depth = queue.popleft()
             path_param = current_path if current_path else ""
-            contents_url = f"https://api.github.com/repos/{repo_path}/contents/{path_param}"
+            contents_url = f"/repos/{repo_path}/contents/{path_param}"
             
-            print(f"DEBUG: Fetching directory content for {path_param or 'root'}")
-            response = requests.get(contents_url, headers=headers, timeout=10)
+            debug(f"Fetching directory content for {path_param or 'root'}")
+            response = github.get(contents_url)
             requests_count += 1
             
-            # Handle GitHub API rate limits
-            if response.status_code == 403 and 'rate limit' in response.text.lower():
-                print("WARNING: GitHub API rate limit reached. Waiting and retrying...")
-                time.sleep(10)  # Wait briefly before retrying
-                queue.insert(0, (current_path, depth))  # Re-add to queue
-                continue
+            # The client has already waited out short rate limits; stop on long ones
+            if RateLimitScheduler.is_rate_limited(response):
+                print("WARNING: GitHub API rate limit reached, returning partial file structure")
+                queue.appendleft((current_path, depth))
+                break
             
             # Skip if we can't access this directory
             if response.status_code != 200:
@@ -628,336 +1342,366 @@ def fetch_directory_content_complete(repo_path, file_structure, headers):
                     continue
                 
                 # Add to file structure
-                file_structure[item_path] = {
-                    "name": item.get("name"),
-                    "path": item_path,
-                    "type": item_type,
-                    "size": item.get("size", 0),
-                    "html_url": item.get("html_url")
-                }
+                file_structure.add(item_path, item_type, item.get("size", 0), item.get("sha"))
                 
                 # Queue subdirectories for processing
                 if item_type == "dir":
                     queue.append((item_path, depth + 1))
-            
-            # Avoid hitting rate limits
-            if requests_count % 10 == 0:
-                time.sleep(1)
+
+        if queue:
+            print(f"WARNING: Stopped after {requests_count} requests, {len(queue)} directories not listed")
                 
     except Exception as e:
         print(f"ERROR: Failed to fetch complete directory content: {str(e)}")
         traceback.print_exc()
 
-def fetch_important_file_contents_parallel(repo_path, file_structure, file_contents, headers):
+def select_files_to_fetch(file_structure, repo_info=None, hints=None):
     """
-    Fetch file contents in parallel with intelligent prioritization
-    based on file types and importance
+    Rank files with the file_ranking signals and return the best ones that
+    fit MAX_FILES_TO_FETCH and MAX_TOTAL_CONTENT_SIZE as (path, info, score)
+    tuples, highest score first
+    """
+    with span('file_ranking') as ranking_span:
+        selected = rank_files(file_structure, MAX_FILES_TO_FETCH, MAX_TOTAL_CONTENT_SIZE, BINARY_EXTENSIONS, repo_info, hints)
+        ranking_span['files'] = len(selected)
+    return selected
+
+def fetch_file_contents(repo_path, ref, repo_info, file_structure, file_contents, hints=None):
+    """
+    Fetch the selected file contents, preferring a single tarball download
+    and falling back to per-file requests. `hints` are the ranking hints of
+    an earlier snapshot of the repository, if one is known.
+    """
+    files_to_fetch = select_files_to_fetch(file_structure, repo_info, hints)
+    # Bodies already in the blob store (other snapshots, forks, vendored copies) aren't downloaded again
+    files_to_fetch = reuse_known_blobs(files_to_fetch, file_contents)
+    if not files_to_fetch:
+        return
+    repo_size_kb = repo_info.get("size", 0)
+    budget = github.rate_limiter.available('core')
+    low_budget = budget is not None and budget < MAX_FILES_TO_FETCH
+    use_tarball = ref and (
+        FILE_INGESTION_MODE == "tarball" or
+        (FILE_INGESTION_MODE == "auto" and (repo_size_kb <= TARBALL_MAX_REPO_KB or low_budget))
+    )
+
+    if use_tarball:
+        if fetch_file_contents_from_tarball(repo_path, ref, files_to_fetch, file_contents):
+            return
+        print(f"WARNING: Tarball ingestion failed for {repo_path}, fetching files individually")
+    else:
+        debug(f"Using per-file ingestion for {repo_path} (mode: {FILE_INGESTION_MODE}, size: {repo_size_kb}KB)")
+
+    fetch_important_file_contents_parallel(repo_path, ref, files_to_fetch, file_contents)
+
+def fetch_file_contents_from_tarball(repo_path, ref, files_to_fetch, file_contents):
+    """
+    Stream the repository tarball for `ref` in a single request and extract only
+    the selected files, without staging to disk. Binary members are skipped
+    after their first bytes. Returns False if the tarball could not be read.
+    """
+    # The selection already fits the byte budget; the tarball streams in path order
+    wanted = {path: info for path, info, _ in files_to_fetch}
+
+    if not wanted:
+        return True
+
+    budget = FetchBudget(MAX_TOTAL_CONTENT_SIZE, MAX_FILES_TO_FETCH)
+    try:
+        debug(f"Streaming tarball for {repo_path}@{ref} to extract {len(wanted)} files")
+        with github.get(f"/repos/{repo_path}/tarball/{ref}", timeout=30, stream=True) as response:
+            if response.status_code != 200:
+                print(f"WARNING: Could not download tarball: {response.status_code}")
+                return False
+
+            with tarfile.open(fileobj=response.raw, mode="r|gz") as archive:
+                for member in archive:
+                    if not member.isfile():
+                        continue
+
+                    # Archive entries are prefixed with "{owner}-{repo}-{sha}/"
+                    path = member.name.split('/', 1)[1] if '/' in member.name else member.name
+                    info = wanted.pop(path, None)
+                    if info is None:
+                        continue
+
+                    extracted = archive.extractfile(member)
+                    if extracted is None:
+                        continue
+
+                    with span('file', path=path, bytes=member.size, source='tarball'):
+                        body = read_capped(file_chunks(extracted), body_cap(member.size))
+                    if body.binary:
+                        debug(f"Skipping binary file {path}")
+                    else:
+                        file_contents[path] = content_entry(info, body, member.size, path)
+                        budget.charge(len(body.data))
+
+                    # Stop reading the stream once everything is extracted or the budget is spent
+                    if not wanted or budget.spent:
+                        break
+
+        debug(f"Extracted {budget.files} files ({budget.bytes / 1024 / 1024:.2f}MB) from tarball")
+        return True
+
+    except Exception as e:
+        print(f"ERROR: Failed to read tarball for {repo_path}: {str(e)}")
+        traceback.print_exc()
+        return False
+
+def fetch_important_file_contents_parallel(repo_path, ref, files_to_fetch, file_contents):
+    """
+    Fetch the selected file contents at `ref` concurrently with the fetch
+    engine, best-ranked first. Bodies are stored under the blob SHAs of the
+    tree listed at `ref`, so they must be read at the same ref. Once the byte or file budget is spent, queued requests
+    are cancelled and requests in flight stop reading.
     """
     try:
-        # Sort files by priority and size
-        files_to_fetch = []
-        
-        for path, info in file_structure.items():
-            if info.get("type") != "file":
-                continue
-            
-            # Skip binary files and very large files (>10MB)
-            if info.get("size", 0) > 10 * 1024 * 1024:
-                print(f"DEBUG: Skipping large file: {path} ({info.get('size', 0) / 1024 / 1024:.2f}MB)")
-                continue
-                
-            if any(path.lower().endswith(ext) for ext in BINARY_EXTENSIONS):
-                continue
-            
-            # Calculate priority score
-            priority = 0
-            
-            # Boost priority for important file extensions
-            for ext in PRIORITY_EXTENSIONS:
-                if path.lower().endswith(ext):
-                    priority += 10
-                    break
-                    
-            # Boost priority for important file names
-            for name in ['readme', 'license', 'contributing', 'changelog', 'dockerfile']:
-                if name in path.lower():
-                    priority += 5
-                    break
-            
-            # Boost priority for top-level files
-            if '/' not in path:
-                priority += 3
-                
-            # Penalize very large text files
-            size_mb = info.get('size', 0) / (1024 * 1024)
-            if size_mb > 0.5:  # Greater than 500KB
-                priority -= int(size_mb * 2)
-                
-            # Add to list with priority
-            files_to_fetch.append((path, info, priority))
-        
-        # Sort by priority (highest first)
-        files_to_fetch.sort(key=lambda x: x[2], reverse=True)
         
-        # Use thread pool to fetch files in parallel
-        fetched_count = 0
-        total_size = 0
-        MAX_TOTAL_SIZE = 10 * 1024 * 1024  # 10MB total content limit
+        # Degrade to the highest-priority files when the GitHub budget is low
+        budget = github.rate_limiter.available('core')
+        if budget is not None:
+            max_files = max(0, budget - github.rate_limiter.reserve('core'))
+            if max_files < len(files_to_fetch):
+                print(f"WARNING: Only {budget} GitHub requests left, fetching top {max_files} files")
+                files_to_fetch = files_to_fetch[:max_files]
+        
+        fetch_budget = FetchBudget(MAX_TOTAL_CONTENT_SIZE, MAX_FILES_TO_FETCH)
+        results = fetch_files(
+            repo_path, [(path, info) for path, info, _ in files_to_fetch if path not in file_contents], ref, fetch_budget
+        )
+        for path, content_result in results.items():
+            if content_result and not content_result.get("binary"):
+                file_contents[path] = content_result
         
-        with ThreadPoolExecutor(max_workers=5) as executor:  # 5 workers to avoid throttling
-            # Submit tasks for the top 500 files by priority
-            future_to_path = {}
-            for path, info, _ in files_to_fetch[:500]:
-                future = executor.submit(
-                    fetch_single_file_content, repo_path, path, info, headers
-                )
-                future_to_path[future] = path
-            
-            # Process results as they complete
-            for future in as_completed(future_to_path):
-                path = future_to_path[future]
-                
-                try:
-                    content_result = future.result()
-                    if content_result:
-                        file_contents[path] = content_result
-                        fetched_count += 1
-                        total_size += len(content_result.get('content', ''))
-                        
-                        # Stop if we've fetched too much data
-                        if total_size > MAX_TOTAL_SIZE:
-                            print(f"DEBUG: Reached content size limit ({total_size / 1024 / 1024:.2f}MB). Stopping.")
-                            break
-                except Exception as e:
-                    print(f"ERROR: Failed to fetch content for {path}: {str(e)}")
-                    
-        print(f"DEBUG: Fetched {fetched_count} files with total size {total_size / 1024 / 1024:.2f}MB")
+        debug(f"Fetched {fetch_budget.files} files with total size {fetch_budget.bytes / 1024 / 1024:.2f}MB")
         
     except Exception as e:
         print(f"ERROR: Failed in fetch_important_file_contents_parallel: {str(e)}")
         traceback.print_exc()
 
-def fetch_single_file_content(repo_path, path, info, headers):
-    """Fetch a single file's content"""
-    try:
-        file_size = info.get('size', 0)
-        max_size = 10 * 1024 * 1024  # 10MB per file max
-        
-        if file_size > max_size:
-            # For large files, include a truncated version with a warning
-            content_response = requests.get(
-                f"https://api.github.com/repos/{repo_path}/contents/{path}",
-                headers={**headers, "Accept": "application/vnd.github.raw"},
-                timeout=15
-            )
-            
-            if content_response.status_code == 200:
-                content = content_response.text[:100000]  # Take first ~100KB
-                return {
-                    "name": info.get("name"),
-                    "content": content + "\n\n[FILE TRUNCATED] This file was too large to display completely.",
-                    "truncated": True,
-                    "size": file_size
-                }
-        else:
-            # For normal files, get the full content
-            content_response = requests.get(
-                f"https://api.github.com/repos/{repo_path}/contents/{path}",
-                headers={**headers, "Accept": "application/vnd.github.raw"},
-                timeout=15
-            )
-            
-            if content_response.status_code == 200:
-                return {
-                    "name": info.get("name"),
-                    "content": content_response.text,
-                    "truncated": False,
-                    "size": file_size
-                }
-                
-    except Exception as e:
-        print(f"ERROR: Failed to fetch content for {path}: {str(e)}")
-        
-    return None
+def get_retrieval_index(repo_path, repo_data):
+    """
+    Return the retrieval index for a snapshot, built once and cached with it
+    """
+    return snapshot_cache.get_derived(
+        repo_path,
+        repo_data.get("head_sha"),
+        "retrieval_index",
+        lambda: RetrievalIndex.build(repo_data.get("file_contents", {}))
+    )
+
+def build_repo_context(repo_path, repo_data):
+    """
+    Build the question-independent repository context with the context packer.
+    Each section and file is an item with a priority; the packer keeps what
+    fits in the budget left after RETRIEVAL_TOKEN_BUDGET and reports what was
+    truncated or dropped. The output depends only on the snapshot, so it is
+    byte-identical for every question and can be cached by Bedrock.
+    """
+    repo_info = repo_data.get("repo_info", {})
+    readme = repo_data.get("readme", "")
+    languages = repo_data.get("languages", {})
+    issues = repo_data.get("recent_issues", [])
+    contributors = repo_data.get("contributors", [])
+    file_structure = as_file_tree(repo_data.get("file_structure"))
+    file_contents = repo_data.get("file_contents", {})
+    media_files = repo_data.get("media_files", [])
+    
+    packer = ContextPacker(PROMPT_TOKEN_BUDGET - RETRIEVAL_TOKEN_BUDGET)
+    packer.add_section("repo_info", "Repository Information:")
+    packer.add_section("languages", "Languages:")
+    packer.add_section("contributors", "Top Contributors:")
+    packer.add_section("issues", "Recent Issues:")
+    packer.add_section("structure", "Repository Structure:")
+    packer.add_section("media", "Media Files:")
+    packer.add_section("readme", "README Content:")
+    packer.add_section("files", "File Contents:")
+    
+    packer.add("repo_info", "repository information", "\n".join([
+        f"- Name: {repo_info.get('name')}",
+        f"- Full Name: {repo_info.get('full_name')}",
+        f"- Description: {repo_info.get('description')}",
+        f"- Stars: {repo_info.get('stargazers_count')}",
+        f"- Forks: {repo_info.get('forks_count')}",
+        f"- Open Issues: {repo_info.get('open_issues_count')}",
+        f"- Topics: {', '.join(repo_info.get('topics', []))}",
+    ]), priority=100)
+    
+    # Format languages for display
+    total_bytes = sum(languages.values()) if languages else 0
+    if total_bytes > 0:
+        packer.add("languages", "languages", "\n".join([
+            f"- {lang}: {round(bytes/total_bytes * 100, 1)}%"
+            for lang, bytes in sorted(languages.items(), key=lambda x: x[1], reverse=True)
+        ]), priority=85)
+    
+    packer.add("contributors", "contributors", "\n".join([
+        f"- {contrib.get('login')}: {contrib.get('contributions')} contributions"
+        for contrib in contributors[:50]
+    ]), priority=40, truncatable=True)
+    
+    packer.add("issues", "issues", "\n".join([
+        f"- #{issue.get('number')}: {issue.get('title')} ({issue.get('state')})"
+        for issue in issues[:50]
+    ]), priority=50, truncatable=True)
+    
+    # Summarize the structure
+    file_count = len(file_structure)
+    dir_count = file_structure.count('dir')
+    top_level_dirs = [f"- {path}/" for path in file_structure.top_level('dir')]
+    top_level_files = [f"- {path}" for path in file_structure.top_level('file')]
+    packer.add("structure", "repository structure", (
+        f"Total: {file_count} files, {dir_count} directories\n"
+        "\nTop-level directories:\n" + "\n".join(top_level_dirs[:50]) +
+        "\n\nTop-level files:\n" + "\n".join(top_level_files[:50])
+    ), priority=90, truncatable=True)
+    
+    packer.add("media", "media files", "\n".join([
+        f"- {media.get('path')} ({media.get('type')})"
+        for media in media_files[:100]
+    ]), priority=20, truncatable=True)
+    
+    # The start of the README is core context; the rest only fills spare budget
+    if readme and len(readme) > MAX_README_CHARS:
+        readme = readme[:MAX_README_CHARS] + "... [README truncated]"
+    packer.add("readme", "README", readme[:README_HEAD_CHARS], priority=80, truncatable=True)
+    packer.add("readme", "README (continued)", readme[README_HEAD_CHARS:], priority=45, truncatable=True)
+    
+    # Files, shallowest paths first, to fill the remaining budget
+    for rank, path in enumerate(sorted(file_contents, key=lambda p: (p.count('/'), p))):
+        entry = file_contents[path]
+        content = entry.get("content", "")
+        # Files cut here or at fetch time are not whole, so retrieval still searches them
+        cut = entry.get("truncated", False)
+        if len(content) > MAX_FILE_CHARS:
+            content = content[:MAX_FILE_CHARS] + "\n\n[TRUNCATED]"
+            cut = True
+        packer.add("files", path, f"\nFILE: {path}\n{content}", priority=30 - rank * 0.01, truncatable=True, truncated=cut)
+    
+    return packer.pack()
+
+def get_repo_context(repo_path, repo_data):
+    """
+    Return the packed repository context for a snapshot, rendered once and
+    cached with it
+    """
+    return snapshot_cache.get_derived(
+        repo_path,
+        repo_data.get("head_sha"),
+        "repo_context",
+        lambda: build_repo_context(repo_path, repo_data)
+    )
 
-def process_with_claude(repo_path, repo_data, message):
+def build_question_context(repo_path, repo_data, message, whole_files):
+    """
+    Pack the chunks most relevant to the question into RETRIEVAL_TOKEN_BUDGET,
+    skipping files the repository context already includes in full
+    """
+    packer = ContextPacker(RETRIEVAL_TOKEN_BUDGET)
+    packer.add_section("files", "Relevant Code:")
+    
+    selected_ranges = {}
+    retrieval_index = get_retrieval_index(repo_path, repo_data)
+    for rank, (score, path, start_line, end_line, text) in enumerate(retrieval_index.search(message, limit=RETRIEVAL_TOP_K)):
+        if path in whole_files:
+            continue
+        # Skip windows that overlap a chunk already taken from the same file
+        ranges = selected_ranges.setdefault(path, [])
+        if any(start_line <= taken_end and end_line >= taken_start for taken_start, taken_end in ranges):
+            continue
+        ranges.append((start_line, end_line))
+        packer.add("files", f"{path}:{start_line}-{end_line}",
+                   f"\nFILE: {path} (lines {start_line}-{end_line})\n{text}",
+                   priority=70 - rank * 0.1)
+    
+    return packer.pack()
+
+def build_claude_request(repo_path, repo_data, message, request_id):
+    """
+    Build the Bedrock request body for a question about the repository. The
+    repository context goes in the system prompt as a stable prefix marked as
+    a prompt cache point; the retrieved code and the question follow it in
+    the user turn.
+    """
+    with span('prompt_build') as prompt_span:
+        request_body = assemble_claude_request(repo_path, repo_data, message, request_id)
+        prompt_span['chars'] = len(request_body["system"][0]["text"]) + len(request_body["messages"][0]["content"])
+        return request_body
+
+def assemble_claude_request(repo_path, repo_data, message, request_id):
+    repo_context = get_repo_context(repo_path, repo_data)
+    logger.info(f"[{request_id}] Packed repository context: {repo_context.summary()}")
+    if repo_context.dropped:
+        logger.info(f"[{request_id}] Dropped from context: {', '.join(repo_context.dropped[:20])}")
+    
+    whole_files = set(repo_context.included) - set(repo_context.truncated)
+    question_context = build_question_context(repo_path, repo_data, message, whole_files)
+    logger.info(f"[{request_id}] Packed question context: {question_context.summary()}")
+    
+    system_message = (
+        "You are an AI assistant that helps users understand GitHub repositories.\n"
+        f"You are currently analyzing the repository: {repo_path}\n\n"
+        f"{repo_context.text}\n\n"
+        "Answer the user's question based on this repository information. Be specific and detailed, "
+        "citing files and code when relevant. If you don't know the answer, say so rather than making up information."
+    )
+    
+    if repo_context.truncated:
+        system_message += f"\n\nNote: The following items were truncated due to size: {', '.join(repo_context.truncated)}"
+    if repo_data.get("partial"):
+        system_message += "\n\nNote: This repository is still being indexed, so file contents are not available yet."
+    
+    # Log the message structure and size to debug potential content issues
+    logger.info(f"[{request_id}] System message length: {len(system_message)} chars")
+    
+    system_block = {"type": "text", "text": system_message}
+    if PROMPT_CACHE_ENABLED:
+        system_block["cache_control"] = {"type": "ephemeral"}
+    
+    user_content = message
+    if question_context.text:
+        user_content = f"<relevant_code>\n{question_context.text}\n</relevant_code>\n\n{message}"
+    
+    request_body = {
+        "anthropic_version": "bedrock-2023-05-31",
+        "max_tokens": 4096,
+        "temperature": 0.7,
+        "system": [system_block],
+        "messages": [{"role": "user", "content": user_content}]
+    }
+    
+    return request_body
+
+def record_prompt_usage(request_id, usage):
+    """Accumulate and log input token usage, including prompt cache reads and writes"""
+    if not usage:
+        return
+    with prompt_cache_lock:
+        prompt_cache_stats['requests'] += 1
+        for key in ('input_tokens', 'cache_read_input_tokens', 'cache_creation_input_tokens'):
+            prompt_cache_stats[key] += usage.get(key) or 0
+    logger.info(f"[{request_id}] Input tokens: {usage.get('input_tokens')}, "
+                f"cache read: {usage.get('cache_read_input_tokens') or 0}, "
+                f"cache write: {usage.get('cache_creation_input_tokens') or 0}; totals: {prompt_cache_stats}")
+
+def process_with_claude(repo_path, repo_data, message, cache_key=None):
     """
     Process repository data with Claude to answer user's questions
-    with improved error handling and retry logic
+    with improved error handling and retry logic. Successful answers about
+    a complete snapshot are stored in the answer cache under `cache_key`.
     """
-    request_id = f"req-{random.randint(1000, 9999)}"
+    request_id = current_request_id() or f"req-{random.randint(1000, 9999)}"
     logger.info(f"[{request_id}] Processing request for repo: {repo_path}, message: '{message}'")
     
     try:
-        # Extract repository data
-        repo_info = repo_data.get("repo_info", {})
-        readme = repo_data.get("readme", "")
-        languages = repo_data.get("languages", {})
-        issues = repo_data.get("recent_issues", [])
-        prs = repo_data.get("pull_requests", [])
-        contributors = repo_data.get("contributors", [])
-        releases = repo_data.get("releases", [])
-        file_structure = repo_data.get("file_structure", {})
-        file_contents = repo_data.get("file_contents", {})
-        media_files = repo_data.get("media_files", [])
-        
-        # Format languages for display
-        total_bytes = sum(languages.values()) if languages else 0
-        language_text = ""
-        if total_bytes > 0:
-            language_text = "\n".join([
-                f"- {lang}: {round(bytes/total_bytes * 100, 1)}%"
-                for lang, bytes in sorted(languages.items(), key=lambda x: x[1], reverse=True)
-            ])
-        
-        # Format contributors
-        contributor_text = "\n".join([
-            f"- {contrib.get('login')}: {contrib.get('contributions')} contributions"
-            for contrib in contributors[:50]
-        ])
-        
-        # Format issues
-        issues_text = "\n".join([
-            f"- #{issue.get('number')}: {issue.get('title')} ({issue.get('state')})"
-            for issue in issues[:50]
-        ])
-        
-        # Format key files (summarize the structure)
-        file_count = len(file_structure)
-        dir_count = sum(1 for info in file_structure.values() if info.get('type') == 'dir')
-        file_structure_summary = f"Total: {file_count} files, {dir_count} directories\n"
-        
-        # Add key directories
-        top_level_dirs = []
-        for path, info in file_structure.items():
-            if info.get('type') == 'dir' and '/' not in path:
-                top_level_dirs.append(f"- {path}/")
-        file_structure_summary += "\nTop-level directories:\n" + "\n".join(sorted(top_level_dirs)[:50])
-        
-        # Add key files
-        top_level_files = []
-        for path, info in file_structure.items():
-            if info.get('type') == 'file' and '/' not in path:
-                top_level_files.append(f"- {path}")
-        file_structure_summary += "\n\nTop-level files:\n" + "\n".join(sorted(top_level_files)[:50])
-        
-        # Prepare file contents for the AI model
-        file_content_text = ""
-        truncated_files = []
-        
-        # Check specifically for utils.py or any other files that might have the Claude 3.7 reference
-        important_specific_files = []
-        for path, info in file_contents.items():
-            if "utils.py" in path.lower() or "agent.py" in path.lower() or "bedrock" in path.lower():
-                important_specific_files.append((path, info))
-        
-        # Add highest priority specific files first
-        for path, info in important_specific_files:
-            content = info.get("content", "")
-            if "claude-3-7" in content.lower():
-                logger.info(f"[{request_id}] Found Claude 3.7 reference in {path}")
-            if len(content) > 10000:
-                content = content[:10000] + "\n\n[TRUNCATED]"
-                truncated_files.append(path)
-            file_content_text += f"\n\nFILE: {path}\n{content}"
-        
-        # Add remaining important files
-        remaining_file_space = 50000 - len(file_content_text)
-        if remaining_file_space > 5000:  # Only continue if we have reasonable space left
-            for path, info in file_contents.items():
-                # Skip already included files
-                if any(p == path for p, _ in important_specific_files):
-                    continue
-                
-                # Skip large content blocks to avoid context window limits
-                content = info.get("content", "")
-                if len(content) > 5000:
-                    content = content[:5000] + "\n\n[TRUNCATED]"
-                    truncated_files.append(path)
-                    
-                file_text = f"\n\nFILE: {path}\n{content}"
-                if len(file_text) + len(file_content_text) > 50000:
-                    break
-                    
-                file_content_text += file_text
-        
-        # Format media files
-        media_text = "\n".join([
-            f"- {media.get('path')} ({media.get('type')})"
-            for media in media_files[:100]
-        ])
-        
-        # Truncate README if too long
-        if len(readme) > 4000:
-            readme = readme[:4000] + "... [README truncated]"
-        
-        # Build system message
-        system_message = f"""
-        You are an AI assistant that helps users understand GitHub repositories.
-        You are currently analyzing the repository: {repo_path}
-        
-        Repository Information:
-        - Name: {repo_info.get('name')}
-        - Full Name: {repo_info.get('full_name')}
-        - Description: {repo_info.get('description')}
-        - Stars: {repo_info.get('stargazers_count')}
-        - Forks: {repo_info.get('forks_count')}
-        - Open Issues: {repo_info.get('open_issues_count')}
-        - Topics: {', '.join(repo_info.get('topics', []))}
-        
-        Languages:
-        {language_text}
-        
-        Top Contributors:
-        {contributor_text}
-        
-        Recent Issues:
-        {issues_text}
-        
-        Repository Structure:
-        {file_structure_summary}
-        
-        Media Files:
-        {media_text}
-        
-        README Content:
-        {readme}
-        
-        File Contents:
-        {file_content_text}
-        
-        Answer the user's question based on this repository information. Be specific and detailed, citing files and code when relevant. If you don't know the answer, say so rather than making up information.
-        """
+        request_body = build_claude_request(repo_path, repo_data, message, request_id)
         
-        if truncated_files:
-            system_message += f"\n\nNote: The following files were truncated due to size: {', '.join(truncated_files)}"
-        
-        # Log the message structure and size to debug potential content issues
-        logger.info(f"[{request_id}] System message length: {len(system_message)} chars")
-        
-        # Format for Claude 3.5
-        user_message = {
-            "role": "user",
-            "content": f"<instructions>\n{system_message}\n</instructions>\n\n{message}"
-        }
-        
-        request_body = {
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 4096,
-            "temperature": 0.7,
-            "messages": [user_message]
-        }
-        
-        # Verify bedrock_runtime is available
-        if 'bedrock_runtime' not in globals():
-            try:
-                import boto3
-                global bedrock_runtime
-                bedrock_runtime = boto3.client('bedrock-runtime')
-                logger.info(f"[{request_id}] Initialized bedrock-runtime client")
-            except Exception as e:
-                logger.error(f"[{request_id}] Failed to initialize bedrock-runtime: {str(e)}")
-                return "Error: Could not connect to AI service. Please check your configuration."
+        try:
+            bedrock_runtime = get_client('bedrock-runtime')
+        except Exception as e:
+            logger.error(f"[{request_id}] Failed to initialize bedrock-runtime: {str(e)}")
+            return "Error: Could not connect to AI service. Please check your configuration."
         
         # Retry configuration
         max_retries = 5  # Number of total attempts
@@ -971,11 +1715,12 @@ def process_with_claude(repo_path, repo_data, message):
                 
                 # Call Claude with timeout handling
                 start_time = time.time()
-                response = bedrock_runtime.invoke_model(
-                    modelId="us.anthropic.claude-3-5-haiku-20241022-v1:0",
-                    body=json.dumps(request_body),
-                    contentType="application/json"
-                )
+                with span('bedrock_call', attempt=attempt + 1):
+                    response = bedrock_runtime.invoke_model(
+                        modelId=CLAUDE_MODEL_ID,
+                        body=json.dumps(request_body),
+                        contentType="application/json"
+                    )
                 elapsed = time.time() - start_time
                 logger.info(f"[{request_id}] API call successful in {elapsed:.2f}s")
                 
@@ -988,9 +1733,13 @@ def process_with_claude(repo_path, repo_data, message):
                         logger.error(f"[{request_id}] Invalid response structure: {json.dumps(response_body)}")
                         return "Error: Received an invalid response from the AI service. Please try again."
                     
+                    record_prompt_usage(request_id, response_body.get("usage"))
+                    
                     # Success! Return the text response
                     result = response_body["content"][0]["text"]
                     logger.info(f"[{request_id}] Successfully generated response ({len(result)} chars)")
+                    if cache_key and repo_data.get("head_sha"):
+                        answer_cache.put(cache_key, result)
                     return result
                     
                 except (KeyError, IndexError, json.JSONDecodeError) as parse_err:
@@ -1040,4 +1789,59 @@ def process_with_claude(repo_path, repo_data, message):
         # Catch any exceptions in the preprocessing phase
         logger.error(f"[{request_id}] Error during preprocessing: {str(e)}")
         logger.error(traceback.format_exc())
-        return "Sorry, I encountered an error processing your request. Please try again."
\ No newline at end of file
+        return "Sorry, I encountered an error processing your request. Please try again."
+
+def stream_with_claude(repo_path, repo_data, message):
+    """
+    Generate the answer with invoke_model_with_response_stream, yielding text
+    as the model produces it. Throttled calls are retried with backoff until
+    the first text arrives; after that an error ends the stream.
+    """
+    request_id = current_request_id() or f"req-{random.randint(1000, 9999)}"
+    logger.info(f"[{request_id}] Streaming request for repo: {repo_path}, message: '{message}'")
+    request_body = build_claude_request(repo_path, repo_data, message, request_id)
+    
+    # Retry configuration
+    max_retries = 5
+    base_delay = 2
+    max_delay = 60
+    
+    for attempt in range(max_retries):
+        started = False
+        try:
+            start_time = time.time()
+            with span('bedrock_call', attempt=attempt + 1, streaming=True) as call_span:
+                response = get_client('bedrock-runtime').invoke_model_with_response_stream(
+                    modelId=CLAUDE_MODEL_ID,
+                    body=json.dumps(request_body),
+                    contentType="application/json"
+                )
+            
+                for event in response["body"]:
+                    chunk = event.get("chunk")
+                    if not chunk:
+                        continue
+                    payload = json.loads(chunk["bytes"])
+                    if payload.get("type") == "message_start":
+                        record_prompt_usage(request_id, payload["message"].get("usage"))
+                    elif payload.get("type") == "content_block_delta" and payload["delta"].get("type") == "text_delta":
+                        if not started:
+                            started = True
+                            call_span['first_token_ms'] = round((time.time() - start_time) * 1000, 1)
+                            logger.info(f"[{request_id}] First token after {time.time() - start_time:.2f}s")
+                        yield payload["delta"]["text"]
+            
+            logger.info(f"[{request_id}] Stream completed in {time.time() - start_time:.2f}s")
+            return
+        
+        except botocore.exceptions.ClientError as e:
+            error_code = e.response["Error"]["Code"]
+            logger.warning(f"[{request_id}] ClientError: {error_code} - {e.response['Error']['Message']}")
+            
+            if error_code == "ThrottlingException" and not started and attempt < max_retries - 1:
+                delay = min(max_delay, base_delay * (2 ** attempt))
+                wait_time = delay + delay * 0.2 * random.random()
+                logger.info(f"[{request_id}] Rate limited, retrying in {wait_time:.2f}s (attempt {attempt+1}/{max_retries})")
+                time.sleep(wait_time)
+                continue
+            raise
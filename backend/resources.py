@@ -0,0 +1,189 @@
+import json
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import debug
+
+# Secrets are re-read after this long so rotated credentials are picked up by warm containers
+SECRETS_TTL_SECONDS = int(os.environ.get('SECRETS_TTL_SECONDS', 900))
+# A factory that failed or returned None isn't called again for this long
+RESOURCE_RETRY_SECONDS = int(os.environ.get('RESOURCE_RETRY_SECONDS', 30))
+# Comma-separated resource names to create in parallel at import, e.g. "client:bedrock-runtime,table:ConversationHistory"
+PREWARM_RESOURCES = [name.strip() for name in os.environ.get('PREWARM_RESOURCES', '').split(',') if name.strip()]
+PREWARM_WORKERS = 4
+
+
+class ResourceUnavailable(Exception):
+    """Raised instead of calling a factory again while its last failure is recent"""
+
+
+class ResourceRegistry:
+    """
+    Creates clients, table handles and secrets on first use and keeps them
+    for later warm invocations. Factories are registered by name; entries
+    with a ttl are rebuilt once they are older than it. A factory that
+    raises or returns None is not memoized; for retry_seconds lookups raise
+    ResourceUnavailable (or return None) without calling it again.
+    """
+
+    def __init__(self, retry_seconds=RESOURCE_RETRY_SECONDS):
+        self.factories = {}  # name -> (factory, ttl, default)
+        self.entries = {}  # name -> (value, created_at)
+        self.failures = {}  # name -> (exception or None, failed_at)
+        self.retry_seconds = retry_seconds
+        self.locks = {}
+        self.lock = threading.Lock()
+        self.timings = {}  # name -> seconds spent in the last factory call
+
+    def register(self, name, factory, ttl=None, default=False):
+        """
+        Register the factory for `name`. The first registration wins, except
+        that an explicit factory replaces a default one (e.g. registered by
+        prewarm) and drops what that one built.
+        """
+        with self.lock:
+            registered = self.factories.get(name)
+            if registered is None:
+                self.locks[name] = threading.Lock()
+            elif default or not registered[2]:
+                return
+            else:
+                self.entries.pop(name, None)
+                self.failures.pop(name, None)
+            self.factories[name] = (factory, ttl, default)
+
+    def is_fresh(self, name, ttl):
+        entry = self.entries.get(name)
+        return entry is not None and (ttl is None or time.time() - entry[1] < ttl)
+
+    def get(self, name):
+        """Return the resource, creating (or refreshing) it if needed"""
+        factory, ttl, _ = self.factories[name]
+        if self.is_fresh(name, ttl):
+            return self.entries[name][0]
+
+        with self.locks[name]:
+            # Another thread may have created it while we waited
+            if self.is_fresh(name, ttl):
+                return self.entries[name][0]
+
+            stale = self.entries.get(name)
+            failure = self.failures.get(name)
+            if stale is None and failure is not None and time.time() - failure[1] < self.retry_seconds:
+                if failure[0] is None:
+                    return None
+                raise ResourceUnavailable(f"{name} failed {time.time() - failure[1]:.0f}s ago: {str(failure[0])}")
+
+            start_time = time.time()
+            try:
+                value = factory()
+            except Exception as e:
+                if stale is None:
+                    self.failures[name] = (e, time.time())
+                    raise
+                # Keep serving the old value rather than failing requests on a refresh
+                print(f"WARNING: Failed to refresh {name}, keeping the previous value: {str(e)}")
+                self.entries[name] = (stale[0], time.time())
+                return stale[0]
+            finally:
+                self.timings[name] = round(time.time() - start_time, 3)
+
+            if value is not None:
+                self.entries[name] = (value, time.time())
+                self.failures.pop(name, None)
+                debug(f"Created {name} in {self.timings[name]:.3f}s")
+            elif stale is None:
+                self.failures[name] = (None, time.time())
+            return value
+
+    def invalidate(self, name):
+        with self.lock:
+            self.entries.pop(name, None)
+            self.failures.pop(name, None)
+
+    def prewarm(self, names, max_workers=PREWARM_WORKERS):
+        """Create several resources in parallel; failures are logged, not raised"""
+        def create(name):
+            try:
+                self.get(name)
+            except Exception as e:
+                print(f"ERROR: Failed to prewarm {name}: {str(e)}")
+                traceback.print_exc()
+
+        names = [name for name in names if name in self.factories]
+        if not names:
+            return
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(names))) as executor:
+            list(executor.map(create, names))
+
+    def summary(self):
+        """Return which resources exist and how long each took to create"""
+        return {
+            'created': sorted(self.entries),
+            'timings': dict(self.timings),
+        }
+
+
+registry = ResourceRegistry()
+
+
+def new_session():
+    """boto3 sessions are not thread-safe, so each factory builds its own"""
+    import boto3  # Imported on first use; it dominates module import time
+    return boto3.session.Session()
+
+
+def load_secret(secret_name):
+    debug(f"Getting secret: {secret_name}")
+    response = get_client('secretsmanager').get_secret_value(SecretId=secret_name)
+    return json.loads(response['SecretString'])
+
+
+def register_default(name):
+    """Register the standard factory for "client:<service>", "table:<name>" or "secret:<name>" """
+    kind, _, target = name.partition(':')
+    if kind == 'client':
+        registry.register(name, lambda: new_session().client(target), default=True)
+    elif kind == 'table':
+        registry.register(name, lambda: new_session().resource('dynamodb').Table(target), default=True)
+    elif kind == 'secret':
+        registry.register(name, lambda: load_secret(target), ttl=SECRETS_TTL_SECONDS, default=True)
+    else:
+        raise ValueError(f"Unknown resource: {name}")
+
+
+def get_client(service):
+    """Return the memoized boto3 client for `service`"""
+    name = f"client:{service}"
+    register_default(name)
+    return registry.get(name)
+
+
+def get_table(table_name, factory=None):
+    """Return the memoized DynamoDB Table for `table_name`; `factory` overrides how it is built"""
+    name = f"table:{table_name}"
+    if factory is not None:
+        registry.register(name, factory)
+    else:
+        register_default(name)
+    return registry.get(name)
+
+
+def get_secret(secret_name):
+    """Return a JSON secret from Secrets Manager, re-read every SECRETS_TTL_SECONDS"""
+    name = f"secret:{secret_name}"
+    register_default(name)
+    return registry.get(name)
+
+
+def prewarm(names=PREWARM_RESOURCES):
+    """Create the named resources in parallel, e.g. at import to overlap their setup"""
+    for name in names:
+        try:
+            register_default(name)
+        except ValueError as e:
+            print(f"WARNING: {str(e)}")
+    registry.prewarm(names)
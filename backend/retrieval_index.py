@@ -0,0 +1,136 @@
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+
+# Chunking and scoring parameters
+CHUNK_LINES = 60
+CHUNK_OVERLAP_LINES = 10
+MAX_CHUNK_CHARS = 4000
+PATH_TOKEN_WEIGHT = 3
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+WORD_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|[0-9]+")
+CAMEL_PATTERN = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be by can do does for from has have how i if in is it its me my of on or
+so that the this to was what when where which who why will with you your
+""".split())
+
+
+def tokenize(text):
+    """
+    Split text into lowercase terms. Identifiers are kept whole and also split
+    on snake_case and camelCase boundaries, so `fetchRepoData` matches "repo".
+    """
+    terms = []
+    for word in WORD_PATTERN.findall(text):
+        lower = word.lower()
+        if lower not in STOPWORDS and len(lower) > 1:
+            terms.append(lower)
+        parts = [p.lower() for piece in word.split('_') for p in CAMEL_PATTERN.findall(piece)]
+        if len(parts) > 1:
+            terms.extend(p for p in parts if len(p) > 1 and p not in STOPWORDS)
+    return terms
+
+
+def path_terms(path):
+    """Tokens from a file path: directory names, file stem and extension"""
+    return tokenize(path.replace('/', ' ').replace('.', ' ').replace('-', ' '))
+
+
+def chunk_file(content):
+    """Split file content into overlapping line windows as (start_line, end_line, text)"""
+    lines = content.splitlines()
+    if not lines:
+        return []
+    chunks = []
+    step = CHUNK_LINES - CHUNK_OVERLAP_LINES
+    for start in range(0, len(lines), step):
+        window = lines[start:start + CHUNK_LINES]
+        text = "\n".join(window)[:MAX_CHUNK_CHARS]
+        chunks.append((start + 1, start + len(window), text))
+        if start + CHUNK_LINES >= len(lines):
+            break
+    return chunks
+
+
+class RetrievalIndex:
+    """
+    BM25 index over chunks of a repository snapshot's file contents. Each chunk
+    is scored on its content plus its file's path tokens, which are weighted up
+    so questions naming a module or directory find it.
+    """
+
+    def __init__(self):
+        self.chunks = []  # (path, start_line, end_line, text), None for removed chunks
+        self.lengths = []
+        self.postings = defaultdict(list)  # term -> [(chunk_id, term_frequency)]
+        self.live_chunks = 0
+        self.average_length = 0
+
+    @classmethod
+    def build(cls, file_contents):
+        index = cls()
+        index.add_files(file_contents)
+        index.update_stats()
+        return index
+
+    def add_files(self, file_contents):
+        for path, info in file_contents.items():
+            content = info.get("content", "")
+            path_counts = Counter(path_terms(path))
+            for start_line, end_line, text in chunk_file(content):
+                counts = Counter(tokenize(text))
+                for term, count in path_counts.items():
+                    counts[term] += count * PATH_TOKEN_WEIGHT
+                chunk_id = len(self.chunks)
+                self.chunks.append((path, start_line, end_line, text))
+                self.lengths.append(sum(counts.values()))
+                for term, count in counts.items():
+                    self.postings[term].append((chunk_id, count))
+
+    def update_stats(self):
+        live_lengths = [length for chunk, length in zip(self.chunks, self.lengths) if chunk is not None]
+        self.live_chunks = len(live_lengths)
+        self.average_length = sum(live_lengths) / len(live_lengths) if live_lengths else 0
+
+    def updated(self, removed_paths, file_contents):
+        """
+        Return a copy of the index without the chunks of `removed_paths` and
+        with `file_contents` (re)indexed. Only the given files are tokenized;
+        the rest of the index is reused. The original index is not modified.
+        """
+        stale = set(removed_paths) | set(file_contents)
+        dead = {i for i, chunk in enumerate(self.chunks) if chunk is not None and chunk[0] in stale}
+
+        index = RetrievalIndex()
+        index.chunks = [None if i in dead else chunk for i, chunk in enumerate(self.chunks)]
+        index.lengths = [0 if i in dead else length for i, length in enumerate(self.lengths)]
+        for term, postings in self.postings.items():
+            kept = [posting for posting in postings if posting[0] not in dead] if dead else list(postings)
+            if kept:
+                index.postings[term] = kept
+        index.add_files(file_contents)
+        index.update_stats()
+        return index
+
+    def search(self, query, limit=50):
+        """Return the best chunks for `query` as (score, path, start_line, end_line, text)"""
+        if not self.live_chunks:
+            return []
+        total = self.live_chunks
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, tf in postings:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[chunk_id] / self.average_length)
+                scores[chunk_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [(score, *self.chunks[chunk_id]) for chunk_id, score in best]
@@ -0,0 +1,4 @@
+#!/bin/bash
+# Handler of the streaming function: the Lambda Web Adapter (AWS_LAMBDA_EXEC_WRAPPER)
+# runs this script and forwards function URL requests to the server on $PORT
+PYTHONPATH=$PYTHONPATH:/opt/python:$LAMBDA_RUNTIME_DIR exec python3 stream_server.py
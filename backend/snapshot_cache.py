@@ -0,0 +1,306 @@
+import gzip
+import json
+import os
+import threading
+import time
+import traceback
+from collections import OrderedDict
+
+import blob_store
+import file_tree
+from blob_store import FileContents
+from file_tree import FileTree
+from resources import get_client
+from tracing import debug
+
+# Snapshot cache configuration
+SNAPSHOT_CACHE_MAX_BYTES = int(os.environ.get('SNAPSHOT_CACHE_MAX_BYTES', 96 * 1024 * 1024))
+SNAPSHOT_CACHE_TTL_SECONDS = int(os.environ.get('SNAPSHOT_CACHE_TTL_SECONDS', 3600))
+SNAPSHOT_CACHE_BUCKET = os.environ.get('SNAPSHOT_CACHE_BUCKET')
+SNAPSHOT_CACHE_DIR = os.environ.get('SNAPSHOT_CACHE_DIR', '/tmp/snapshot-cache')
+SNAPSHOT_CACHE_PREFIX = 'snapshots'
+
+
+def snapshot_key(repo_path, sha):
+    """Build the storage key for a repository snapshot"""
+    return f"{SNAPSHOT_CACHE_PREFIX}/{repo_path.lower()}/{sha}.json.gz"
+
+
+def latest_key(repo_path):
+    """Build the storage key for the pointer to a repository's latest complete snapshot"""
+    return f"{SNAPSHOT_CACHE_PREFIX}/{repo_path.lower()}/latest.json.gz"
+
+
+def encode_json_value(value):
+    if isinstance(value, FileContents):
+        return blob_store.encode_json_value(value)
+    return file_tree.encode_json_value(value)
+
+
+def decode_json_object(obj):
+    if '__file_contents__' in obj:
+        return blob_store.decode_json_object(obj)
+    return file_tree.decode_json_object(obj)
+
+
+def encode_snapshot(snapshot):
+    """Serialize and compress a snapshot dict"""
+    data = json.dumps(snapshot, separators=(',', ':'), default=encode_json_value)
+    return gzip.compress(data.encode('utf-8'), compresslevel=6)
+
+
+def decode_snapshot(data):
+    """Decompress and deserialize a snapshot dict"""
+    snapshot = json.loads(gzip.decompress(data).decode('utf-8'), object_hook=decode_json_object)
+    if isinstance(snapshot.get('file_contents'), dict):
+        # Stored before file bodies went through the blob store
+        snapshot['file_contents'] = FileContents.from_entries(snapshot['file_contents'])
+    if isinstance(snapshot.get('file_structure'), dict):
+        # Stored before file structures were FileTrees
+        repo_info = snapshot.get('repo_info') or {}
+        ref = snapshot.get('head_sha') or repo_info.get('default_branch') or 'HEAD'
+        snapshot['file_structure'] = FileTree.from_entries(snapshot['file_structure'], repo_info.get('full_name', ''), ref)
+    return snapshot
+
+
+class LRUSnapshotTier:
+    """
+    In-process LRU of snapshot dicts bounded by a byte budget. Lives at module
+    level so it survives warm Lambda invocations.
+    """
+
+    def __init__(self, max_bytes, on_evict=None):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.entries = OrderedDict()  # key -> (snapshot, size, stored_at)
+        self.lock = threading.Lock()
+        self.on_evict = on_evict
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, snapshot, size, stored_at):
+        if size > self.max_bytes:
+            debug(f"Snapshot {key} ({size} bytes) exceeds in-process cache budget, not cached")
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self.entries[key] = (snapshot, size, stored_at)
+            self.current_bytes += size
+            evicted_keys = []
+            while self.current_bytes > self.max_bytes and self.entries:
+                evicted_key, (_, evicted_size, _) = self.entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                evicted_keys.append(evicted_key)
+                debug(f"Evicted snapshot {evicted_key} from in-process cache")
+        if self.on_evict:
+            for evicted_key in evicted_keys:
+                self.on_evict(evicted_key)
+
+    def remove(self, key):
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+        if old is not None and self.on_evict:
+            self.on_evict(key)
+
+
+class S3SnapshotStore:
+    """Shared snapshot tier backed by an S3 bucket"""
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+
+    @property
+    def s3(self):
+        return get_client('s3')
+
+    def get(self, key):
+        try:
+            response = self.s3.get_object(Bucket=self.bucket, Key=key)
+            return response['Body'].read(), response['LastModified'].timestamp()
+        except self.s3.exceptions.NoSuchKey:
+            return None
+
+    def put(self, key, data):
+        self.s3.put_object(
+            Bucket=self.bucket,
+            Key=key,
+            Body=data,
+            ContentType='application/json',
+            ContentEncoding='gzip'
+        )
+
+
+class LocalDirSnapshotStore:
+    """Shared snapshot tier backed by a local directory (stand-in for S3)"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def get(self, key):
+        file_path = os.path.join(self.root, key)
+        if not os.path.exists(file_path):
+            return None
+        with open(file_path, 'rb') as f:
+            return f.read(), os.path.getmtime(file_path)
+
+    def put(self, key, data):
+        file_path = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        tmp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, file_path)
+
+
+class SnapshotCache:
+    """
+    Two-tier cache of fetch_repository_data results keyed by
+    (repo_path, default-branch HEAD SHA)
+    """
+
+    def __init__(self, local_tier, shared_store=None, ttl_seconds=SNAPSHOT_CACHE_TTL_SECONDS):
+        self.local_tier = local_tier
+        self.local_tier.on_evict = self.drop_derived
+        self.shared_store = shared_store
+        self.ttl_seconds = ttl_seconds
+        self.stats = {'local_hits': 0, 'shared_hits': 0, 'misses': 0}
+        # Artifacts derived from a snapshot (indexes, rendered prompts), dropped with it
+        self.derived = {}
+        self.derived_lock = threading.Lock()
+        # repo -> SHA of the most recently stored complete snapshot
+        self.latest = {}
+
+    def is_fresh(self, stored_at, snapshot=None):
+        # Issues, PRs and releases change without new commits, so bound their age.
+        # A patched snapshot is stored anew but keeps its base's metadata and fetched_at.
+        if snapshot is not None and snapshot.get("fetched_at"):
+            stored_at = min(stored_at, snapshot["fetched_at"])
+        return not self.ttl_seconds or time.time() - stored_at < self.ttl_seconds
+
+    def get(self, repo_path, sha):
+        """Return the cached snapshot for this commit, or None"""
+        key = snapshot_key(repo_path, sha)
+
+        entry = self.local_tier.get(key)
+        if entry is not None:
+            snapshot, _, stored_at = entry
+            if self.is_fresh(stored_at, snapshot):
+                self.stats['local_hits'] += 1
+                debug(f"Snapshot cache hit (in-process) for {repo_path}@{sha[:7]}")
+                return snapshot
+            self.local_tier.remove(key)
+
+        if self.shared_store is not None:
+            try:
+                stored = self.shared_store.get(key)
+                if stored is not None:
+                    data, stored_at = stored
+                    if self.is_fresh(stored_at):
+                        snapshot = decode_snapshot(data)
+                        if self.is_fresh(stored_at, snapshot):
+                            self.local_tier.put(key, snapshot, len(data), stored_at)
+                            self.stats['shared_hits'] += 1
+                            debug(f"Snapshot cache hit (shared) for {repo_path}@{sha[:7]}")
+                            return snapshot
+            except Exception as e:
+                print(f"ERROR: Failed to read shared snapshot {key}: {str(e)}")
+                traceback.print_exc()
+
+        self.stats['misses'] += 1
+        debug(f"Snapshot cache miss for {repo_path}@{sha[:7]}")
+        return None
+
+    def put(self, repo_path, sha, snapshot):
+        """Store a snapshot in both tiers"""
+        key = snapshot_key(repo_path, sha)
+        try:
+            data = encode_snapshot(snapshot)
+        except Exception as e:
+            print(f"ERROR: Failed to encode snapshot {key}: {str(e)}")
+            return
+
+        stored_at = time.time()
+        # A replaced snapshot (e.g. partial -> complete) invalidates what was derived from it
+        self.drop_derived(key)
+        self.local_tier.put(key, snapshot, len(data), stored_at)
+
+        if self.shared_store is not None:
+            try:
+                self.shared_store.put(key, data)
+                debug(f"Stored snapshot {key} ({len(data) / 1024:.1f}KB compressed)")
+            except Exception as e:
+                print(f"ERROR: Failed to write shared snapshot {key}: {str(e)}")
+                traceback.print_exc()
+
+        if not snapshot.get("partial"):
+            self.set_latest_sha(repo_path, sha)
+
+    def set_latest_sha(self, repo_path, sha):
+        self.latest[repo_path.lower()] = sha
+        if self.shared_store is not None:
+            try:
+                self.shared_store.put(latest_key(repo_path), encode_snapshot({"sha": sha}))
+            except Exception as e:
+                print(f"ERROR: Failed to write latest snapshot pointer for {repo_path}: {str(e)}")
+
+    def get_latest_sha(self, repo_path):
+        """Return the SHA of the latest complete snapshot stored for the repository, or None"""
+        sha = self.latest.get(repo_path.lower())
+        if sha is None and self.shared_store is not None:
+            try:
+                stored = self.shared_store.get(latest_key(repo_path))
+                if stored is not None:
+                    sha = decode_snapshot(stored[0])["sha"]
+            except Exception as e:
+                print(f"ERROR: Failed to read latest snapshot pointer for {repo_path}: {str(e)}")
+        return sha
+
+    def get_derived(self, repo_path, sha, name, builder):
+        """
+        Return an artifact derived from the snapshot at `sha`, building it with
+        `builder()` on first use. Artifacts live in process memory for as long
+        as their snapshot stays in the in-process tier.
+        """
+        if not sha:
+            return builder()
+        key = snapshot_key(repo_path, sha)
+        with self.derived_lock:
+            artifact = self.derived.get(key, {}).get(name)
+        if artifact is not None:
+            return artifact
+
+        artifact = builder()
+        if self.local_tier.get(key) is not None:
+            with self.derived_lock:
+                self.derived.setdefault(key, {})[name] = artifact
+        return artifact
+
+    def peek_derived(self, repo_path, sha, name):
+        """Return an already-built derived artifact, or None"""
+        with self.derived_lock:
+            return self.derived.get(snapshot_key(repo_path, sha), {}).get(name)
+
+    def drop_derived(self, key):
+        with self.derived_lock:
+            self.derived.pop(key, None)
+
+
+def create_snapshot_cache():
+    """Build the snapshot cache from environment configuration"""
+    if SNAPSHOT_CACHE_BUCKET:
+        shared_store = S3SnapshotStore(SNAPSHOT_CACHE_BUCKET)
+    elif SNAPSHOT_CACHE_DIR:
+        shared_store = LocalDirSnapshotStore(SNAPSHOT_CACHE_DIR)
+    else:
+        shared_store = None
+    return SnapshotCache(LRUSnapshotTier(SNAPSHOT_CACHE_MAX_BYTES), shared_store)
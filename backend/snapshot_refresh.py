@@ -0,0 +1,83 @@
+import os
+
+from tracing import debug
+
+# Larger diffs are cheaper to handle with a full fetch (tarball or tree walk)
+REFRESH_MAX_CHANGED_FILES = int(os.environ.get('REFRESH_MAX_CHANGED_FILES', 100))
+COMPARE_FILES_LIMIT = 300  # The compare API lists at most this many files
+# Directories listed to size files added by a refresh; the compare API doesn't report sizes
+REFRESH_MAX_SIZE_LISTINGS = 10
+
+ADDED_STATUSES = ("added", "modified", "changed", "copied", "renamed")
+
+
+def parse_compare(compare):
+    """
+    Turn a compare API response into (status, path, previous_path, blob_sha)
+    changes. Returns None when the diff can't be applied to the base snapshot:
+    history was rewritten (not a fast-forward) or too many files changed.
+    """
+    if compare.get("status") not in ("ahead", "identical"):
+        debug(f"Compare status is {compare.get('status')}, not a fast-forward")
+        return None
+
+    files = compare.get("files") or []
+    if len(files) >= COMPARE_FILES_LIMIT or len(files) > REFRESH_MAX_CHANGED_FILES:
+        debug(f"{len(files)} files changed, over the incremental refresh limit")
+        return None
+
+    return [
+        (f.get("status"), f.get("filename"), f.get("previous_filename"), f.get("sha"))
+        for f in files
+    ]
+
+
+def parent_dirs(path):
+    """Yield the ancestor directories of a path, deepest first"""
+    while '/' in path:
+        path = path.rsplit('/', 1)[0]
+        yield path
+
+
+def patch_file_structure(file_structure, changes, make_entry, skip_path):
+    """
+    Apply compare changes to a copy of `file_structure`. `make_entry(path,
+    type, sha, size)` builds new entries and `skip_path(path)` filters paths
+    the tree walk ignores. The compare API doesn't report sizes, so a changed
+    file keeps the size of the file it replaces until the caller knows the
+    new one; added files get size 0. Returns (new_structure, changed_paths,
+    removed_paths).
+    """
+    structure = file_structure.copy()
+    changed, removed = set(), set()
+
+    for status, path, previous_path, sha in changes:
+        previous = structure.get(path)
+        if status == "renamed" and previous_path:
+            renamed_from = structure.pop(previous_path, None)
+            if renamed_from is not None:
+                removed.add(previous_path)
+                previous = previous or renamed_from
+        if status == "removed":
+            if structure.pop(path, None) is not None:
+                removed.add(path)
+            continue
+        if status not in ADDED_STATUSES or skip_path(path):
+            continue
+
+        structure[path] = make_entry(path, "file", sha, previous["size"] if previous else 0)
+        changed.add(path)
+        removed.discard(path)
+        for directory in parent_dirs(path):
+            if directory in structure:
+                break
+            structure[directory] = make_entry(directory, "dir", None, 0)
+
+    # Drop directories left empty by removals
+    candidate_dirs = {directory for path in removed for directory in parent_dirs(path)}
+    if candidate_dirs:
+        occupied = {directory for path in structure for directory in parent_dirs(path)}
+        for directory in candidate_dirs - occupied:
+            structure.pop(directory, None)
+
+    return structure, changed, removed
@@ -0,0 +1,125 @@
+"""
+HTTP server that streams /chat-stream responses as server-sent events.
+
+API Gateway's REST integration buffers Lambda proxy responses, so the
+/chat-stream route behind it returns all events at once. Running this server
+(locally, in a container, or on Lambda behind the Lambda Web Adapter with a
+function URL in RESPONSE_STREAM mode) flushes each event as it is produced.
+Other paths are forwarded to lambda_handler unchanged.
+
+    python stream_server.py  # listens on $PORT, default 8080
+
+The CloudFormation stack deploys it as ChatStreamLambda, started by run_stream.sh.
+"""
+import base64
+import json
+import os
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+# This process outlives requests, so conversation turns are saved by a background thread rather than a Lambda extension
+os.environ.setdefault('CONVERSATION_WRITE_MODE', 'thread')
+
+from lambda_function import chat_stream_events, configure_github_token, conversation_writer, get_user_id, lambda_handler
+from tracing import trace_request
+
+PORT = int(os.environ.get('PORT', 8080))
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Content-Type,Authorization,X-Amz-Date,X-Api-Key,X-Amz-Security-Token',
+    'Access-Control-Allow-Methods': 'OPTIONS,POST,GET',
+}
+
+
+class StreamingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def send_headers(self, status, headers):
+        self.send_response(status)
+        for name, value in {**CORS_HEADERS, **headers}.items():
+            self.send_header(name, value)
+        self.end_headers()
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length).decode('utf-8') if length else ''
+
+    def write_chunk(self, text):
+        data = text.encode('utf-8')
+        self.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_OPTIONS(self):
+        self.send_headers(200, {'Content-Length': '0'})
+
+    def do_GET(self):
+        self.forward_to_lambda('GET')
+
+    def do_POST(self):
+        if self.path.split('?')[0].endswith('/chat-stream'):
+            self.stream_chat()
+        else:
+            self.forward_to_lambda('POST')
+
+    def stream_chat(self):
+        try:
+            with trace_request('chat-stream') as trace:
+                self.stream_chat_events(trace.request_id)
+        finally:
+            # lambda_handler isn't on this path, so flush the turn it queued (sync mode) here,
+            # also when the client went away mid-stream
+            conversation_writer.invocation_done()
+
+    def stream_chat_events(self, request_id):
+        try:
+            body = json.loads(self.read_body() or '{}')
+        except ValueError:
+            body = {}
+        user_id = get_user_id(dict(self.headers))
+        configure_github_token()
+
+        self.send_headers(200, {
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+            'Transfer-Encoding': 'chunked',
+            'X-Request-Id': request_id,
+        })
+        try:
+            for event in chat_stream_events(body, user_id):
+                self.write_chunk(event)
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            print("WARNING: Client disconnected during chat stream")
+
+    def forward_to_lambda(self, method):
+        path, _, query = self.path.partition('?')
+        event = {
+            'httpMethod': method,
+            'path': path,
+            'headers': dict(self.headers),
+            'body': self.read_body() or None,
+            'queryStringParameters': dict(parse_qsl(query)) or None,
+        }
+        try:
+            response = lambda_handler(event, None)
+        except Exception:
+            traceback.print_exc()
+            response = {'statusCode': 500, 'headers': {}, 'body': json.dumps({'error': 'Internal error'})}
+
+        if response.get('isBase64Encoded'):
+            data = base64.b64decode(response.get('body') or '')
+        else:
+            data = (response.get('body') or '').encode('utf-8')
+        self.send_headers(response.get('statusCode', 200), {
+            **response.get('headers', {}),
+            'Content-Length': str(len(data)),
+        })
+        self.wfile.write(data)
+
+
+if __name__ == '__main__':
+    print(f"Streaming server listening on port {PORT}")
+    ThreadingHTTPServer(('', PORT), StreamingHandler).serve_forever()
@@ -0,0 +1,15 @@
+import os
+import sys
+
+# Backend modules import each other by their flat names, as on Lambda
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+# Keep caches in memory and everything in process when lambda_function is imported
+for name, value in {
+    'BLOB_STORE_DIR': '',
+    'SNAPSHOT_CACHE_DIR': '',
+    'ANSWER_CACHE_ENABLED': 'false',
+    'INGESTION_BACKEND': 'inline',
+    'TRACE_OUTPUT': 'off',
+    'LOG_DEBUG_SAMPLE_RATE': '0',
+}.items():
+    os.environ.setdefault(name, value)
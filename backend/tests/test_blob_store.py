@@ -0,0 +1,87 @@
+import os
+
+from blob_store import BlobStore, FileContents, git_blob_sha, decompress, reuse_known_blobs
+
+
+def body(n):
+    # Random hex, so every body compresses to about n // 2 bytes
+    return os.urandom(n // 2).hex()
+
+
+def test_put_and_get_round_trip():
+    store = BlobStore(10 ** 6)
+    text = "print('hi')\n"
+    sha = git_blob_sha(text.encode())
+    store.put(sha, text)
+    assert decompress(store.get(sha)) == text
+    assert store.get("0" * 40) is None
+
+
+def test_memory_tier_evicts_least_recently_used():
+    store = BlobStore(1500)
+    shas = []
+    for i in range(3):
+        text = body(1200)
+        shas.append(git_blob_sha(text.encode()))
+        store.put(shas[-1], text)
+    assert shas[0] not in store.entries
+    assert shas[-1] in store.entries
+    assert store.current_bytes <= 1500
+
+
+def test_disk_tier_survives_memory_eviction(tmp_path):
+    store = BlobStore(1, str(tmp_path))
+    text = body(1000)
+    sha = git_blob_sha(text.encode())
+    store.put(sha, text)
+    assert sha not in store.entries
+    assert decompress(store.get(sha)) == text
+    assert store.stats['disk_hits'] == 1
+
+
+def test_disk_tier_is_bounded(tmp_path):
+    store = BlobStore(10 ** 6, str(tmp_path), disk_max_bytes=1500)
+    shas = []
+    for i in range(5):
+        text = body(1200)
+        shas.append(git_blob_sha(text.encode()))
+        store.put(shas[-1], text)
+    on_disk = [name for _, _, names in os.walk(tmp_path) for name in names]
+    assert store.disk_bytes <= 1500
+    assert sum(os.path.getsize(store.blob_path(sha)) for sha in on_disk) == store.disk_bytes
+    assert shas[-1] in on_disk and shas[0] not in on_disk
+
+
+def test_disk_index_includes_blobs_from_earlier_processes(tmp_path):
+    first = BlobStore(10 ** 6, str(tmp_path))
+    for i in range(3):
+        text = body(1200)
+        first.put(git_blob_sha(text.encode()), text)
+    second = BlobStore(10 ** 6, str(tmp_path), disk_max_bytes=1500)
+    text = body(1200)
+    second.put(git_blob_sha(text.encode()), text)
+    assert second.disk_bytes <= 1500
+    assert len(second.disk_entries) == 2
+    assert git_blob_sha(text.encode()) in second.disk_entries
+
+
+def test_file_contents_reuse_known_blobs():
+    store = BlobStore(10 ** 6)
+    contents = FileContents(store)
+    contents.add("a.py", "a.py", "x = 1\n", 6)
+    sha = contents.sha("a.py")
+
+    other = FileContents(store)
+    remaining = reuse_known_blobs([("copy/a.py", {"name": "a.py", "sha": sha, "size": 6}, 1),
+                                   ("b.py", {"name": "b.py", "sha": "f" * 40, "size": 3}, 1)], other, store)
+    assert [path for path, _, _ in remaining] == ["b.py"]
+    assert other["copy/a.py"]["content"] == "x = 1\n"
+
+
+def test_file_contents_json_round_trip():
+    store = BlobStore(10 ** 6)
+    contents = FileContents(store)
+    contents.add("a.py", "a.py", "x = 1\n", 6)
+    contents.add("big.py", "big.py", "head", 10 ** 8, truncated=True)
+    restored = FileContents.from_json(contents.to_json(), store)
+    assert dict(restored.items()) == dict(contents.items())
@@ -0,0 +1,54 @@
+from blob_store import FileContents
+from context_packer import ContextPacker, estimate_tokens
+from file_tree import FileTree
+
+
+def test_items_that_fit_are_included_whole():
+    packer = ContextPacker(1000)
+    packer.add_section("files", "Files:")
+    packer.add("files", "a.py", "x = 1", priority=10, truncatable=True)
+    packed = packer.pack()
+    assert packed.included == ["a.py"]
+    assert packed.truncated == [] and packed.dropped == []
+
+
+def test_packer_truncation_is_reported():
+    packer = ContextPacker(300)
+    packer.add_section("files", "Files:")
+    packer.add("files", "big.py", "line\n" * 2000, priority=10, truncatable=True)
+    packed = packer.pack()
+    assert packed.truncated == ["big.py"]
+    assert packed.used_tokens <= 300
+
+
+def test_text_cut_by_the_caller_is_reported_as_truncated():
+    packer = ContextPacker(1000)
+    packer.add_section("files", "Files:")
+    packer.add("files", "cut.py", "head only", priority=10, truncatable=True, truncated=True)
+    packed = packer.pack()
+    assert packed.included == ["cut.py"]
+    assert packed.truncated == ["cut.py"]
+
+
+def test_items_that_dont_fit_are_dropped():
+    packer = ContextPacker(estimate_tokens("a" * 100))
+    packer.add_section("files", "Files:")
+    packer.add("files", "big.json", "a" * 10000, priority=10)
+    assert packer.pack().dropped == ["big.json"]
+
+
+def test_repo_context_counts_capped_files_as_truncated():
+    import lambda_function
+
+    contents = FileContents()
+    contents.add("small.py", "small.py", "print('hi')\n", 12)
+    contents.add("large.py", "large.py", "x = 1\n" * (lambda_function.MAX_FILE_CHARS // 3), lambda_function.MAX_FILE_CHARS * 2)
+    contents.add("huge.py", "huge.py", "y = 2\n", 20 * 1024 * 1024, truncated=True)
+    repo_data = {"repo_info": {"full_name": "owner/repo"}, "file_structure": FileTree("owner/repo", "HEAD"),
+                 "file_contents": contents, "readme": "Readme"}
+
+    packed = lambda_function.build_repo_context("owner/repo", repo_data)
+    whole_files = set(packed.included) - set(packed.truncated)
+    assert "small.py" in whole_files
+    assert "large.py" in packed.included and "large.py" not in whole_files
+    assert "huge.py" in packed.included and "huge.py" not in whole_files
@@ -0,0 +1,77 @@
+import base64
+import gzip
+import json
+
+from conversation_history import compress_response, list_conversations
+
+BODY = json.dumps({"conversations": [{"title": "x" * 50}] * 100})
+
+
+def response():
+    return {"statusCode": 200, "headers": {"Content-Type": "application/json"}, "body": BODY}
+
+
+def test_compresses_when_the_binary_type_is_accepted_first():
+    compressed = compress_response(response(), {"Accept": "application/gzip, application/json",
+                                                "Accept-Encoding": "gzip, br"})
+    assert compressed["isBase64Encoded"]
+    assert compressed["headers"]["Content-Encoding"] == "gzip"
+    assert gzip.decompress(base64.b64decode(compressed["body"])).decode() == BODY
+
+
+def test_leaves_other_requests_as_text():
+    # API Gateway would return the base64 text itself to these clients
+    for headers in ({"accept-encoding": "gzip"},
+                    {"Accept": "application/json, application/gzip", "Accept-Encoding": "gzip"},
+                    {"Accept": "application/gzip"}):
+        assert compress_response(response(), headers)["body"] == BODY
+
+
+class FakeTable:
+    name = 'ConversationHistory'
+
+    def __init__(self, items):
+        self.items = items
+        self.meta = self
+        self.client = self
+        self.batch_gets = []
+
+    def query(self, **params):
+        projected = ['conversationId', 'timestamp', 'repoPath', 'title']
+        return {'Items': [{k: item[k] for k in projected if k in item} for item in self.items]}
+
+    def batch_get_item(self, RequestItems):
+        keys = RequestItems[self.name]['Keys']
+        self.batch_gets.append(keys)
+        wanted = {key['timestamp'] for key in keys}
+        return {'Responses': {self.name: [
+            {'timestamp': item['timestamp'], 'question': item['question']}
+            for item in self.items if item['timestamp'] in wanted
+        ]}}
+
+
+def turn(conversation_id, timestamp, question, title=None):
+    item = {'userId': 'u', 'conversationId': conversation_id, 'timestamp': timestamp,
+            'repoPath': 'owner/repo', 'question': question}
+    if title:
+        item['title'] = title
+    return item
+
+
+def test_conversations_saved_without_a_title_are_titled_from_their_question():
+    table = FakeTable([
+        turn('new', '2026-01-03 10:00:00', 'Second question', title='First question'),
+        turn('old', '2026-01-02 10:00:00', 'A later follow-up'),
+        turn('old', '2026-01-01 10:00:00', 'How does the ingestion worker retry failed jobs after a timeout?'),
+    ])
+    conversations = {c['conversationId']: c for c in list_conversations(table, 'u')['conversations']}
+    assert conversations['new']['title'] == 'First question'
+    assert conversations['old']['title'] == 'How does the ingestion worker retry failed jobs af...'
+    # Only the untitled conversation's earliest turn is read
+    assert table.batch_gets == [[{'userId': 'u', 'timestamp': '2026-01-01 10:00:00'}]]
+
+
+def test_titled_pages_skip_the_question_lookup():
+    table = FakeTable([turn('new', '2026-01-03 10:00:00', 'Q', title='Q')])
+    list_conversations(table, 'u')
+    assert table.batch_gets == []
@@ -0,0 +1,161 @@
+import threading
+import uuid
+from datetime import timedelta
+
+import pytest
+
+import fetch_engine
+from blob_store import git_blob_sha
+from fetch_engine import AIMDLimit, OK, THROTTLED, ERROR
+from file_fetch import FetchBudget
+from file_tree import FileTree
+from github_client import RateLimitScheduler
+
+HEAD_SHA = 'c' * 40
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=b'', throttled=0, headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.throttled = throttled
+        self.headers = headers or {}
+        self.elapsed = timedelta(milliseconds=20)
+        self.text = ''
+
+    def iter_content(self, chunk_bytes):
+        for i in range(0, len(self.body), chunk_bytes):
+            yield self.body[i:i + chunk_bytes]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeGitHub:
+    """Serves file bodies by path; records the requested URLs"""
+
+    def __init__(self, bodies, throttled_paths=()):
+        self.bodies = bodies
+        self.throttled_paths = set(throttled_paths)
+        self.urls = []
+        self.lock = threading.Lock()
+        self.rate_limiter = RateLimitScheduler()
+
+    def get(self, url, **kwargs):
+        with self.lock:
+            self.urls.append(url)
+        path = url.split('/contents/', 1)[1].split('?', 1)[0]
+        if path not in self.bodies:
+            return FakeResponse(404)
+        return FakeResponse(200, self.bodies[path], throttled=int(path in self.throttled_paths))
+
+
+@pytest.fixture
+def fake_github(monkeypatch):
+    def install(bodies, throttled_paths=()):
+        client = FakeGitHub(bodies, throttled_paths)
+        monkeypatch.setattr(fetch_engine, 'github', client)
+        monkeypatch.setattr(fetch_engine, 'fetch_limit', AIMDLimit(4, 1, 8, 2.0))
+        return client
+    return install
+
+
+def file_info(path, body):
+    return {"name": path.rsplit('/', 1)[-1], "sha": git_blob_sha(body), "size": len(body)}
+
+
+def test_fetch_files_requests_every_file_at_ref(fake_github):
+    bodies = {f"src/m{i}.py": f"x = {i}\n".encode() for i in range(10)}
+    client = fake_github(bodies)
+    results = fetch_engine.fetch_files('owner/repo', [(path, file_info(path, body)) for path, body in bodies.items()], HEAD_SHA)
+    assert set(results) == set(bodies)
+    assert all(url.endswith(f"?ref={HEAD_SHA}") for url in client.urls)
+    assert results["src/m3.py"]["content"] == "x = 3\n"
+    assert results["src/m3.py"]["sha"] == git_blob_sha(bodies["src/m3.py"])
+
+
+def test_fetch_files_skips_binary_and_missing(fake_github):
+    fake_github({"a.py": b"ok\n", "logo.dat": b"\x89PNG\0\0"})
+    results = fetch_engine.fetch_files('owner/repo', [("a.py", file_info("a.py", b"ok\n")),
+                                                      ("logo.dat", file_info("logo.dat", b"")),
+                                                      ("gone.py", file_info("gone.py", b""))], HEAD_SHA)
+    assert results["a.py"]["content"] == "ok\n"
+    assert results["logo.dat"]["binary"]
+    assert results["gone.py"] is None
+
+
+def test_fetch_files_stops_at_budget(fake_github):
+    bodies = {f"m{i}.py": b"x" * 100 for i in range(50)}
+    client = fake_github(bodies)
+    budget = FetchBudget(max_bytes=1000, max_files=500)
+    results = fetch_engine.fetch_files('owner/repo', [(path, file_info(path, body)) for path, body in bodies.items()],
+                                       HEAD_SHA, budget)
+    fetched = [path for path, content in results.items() if content]
+    # Responses still in flight when the budget runs out are dropped
+    assert 0 < len(fetched) <= 10
+    assert len(client.urls) < 50
+
+
+def test_content_fetch_pins_the_snapshot_ref(fake_github, monkeypatch):
+    import lambda_function
+
+    # Unique bodies, so none is already in the process's blob store
+    bodies = {"main.py": f"print('{uuid.uuid4()}')\n".encode(), "lib/util.py": f"ID = '{uuid.uuid4()}'\n".encode()}
+    client = fake_github(bodies)
+    monkeypatch.setattr(lambda_function, 'FILE_INGESTION_MODE', 'contents')
+    tree = FileTree('owner/repo', HEAD_SHA)
+    for path, body in bodies.items():
+        tree.add(path, 'file', len(body), git_blob_sha(body))
+    contents = lambda_function.FileContents()
+
+    lambda_function.fetch_file_contents('owner/repo', HEAD_SHA, {"language": "Python"}, tree, contents)
+    assert set(contents) == set(bodies)
+    assert sorted(client.urls) == sorted(f"/repos/owner/repo/contents/{path}?ref={HEAD_SHA}" for path in bodies)
+
+
+def test_only_the_throttled_request_backs_off(fake_github):
+    bodies = {f"m{i}.py": b"x\n" for i in range(8)}
+    fake_github(bodies, throttled_paths={"m0.py"})
+    fetch_engine.fetch_files('owner/repo', [(path, file_info(path, body)) for path, body in bodies.items()], HEAD_SHA)
+    assert fetch_engine.fetch_limit.stats['throttled'] == 1
+    assert fetch_engine.fetch_limit.stats['decreases'] == 1
+
+
+def test_aimd_grows_while_healthy():
+    limit = AIMDLimit(2, 1, 10, 2.0)
+    for _ in range(100):
+        limit.record(limit.begin(), OK, 0.05)
+    assert limit.limit == 10
+
+
+def test_aimd_halves_once_per_round():
+    limit = AIMDLimit(8, 1, 10, 2.0)
+    tickets = [limit.begin() for _ in range(8)]
+    limit.record(tickets[0], THROTTLED)
+    limit.record(tickets[1], THROTTLED)
+    assert limit.limit == 4
+    # Late successes from the backed-off round don't grow the limit again
+    for ticket in tickets[2:]:
+        limit.record(ticket, OK, 0.05)
+    assert limit.limit == 4
+    limit.record(limit.begin(), THROTTLED)
+    assert limit.limit == 2
+
+
+def test_aimd_holds_when_latency_degrades():
+    limit = AIMDLimit(4, 1, 10, 2.0)
+    limit.record(limit.begin(), OK, 0.05)
+    grown = limit.limit
+    for _ in range(10):
+        limit.record(limit.begin(), OK, 1.0)
+    assert limit.limit - grown < 0.5
+
+
+def test_aimd_backs_off_on_error_bursts():
+    limit = AIMDLimit(8, 1, 10, 2.0)
+    for _ in range(5):
+        limit.record(limit.begin(), ERROR)
+    assert limit.limit == 4
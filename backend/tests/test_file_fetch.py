@@ -0,0 +1,58 @@
+from blob_store import git_blob_sha
+from file_fetch import (
+    Body, FetchBudget, read_capped, body_cap, content_entry,
+    MAX_FILE_BYTES, TRUNCATED_FILE_BYTES, BINARY_SNIFF_BYTES,
+)
+
+
+def chunks(data, size=1000):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def test_complete_body():
+    body = read_capped(chunks(b"a" * 5000), 10000)
+    assert body == Body(b"a" * 5000, False, False, False)
+
+
+def test_body_is_cut_at_cap():
+    body = read_capped(chunks(b"a" * 5000), 1500)
+    assert body.data == b"a" * 1500 and body.truncated
+
+
+def test_nul_in_sniff_window_is_binary():
+    body = read_capped(chunks(b"a" * 3000 + b"\0" + b"a" * 100), 10000)
+    assert body.binary and body.data is None
+
+
+def test_nul_after_sniff_window_is_text():
+    body = read_capped(chunks(b"a" * BINARY_SNIFF_BYTES + b"\0"), 20000)
+    assert not body.binary
+
+
+def test_spent_budget_cancels_reads():
+    budget = FetchBudget(max_bytes=100, max_files=10)
+    assert budget.charge(100)
+    assert budget.spent
+    assert read_capped(chunks(b"a" * 5000), 10000, budget).cancelled
+    assert not budget.charge(1)
+
+
+def test_file_budget():
+    budget = FetchBudget(max_bytes=10 ** 6, max_files=2)
+    assert budget.charge(1) and budget.charge(1)
+    assert budget.spent
+
+
+def test_body_cap_keeps_head_of_huge_files():
+    assert body_cap(MAX_FILE_BYTES + 1) == TRUNCATED_FILE_BYTES
+    assert body_cap(100) == MAX_FILE_BYTES
+
+
+def test_content_entry_uses_sha_of_bytes():
+    data = b"print('hi')\n"
+    entry = content_entry({"name": "a.py", "sha": git_blob_sha(data)}, Body(data, False, False, False), len(data))
+    assert entry["sha"] == git_blob_sha(data)
+
+    # A body read at another commit must not be stored under the tree's blob SHA
+    stale = content_entry({"name": "a.py", "sha": git_blob_sha(b"old\n")}, Body(data, False, False, False), 4)
+    assert stale["sha"] == git_blob_sha(data)
@@ -0,0 +1,55 @@
+from file_ranking import FileRanker, rank_files
+from file_tree import FileTree
+
+SHA = 'a' * 40
+
+
+def make_tree(paths, size=1000):
+    tree = FileTree('owner/repo', 'HEAD')
+    for path in paths:
+        tree.add(path, 'file', size, SHA)
+    return tree
+
+
+def selected_paths(tree, limit=500, byte_budget=10 * 1024 * 1024, repo_info=None, hints=None):
+    return [path for path, _, _ in rank_files(tree, limit, byte_budget, (), repo_info, hints)]
+
+
+def test_unknown_extensions_and_tests_are_selected_when_budget_allows():
+    paths = [
+        'README.md', 'mix.exs', 'lib/app/router.ex', 'assets/js/components/App.vue',
+        'lib/src/widget/widget.dart', 'src/game/engine/engine.lua', 'tests/test_core.py',
+        'android/app/src/main/Foo.kt',
+    ]
+    assert sorted(selected_paths(make_tree(paths), repo_info={'language': 'Elixir'})) == sorted(paths)
+
+
+def test_demoted_files_rank_below_source():
+    tree = make_tree(['src/app.py', 'tests/test_app.py', 'yarn.lock', 'node_modules/lib/index.js', 'README.md'])
+    selected = selected_paths(tree)
+    assert selected[0] == 'README.md'
+    assert selected.index('src/app.py') < selected.index('tests/test_app.py')
+    assert selected.index('src/app.py') < selected.index('node_modules/lib/index.js')
+
+
+def test_min_score_cuts_only_when_requested():
+    tree = make_tree(['src/app.py', 'node_modules/lib/index.js'])
+    assert [path for path, _, _ in FileRanker(tree).top(10, 10 ** 6, min_score=0)] == ['src/app.py']
+    assert len(FileRanker(tree).top(10, 10 ** 6)) == 2
+
+
+def test_file_limit_keeps_best_files():
+    tree = make_tree(['README.md', 'setup.py', 'docs/a/b/c/notes.txt', 'src/main.py'])
+    assert selected_paths(tree, limit=2) == ['README.md', 'setup.py']
+
+
+def test_byte_budget_evicts_weakest_files():
+    tree = make_tree(['README.md', 'src/main.py', 'docs/a/b/c/notes.txt'], size=400)
+    selected = selected_paths(tree, byte_budget=800)
+    assert selected == ['README.md', 'src/main.py']
+
+
+def test_import_hints_promote_central_files():
+    tree = make_tree(['pkg/deep/a/util.py', 'pkg/deep/a/other.py'])
+    hints = {'imports': {'pkg/deep/a/other.py': 10}, 'entry_points': []}
+    assert selected_paths(tree, limit=1, hints=hints) == ['pkg/deep/a/other.py']
@@ -0,0 +1,46 @@
+import time
+
+import pytest
+
+from github_client import RateLimitScheduler, RateLimitExceeded
+
+
+class FakeResponse:
+    status_code = 200
+    text = ''
+
+    def __init__(self, remaining, limit, reset_in):
+        self.headers = {
+            'X-RateLimit-Remaining': str(remaining),
+            'X-RateLimit-Limit': str(limit),
+            'X-RateLimit-Reset': str(time.time() + reset_in),
+        }
+
+
+def test_unauthenticated_budget_is_not_paced_while_plenty_remains():
+    scheduler = RateLimitScheduler()
+    scheduler.record(FakeResponse(remaining=49, limit=60, reset_in=3500))
+    for _ in range(40):
+        scheduler.acquire()
+    assert scheduler.stats['paced'] == 0
+    assert scheduler.available() == 9
+
+
+def test_reserve_scales_with_the_limit():
+    scheduler = RateLimitScheduler(reserve_fraction=0.02, min_reserve=5)
+    assert scheduler.reserve_for(60) == 5
+    assert scheduler.reserve_for(5000) == 100
+    assert scheduler.reserve() == 5
+
+
+def test_rejected_requests_dont_take_pacing_slots():
+    scheduler = RateLimitScheduler(max_wait=5)
+    scheduler.record(FakeResponse(remaining=3, limit=60, reset_in=60))
+    scheduler.acquire()  # First paced request goes now, the next slot is ~20s away
+    next_slot = scheduler.resources['core']['next_slot']
+    for _ in range(5):
+        with pytest.raises(RateLimitExceeded):
+            scheduler.acquire()
+    assert scheduler.resources['core']['next_slot'] == next_slot
+    assert scheduler.resources['core']['remaining'] == 2
+    assert scheduler.stats['rejected'] == 5
@@ -0,0 +1,18 @@
+from ingestion import create_ingestion_service, LocalIngestionQueue
+
+
+def build_snapshot(repo_path, sha, progress):
+    return {}
+
+
+def test_local_workers_run_off_lambda():
+    service = create_ingestion_service(build_snapshot, backend='local', on_lambda=False)
+    assert isinstance(service.job_queue, LocalIngestionQueue)
+
+
+def test_lambda_fetches_inline_instead_of_local_workers():
+    assert create_ingestion_service(build_snapshot, backend='local', on_lambda=True) is None
+
+
+def test_misconfigured_sqs_on_lambda_fetches_inline():
+    assert create_ingestion_service(build_snapshot, backend='sqs', on_lambda=True) is None
@@ -0,0 +1,40 @@
+import pytest
+
+from resources import ResourceRegistry, ResourceUnavailable
+
+
+def test_explicit_factory_replaces_a_default_registration():
+    registry = ResourceRegistry()
+    registry.register('table:T', lambda: 'plain', default=True)
+    assert registry.get('table:T') == 'plain'
+    registry.register('table:T', lambda: 'checked')
+    assert registry.get('table:T') == 'checked'
+    # Neither a later default nor a second explicit factory replaces it
+    registry.register('table:T', lambda: 'plain', default=True)
+    registry.register('table:T', lambda: 'other')
+    assert registry.get('table:T') == 'checked'
+
+
+def test_failed_factory_is_not_retried_right_away():
+    calls = []
+
+    def failing():
+        calls.append(1)
+        raise RuntimeError('secrets manager unreachable')
+
+    registry = ResourceRegistry(retry_seconds=60)
+    registry.register('secret:S', failing)
+    with pytest.raises(RuntimeError):
+        registry.get('secret:S')
+    for _ in range(3):
+        with pytest.raises(ResourceUnavailable):
+            registry.get('secret:S')
+    assert len(calls) == 1
+
+
+def test_failed_factory_is_retried_after_the_delay():
+    results = [None, 'table']
+    registry = ResourceRegistry(retry_seconds=0)
+    registry.register('table:T', lambda: results.pop(0))
+    assert registry.get('table:T') is None
+    assert registry.get('table:T') == 'table'
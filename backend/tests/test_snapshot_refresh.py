@@ -0,0 +1,49 @@
+import time
+
+from file_tree import FileTree
+from snapshot_cache import SnapshotCache, LRUSnapshotTier
+from snapshot_refresh import patch_file_structure
+
+SHA = "a" * 40
+
+
+def make_entry(path, item_type, sha, size):
+    return {"type": item_type, "size": size, "sha": sha}
+
+
+def base_tree():
+    tree = FileTree("owner/repo", "base")
+    tree.add("src", "dir")
+    tree.add("src/app.py", "file", 1200, "1" * 40)
+    tree.add("src/old.py", "file", 800, "2" * 40)
+    return tree
+
+
+def test_modified_file_keeps_its_size():
+    structure, changed, _ = patch_file_structure(base_tree(), [("modified", "src/app.py", None, SHA)],
+                                                 make_entry, lambda path: False)
+    assert changed == {"src/app.py"}
+    assert structure["src/app.py"]["size"] == 1200
+    assert structure["src/app.py"]["sha"] == SHA
+
+
+def test_renamed_file_takes_the_previous_size():
+    structure, changed, removed = patch_file_structure(base_tree(), [("renamed", "lib/new.py", "src/old.py", SHA)],
+                                                       make_entry, lambda path: False)
+    assert structure["lib/new.py"]["size"] == 800
+    assert "lib" in structure
+    assert removed == {"src/old.py"}
+
+
+def test_added_file_is_unsized():
+    structure, _, _ = patch_file_structure(base_tree(), [("added", "src/new.py", None, SHA)],
+                                           make_entry, lambda path: False)
+    assert structure["src/new.py"]["size"] == 0
+
+
+def test_patched_snapshot_expires_with_its_base_metadata():
+    cache = SnapshotCache(LRUSnapshotTier(10 ** 6), ttl_seconds=60)
+    cache.put("owner/repo", "head", {"fetched_at": time.time() - 120, "file_structure": base_tree()})
+    cache.put("owner/repo", "fresh", {"fetched_at": time.time(), "file_structure": base_tree()})
+    assert cache.get("owner/repo", "head") is None
+    assert cache.get("owner/repo", "fresh") is not None
@@ -0,0 +1,63 @@
+import io
+
+import lambda_function
+import stream_server
+from conversation_store import ConversationWriter
+
+
+class FakeTable:
+    name = 'ConversationHistory'
+
+    def __init__(self):
+        self.items = []
+        self.meta = self
+        self.client = self
+
+    def batch_write_item(self, RequestItems):
+        self.items.extend(request['PutRequest']['Item'] for request in RequestItems[self.name])
+        return {}
+
+
+class Headers(dict):
+    def get(self, name, default=None):
+        return super().get(name, default)
+
+
+def stream(monkeypatch, events):
+    table = FakeTable()
+    writer = ConversationWriter(lambda: table, 'sync')
+    monkeypatch.setattr(lambda_function, 'conversation_writer', writer)
+    monkeypatch.setattr(stream_server, 'conversation_writer', writer)
+    monkeypatch.setattr(stream_server, 'configure_github_token', lambda: None)
+    monkeypatch.setattr(stream_server, 'get_user_id', lambda headers: 'user-1')
+    monkeypatch.setattr(stream_server, 'chat_stream_events', events)
+
+    handler = stream_server.StreamingHandler.__new__(stream_server.StreamingHandler)
+    handler.headers = Headers({'Content-Length': '2'})
+    handler.rfile = io.BytesIO(b'{}')
+    handler.wfile = io.BytesIO()
+    handler.send_headers = lambda status, headers: None
+    handler.stream_chat()
+    return table, writer
+
+
+def answer(body, user_id):
+    yield "event: delta\ndata: {}\n\n"
+    lambda_function.save_chat_turn(user_id, 'conv_1', 'owner/repo', 'What is this?', 'A repo.')
+    yield "event: done\ndata: {}\n\n"
+
+
+def test_streamed_turn_is_written_in_sync_mode(monkeypatch):
+    table, writer = stream(monkeypatch, answer)
+    assert [item['conversationId'] for item in table.items] == ['conv_1']
+    assert not writer.pending
+
+
+def test_turn_is_written_when_the_client_disconnects(monkeypatch):
+    def disconnecting(body, user_id):
+        lambda_function.save_chat_turn(user_id, 'conv_2', 'owner/repo', 'Q', 'A')
+        raise BrokenPipeError()
+        yield
+
+    table, _ = stream(monkeypatch, disconnecting)
+    assert [item['conversationId'] for item in table.items] == ['conv_2']
@@ -0,0 +1,238 @@
+"""
+Request-scoped tracing and sampled debug logging.
+
+A trace is opened per request (or ingestion job) with trace_request(). Code
+inside it wraps each stage in span(name), and the trace is emitted once at
+the end as a single log line: CloudWatch embedded metric format (EMF) by
+default, so per-stage latency percentiles can be graphed without parsing
+logs, or plain JSON. Spans repeated many times in a request (one per file,
+say) are aggregated into count/total/max plus the slowest few items.
+
+debug() replaces unconditional debug prints: it logs when LOG_LEVEL is
+DEBUG, or for the fraction LOG_DEBUG_SAMPLE_RATE of requests, and prefixes
+each line with the request ID.
+"""
+import contextvars
+import functools
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', 0.01))
+# "emf" (CloudWatch embedded metrics), "json" or "off"
+TRACE_OUTPUT = os.environ.get('TRACE_OUTPUT', 'emf').lower()
+TRACE_NAMESPACE = os.environ.get('TRACE_NAMESPACE', 'AIGithub')
+TRACE_SLOWEST_ITEMS = 5  # Slowest spans of each repeated stage kept in the emitted trace
+
+current_trace = contextvars.ContextVar('current_trace', default=None)
+current_span = contextvars.ContextVar('current_span', default=None)
+
+
+class Trace:
+    """Spans recorded for one request; spans may be added from worker threads"""
+
+    def __init__(self, route, request_id=None):
+        self.route = route
+        self.request_id = request_id or uuid.uuid4().hex[:16]
+        self.debug = LOG_LEVEL == 'DEBUG' or random.random() < LOG_DEBUG_SAMPLE_RATE
+        self.started = time.time()
+        self.duration_ms = None
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def add(self, record):
+        with self.lock:
+            self.spans.append(record)
+
+    def stages(self):
+        """Aggregate spans by name: count, total and max duration, summed bytes, slowest items"""
+        with self.lock:
+            spans = list(self.spans)
+        stages = {}
+        for record in spans:
+            stage = stages.setdefault(record['name'], {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'errors': 0, 'items': []})
+            stage['count'] += 1
+            stage['total_ms'] += record['ms']
+            stage['max_ms'] = max(stage['max_ms'], record['ms'])
+            stage['errors'] += 1 if record.get('error') else 0
+            if 'bytes' in record:
+                stage['bytes'] = stage.get('bytes', 0) + record['bytes']
+            stage['items'].append(record)
+        for stage in stages.values():
+            stage['total_ms'] = round(stage['total_ms'], 1)
+            items = stage.pop('items')
+            if len(items) == 1:
+                stage.update({k: v for k, v in items[0].items() if k not in ('name', 'ms', 'error', 'bytes')})
+            else:
+                slowest = sorted(items, key=lambda record: record['ms'], reverse=True)[:TRACE_SLOWEST_ITEMS]
+                stage['slowest'] = [{k: v for k, v in record.items() if k not in ('name', 'parent')} for record in slowest]
+        return stages
+
+    def to_json(self):
+        return {
+            'type': 'trace',
+            'requestId': self.request_id,
+            'route': self.route,
+            'durationMs': self.duration_ms,
+            'stages': self.stages(),
+        }
+
+    def to_emf(self):
+        """CloudWatch EMF: one metric per stage (total ms, plus bytes where recorded)"""
+        stages = self.stages()
+        metrics = [{'Name': 'request_ms', 'Unit': 'Milliseconds'}]
+        values = {'request_ms': self.duration_ms}
+        for name, stage in stages.items():
+            metrics.append({'Name': f"{name}_ms", 'Unit': 'Milliseconds'})
+            values[f"{name}_ms"] = stage['total_ms']
+            if 'bytes' in stage:
+                metrics.append({'Name': f"{name}_bytes", 'Unit': 'Bytes'})
+                values[f"{name}_bytes"] = stage['bytes']
+        return {
+            '_aws': {
+                'Timestamp': int(self.started * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': TRACE_NAMESPACE,
+                    'Dimensions': [['Route']],
+                    'Metrics': metrics,
+                }],
+            },
+            'Route': self.route,
+            'requestId': self.request_id,
+            'stages': stages,
+            **values,
+        }
+
+    def emit(self):
+        if TRACE_OUTPUT == 'emf':
+            print(json.dumps(self.to_emf(), default=str))
+        elif TRACE_OUTPUT == 'json':
+            print(json.dumps(self.to_json(), default=str))
+
+
+@contextmanager
+def trace_request(route, request_id=None):
+    """Open a trace for the enclosed request and emit it when the block exits"""
+    trace = Trace(route, request_id)
+    token = current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        trace.duration_ms = round((time.time() - trace.started) * 1000, 1)
+        try:
+            current_trace.reset(token)
+        except ValueError:
+            # Generators may be finished from a different context than they started in
+            current_trace.set(None)
+        trace.emit()
+
+
+@contextmanager
+def span(name, **attrs):
+    """
+    Time the enclosed block as a stage of the current trace. Yields the span
+    record so the block can attach details such as `bytes`. A no-op outside
+    a trace.
+    """
+    trace = current_trace.get()
+    record = dict(attrs)
+    if trace is None:
+        yield record
+        return
+
+    parent = current_span.get()
+    if parent:
+        record['parent'] = parent
+    token = current_span.set(name)
+    start = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        if not isinstance(e, GeneratorExit):
+            record['error'] = type(e).__name__
+        raise
+    finally:
+        record['name'] = name
+        record['ms'] = round((time.perf_counter() - start) * 1000, 1)
+        try:
+            current_span.reset(token)
+        except ValueError:
+            current_span.set(parent)
+        trace.add(record)
+
+
+def traced(name):
+    """Decorator form of span() for functions that make up one stage"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def propagate(fn):
+    """
+    Bind `fn` to the current trace so spans it records on an executor thread
+    (which does not inherit context variables) land in this request's trace
+    """
+    trace, parent = current_trace.get(), current_span.get()
+    if trace is None:
+        return fn
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        trace_token, span_token = current_trace.set(trace), current_span.set(parent)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            current_span.reset(span_token)
+            current_trace.reset(trace_token)
+    return run
+
+
+def emit_metrics(values, units=None, **dimensions):
+    """
+    Log standalone metrics for work done outside a request trace, such as
+    background writes. `values` maps metric names to numbers, counts unless
+    `units` says otherwise; keyword arguments become dimensions.
+    """
+    if TRACE_OUTPUT == 'emf':
+        units = units or {}
+        print(json.dumps({
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': TRACE_NAMESPACE,
+                    'Dimensions': [sorted(dimensions)],
+                    'Metrics': [{'Name': name, 'Unit': units.get(name, 'Count')} for name in values],
+                }],
+            },
+            **dimensions,
+            **values,
+        }, default=str))
+    elif TRACE_OUTPUT == 'json':
+        print(json.dumps({'type': 'metrics', **dimensions, **values}, default=str))
+
+
+def current_request_id():
+    trace = current_trace.get()
+    return trace.request_id if trace else None
+
+
+def debug_enabled():
+    trace = current_trace.get()
+    return trace.debug if trace else LOG_LEVEL == 'DEBUG'
+
+
+def debug(message):
+    """Log a debug line for sampled requests (or always when LOG_LEVEL is DEBUG)"""
+    if debug_enabled():
+        request_id = current_request_id()
+        print(f"DEBUG: [{request_id}] {message}" if request_id else f"DEBUG: {message}")
@@ -0,0 +1,70 @@
+"""
+Stub of the bedrock-runtime client for offline benchmarks.
+
+Answers invoke_model and invoke_model_with_response_stream after a
+configurable latency, streams tokens at a fixed rate, and throttles a
+fraction of calls with the same ClientError Bedrock raises.
+"""
+import io
+import json
+import random
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+
+class StubBedrockClient:
+    def __init__(self, latency_ms=300, tokens_per_second=100, output_tokens=300, throttle_rate=0.0, seed=0):
+        self.latency_ms = latency_ms
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens = output_tokens
+        self.throttle_rate = throttle_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.stats = {'calls': 0, 'throttled': 0, 'input_chars': 0}
+
+    def start_call(self, body):
+        request = json.loads(body)
+        input_chars = sum(len(block['text']) for block in request.get('system', []))
+        input_chars += sum(len(message['content']) for message in request['messages'])
+        with self.lock:
+            self.stats['calls'] += 1
+            self.stats['input_chars'] += input_chars
+            throttled = self.random.random() < self.throttle_rate
+            if throttled:
+                self.stats['throttled'] += 1
+        time.sleep(self.latency_ms / 1000)
+        if throttled:
+            raise ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}}, 'InvokeModel')
+        return {'input_tokens': input_chars // 4, 'cache_read_input_tokens': 0, 'cache_creation_input_tokens': 0}
+
+    def answer_tokens(self):
+        return [f"token{i} " for i in range(self.output_tokens)]
+
+    def invoke_model(self, modelId, body, contentType=None, **kwargs):
+        usage = self.start_call(body)
+        tokens = self.answer_tokens()
+        time.sleep(len(tokens) / self.tokens_per_second)
+        payload = {
+            'content': [{'type': 'text', 'text': ''.join(tokens)}],
+            'usage': {**usage, 'output_tokens': len(tokens)},
+        }
+        return {'body': io.BytesIO(json.dumps(payload).encode('utf-8'))}
+
+    def invoke_model_with_response_stream(self, modelId, body, contentType=None, **kwargs):
+        usage = self.start_call(body)
+
+        def events():
+            yield {'chunk': {'bytes': json.dumps({'type': 'message_start', 'message': {'usage': usage}}).encode()}}
+            for token in self.answer_tokens():
+                time.sleep(1 / self.tokens_per_second)
+                delta = {'type': 'content_block_delta', 'delta': {'type': 'text_delta', 'text': token}}
+                yield {'chunk': {'bytes': json.dumps(delta).encode()}}
+            yield {'chunk': {'bytes': json.dumps({'type': 'message_stop'}).encode()}}
+
+        return {'body': events()}
@@ -0,0 +1,391 @@
+"""
+Local stand-in for the GitHub REST API, serving synthetic repositories.
+
+Repositories are generated deterministically from a shape (file count,
+directory depth and fan-out, file sizes, issues), so every run sees the same
+data. Latency, bandwidth, the primary rate limit and random secondary rate
+limits can be injected, and ETag revalidation answers 304 like GitHub does.
+Per-endpoint request, byte and status counters are served from /_stats and
+cleared with POST /_reset.
+
+    python benchmarks/fake_github.py --port 8765 --latency-ms 40
+
+Repositories are served as bench/<profile>, e.g. /repos/bench/medium.
+"""
+import argparse
+import base64
+import hashlib
+import io
+import json
+import random
+import sys
+import tarfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+# Repository shapes: file count, directory depth and fan-out, average file size, issues and PRs
+PROFILES = {
+    'small': {'files': 60, 'depth': 2, 'fanout': 4, 'file_bytes': 2000, 'issues': 5, 'pulls': 3},
+    'medium': {'files': 1500, 'depth': 4, 'fanout': 6, 'file_bytes': 6000, 'issues': 30, 'pulls': 10},
+    'monorepo': {'files': 25000, 'depth': 7, 'fanout': 8, 'file_bytes': 4000, 'issues': 30, 'pulls': 10},
+}
+EXTENSIONS = ['.py', '.js', '.ts', '.md', '.json', '.yml', '.java', '.css', '.txt', '.png']
+LANGUAGES = {'.py': 'Python', '.js': 'JavaScript', '.ts': 'TypeScript', '.java': 'Java', '.css': 'CSS'}
+TREE_ENTRY_LIMIT = 100000  # GitHub truncates recursive tree listings beyond this
+OWNER = 'bench'
+
+
+def blob_sha(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class SyntheticRepo:
+    """A deterministic repository: paths and sizes up front, contents generated on demand"""
+
+    def __init__(self, name, files, depth, fanout, file_bytes, issues, pulls):
+        self.name = name
+        self.shape = {'files': files, 'depth': depth, 'fanout': fanout, 'file_bytes': file_bytes,
+                      'issues': issues, 'pulls': pulls}
+        self.sha = blob_sha(f"{name}:{json.dumps(self.shape, sort_keys=True)}")
+        self.files = {
+            'README.md': file_bytes,
+            'package.json': 400,
+            'Dockerfile': 300,
+        }
+        for i in range(files):
+            levels = i % (depth + 1)
+            directory = '/'.join(f"pkg{(i // fanout ** level) % fanout}" for level in range(levels))
+            name_part = f"module_{i}{EXTENSIONS[i % len(EXTENSIONS)]}"
+            size = max(64, file_bytes * ((i * 7919) % 200 + 50) // 100)
+            self.files[f"{directory}/{name_part}" if directory else name_part] = size
+
+        self.dirs = {}  # directory path -> tree sha
+        for path in self.files:
+            parts = path.split('/')[:-1]
+            for depth_index in range(1, len(parts) + 1):
+                directory = '/'.join(parts[:depth_index])
+                self.dirs.setdefault(directory, blob_sha(f"{self.sha}:{directory}"))
+        self.tree_paths = {sha: directory for directory, sha in self.dirs.items()}
+        self.tarball_bytes = None
+        self.lock = threading.Lock()
+
+    @property
+    def size_kb(self):
+        return sum(self.files.values()) // 1024
+
+    def content(self, path):
+        """File contents of exactly the recorded size"""
+        size = self.files[path]
+        if path == 'README.md':
+            header = f"# {self.name}\n\nSynthetic repository for benchmarks.\n\n"
+        else:
+            header = f"// {path}\n"
+        line = f"value_{blob_sha(path)[:8]} = compute({len(path)})  # synthetic line\n"
+        text = header + line * (size // len(line) + 1)
+        return text.encode('utf-8')[:size]
+
+    def tree(self, prefix, recursive):
+        """Entries under `prefix` ('' for the root), with paths relative to it"""
+        entries = []
+        start = len(prefix) + 1 if prefix else 0
+        for directory, sha in self.dirs.items():
+            if prefix and not directory.startswith(prefix + '/'):
+                continue
+            relative = directory[start:]
+            if recursive or '/' not in relative:
+                entries.append({'path': relative, 'mode': '040000', 'type': 'tree', 'sha': sha})
+        for path, size in self.files.items():
+            if prefix and not path.startswith(prefix + '/'):
+                continue
+            relative = path[start:]
+            if recursive or '/' not in relative:
+                entries.append({'path': relative, 'mode': '100644', 'type': 'blob',
+                                'sha': blob_sha(path), 'size': size})
+        truncated = len(entries) > TREE_ENTRY_LIMIT
+        return {'sha': self.dirs.get(prefix, self.sha), 'tree': entries[:TREE_ENTRY_LIMIT], 'truncated': truncated}
+
+    def tarball(self):
+        with self.lock:
+            if self.tarball_bytes is None:
+                buffer = io.BytesIO()
+                root = f"{OWNER}-{self.name}-{self.sha[:7]}"
+                with tarfile.open(fileobj=buffer, mode='w:gz', compresslevel=6) as archive:
+                    for path in self.files:
+                        data = self.content(path)
+                        info = tarfile.TarInfo(f"{root}/{path}")
+                        info.size = len(data)
+                        archive.addfile(info, io.BytesIO(data))
+                self.tarball_bytes = buffer.getvalue()
+            return self.tarball_bytes
+
+    def repo_info(self):
+        return {
+            'full_name': f"{OWNER}/{self.name}",
+            'name': self.name,
+            'description': f"Synthetic {self.name} repository",
+            'default_branch': 'main',
+            'size': self.size_kb,
+            'stargazers_count': 42,
+            'forks_count': 7,
+            'open_issues_count': self.shape['issues'],
+            'language': 'Python',
+            'topics': ['benchmark'],
+        }
+
+    def issues(self):
+        return [{'number': i, 'title': f"Issue {i}", 'state': 'open' if i % 3 else 'closed',
+                 'body': f"Synthetic issue {i} " * 20, 'user': {'login': f"user{i % 5}"}}
+                for i in range(1, self.shape['issues'] + 1)]
+
+    def pulls(self):
+        return [{'number': 1000 + i, 'title': f"PR {i}", 'state': 'open', 'body': f"Synthetic PR {i}",
+                 'user': {'login': f"user{i % 5}"}} for i in range(self.shape['pulls'])]
+
+    def languages(self):
+        totals = {}
+        for path, size in self.files.items():
+            language = LANGUAGES.get('.' + path.rsplit('.', 1)[-1])
+            if language:
+                totals[language] = totals.get(language, 0) + size
+        return totals
+
+
+class FakeGitHub:
+    """Server state: repositories, injected faults, the rate limit window and counters"""
+
+    def __init__(self, repos, latency_ms=0, jitter_ms=0, bandwidth_mbps=0, rate_limit=5000,
+                 rate_limit_window=3600, secondary_limit_rate=0.0, seed=0):
+        self.repos = repos
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.bandwidth_mbps = bandwidth_mbps
+        self.rate_limit = rate_limit
+        self.rate_limit_window = rate_limit_window
+        self.secondary_limit_rate = secondary_limit_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.remaining = self.rate_limit
+            self.window_reset = time.time() + self.rate_limit_window
+            self.stats = {'requests': 0, 'bytes': 0, 'not_modified': 0, 'rate_limited': 0, 'endpoints': {}}
+
+    def delay(self):
+        with self.lock:
+            jitter = self.random.uniform(0, self.jitter_ms) if self.jitter_ms else 0
+        if self.latency_ms or jitter:
+            time.sleep((self.latency_ms + jitter) / 1000)
+
+    def take_rate_limit(self):
+        """Consume one request from the window; returns (allowed, headers)"""
+        with self.lock:
+            now = time.time()
+            if now >= self.window_reset:
+                self.remaining = self.rate_limit
+                self.window_reset = now + self.rate_limit_window
+            if self.secondary_limit_rate and self.random.random() < self.secondary_limit_rate:
+                return False, {'Retry-After': '1'}
+            allowed = self.remaining > 0
+            if allowed:
+                self.remaining -= 1
+            return allowed, {
+                'X-RateLimit-Limit': str(self.rate_limit),
+                'X-RateLimit-Remaining': str(self.remaining),
+                'X-RateLimit-Reset': str(int(self.window_reset)),
+                'X-RateLimit-Resource': 'core',
+            }
+
+    def record(self, endpoint, status, size):
+        with self.lock:
+            self.stats['requests'] += 1
+            self.stats['bytes'] += size
+            if status == 304:
+                self.stats['not_modified'] += 1
+            elif status in (403, 429):
+                self.stats['rate_limited'] += 1
+            endpoint_stats = self.stats['endpoints'].setdefault(endpoint, {'requests': 0, 'bytes': 0})
+            endpoint_stats['requests'] += 1
+            endpoint_stats['bytes'] += size
+
+    def snapshot(self):
+        with self.lock:
+            return json.loads(json.dumps(self.stats))
+
+
+class FakeGitHubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeGitHub/1.0"
+    disable_nagle_algorithm = True  # Headers and body are separate writes; avoid delayed-ACK stalls
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        if self.path == '/_reset':
+            self.state.reset()
+            return self.send_body(200, b'{}', 'application/json', endpoint=None)
+        # GraphQL is not simulated; the backend falls back to REST
+        self.send_body(404, b'{"message": "Not Found"}', 'application/json', endpoint='graphql')
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/_stats':
+            return self.send_body(200, json.dumps(self.state.snapshot()).encode(), 'application/json', endpoint=None)
+
+        parts = url.path.strip('/').split('/')
+        if len(parts) < 3 or parts[0] != 'repos' or parts[1] != OWNER or parts[2] not in self.state.repos:
+            return self.send_body(404, b'{"message": "Not Found"}', 'application/json', endpoint='unknown')
+
+        repo = self.state.repos[parts[2]]
+        rest = parts[3:]
+        query = parse_qs(url.query)
+        endpoint = rest[0] if rest else 'repo'
+
+        self.state.delay()
+        allowed, rate_headers = self.state.take_rate_limit()
+        if not allowed:
+            body = b'{"message": "API rate limit exceeded"}'
+            return self.send_body(403, body, 'application/json', endpoint=endpoint, headers=rate_headers)
+
+        accept = self.headers.get('Accept', '')
+        if not rest:
+            return self.send_json(repo.repo_info(), endpoint, rate_headers)
+        if rest[:2] == ['commits', 'HEAD']:
+            if 'sha' in accept:
+                return self.send_body(200, repo.sha.encode(), 'text/plain', endpoint, rate_headers)
+            return self.send_json({'sha': repo.sha}, endpoint, rate_headers)
+        if rest[:2] == ['git', 'trees'] and len(rest) == 3:
+            prefix = repo.tree_paths.get(rest[2], '')
+            return self.send_json(repo.tree(prefix, 'recursive' in query), 'tree', rate_headers)
+        if rest[0] == 'contents' and len(rest) > 1:
+            path = unquote('/'.join(rest[1:]))
+            if path not in repo.files:
+                return self.send_body(404, b'{"message": "Not Found"}', 'application/json', endpoint, rate_headers)
+            return self.send_file(repo, path, accept, endpoint, rate_headers)
+        if rest[0] == 'readme':
+            return self.send_file(repo, 'README.md', accept, endpoint, rate_headers)
+        if rest[0] == 'tarball':
+            return self.send_body(200, repo.tarball(), 'application/x-gzip', endpoint, rate_headers)
+        if rest[0] == 'languages':
+            return self.send_json(repo.languages(), endpoint, rate_headers)
+        if rest[0] in ('issues', 'pulls'):
+            items = repo.issues() if rest[0] == 'issues' else repo.pulls()
+            per_page = int(query.get('per_page', ['30'])[0])
+            page = int(query.get('page', ['1'])[0])
+            return self.send_json(items[(page - 1) * per_page:page * per_page], endpoint, rate_headers)
+        if rest[0] == 'releases':
+            return self.send_json([{'tag_name': 'v1.0.0', 'name': '1.0.0', 'body': 'First release'}], endpoint, rate_headers)
+        if rest[0] == 'contributors':
+            return self.send_json([{'login': f"user{i}", 'contributions': 100 - i} for i in range(5)], endpoint, rate_headers)
+        self.send_body(404, b'{"message": "Not Found"}', 'application/json', endpoint, rate_headers)
+
+    def send_file(self, repo, path, accept, endpoint, headers):
+        data = repo.content(path)
+        if 'raw' in accept:
+            return self.send_body(200, data, 'text/plain; charset=utf-8', endpoint, headers)
+        return self.send_json({
+            'name': path.rsplit('/', 1)[-1], 'path': path, 'size': len(data), 'encoding': 'base64',
+            'content': base64.b64encode(data).decode('ascii'),
+        }, endpoint, headers)
+
+    def send_json(self, payload, endpoint, headers):
+        self.send_body(200, json.dumps(payload).encode(), 'application/json; charset=utf-8', endpoint, headers)
+
+    def send_body(self, status, body, content_type, endpoint, headers=None):
+        headers = dict(headers or {})
+        if status == 200 and endpoint and endpoint != 'tarball':
+            etag = f'"{hashlib.sha1(body).hexdigest()}"'
+            headers['ETag'] = etag
+            if self.headers.get('If-None-Match') == etag:
+                status, body = 304, b''
+                # Revalidations don't count against the GitHub rate limit
+                with self.state.lock:
+                    self.state.remaining += 1
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        sent = self.write_body(body)
+        if endpoint:
+            self.state.record(endpoint, status, sent)
+
+    def write_body(self, body):
+        """Write in chunks at the configured bandwidth; returns the bytes the client took"""
+        chunk_size = 64 * 1024
+        seconds_per_chunk = chunk_size / (self.state.bandwidth_mbps * 1024 * 1024 / 8) if self.state.bandwidth_mbps else 0
+        sent = 0
+        try:
+            for offset in range(0, len(body), chunk_size):
+                self.wfile.write(body[offset:offset + chunk_size])
+                sent += min(chunk_size, len(body) - offset)
+                if seconds_per_chunk:
+                    time.sleep(seconds_per_chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            # Clients stop reading tarballs once they have what they need
+            self.close_connection = True
+        return sent
+
+
+class FakeGitHubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+def build_repos(profiles=PROFILES):
+    return {name: SyntheticRepo(name, **shape) for name, shape in profiles.items()}
+
+
+def start_server(state, port=0):
+    """Serve `state` on a background thread; returns the server (see server.server_port)"""
+    server = FakeGitHubServer(('127.0.0.1', port), FakeGitHubHandler)
+    server.state = state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake GitHub REST API serving synthetic repositories")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--profiles', default=','.join(PROFILES), help='repository profiles to serve')
+    parser.add_argument('--latency-ms', type=float, default=0, help='added to every request')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='random extra latency per request')
+    parser.add_argument('--bandwidth-mbps', type=float, default=0, help='response bandwidth cap (0 = unlimited)')
+    parser.add_argument('--rate-limit', type=int, default=5000, help='requests per rate limit window')
+    parser.add_argument('--rate-limit-window', type=int, default=3600, help='rate limit window in seconds')
+    parser.add_argument('--secondary-limit-rate', type=float, default=0.0,
+                        help='fraction of requests answered with a secondary rate limit (403 + Retry-After)')
+    args = parser.parse_args()
+
+    repos = build_repos({name: PROFILES[name] for name in args.profiles.split(',')})
+    for repo in repos.values():
+        repo.tarball()  # Build archives up front so the first download isn't penalized
+    state = FakeGitHub(repos, args.latency_ms, args.jitter_ms, args.bandwidth_mbps,
+                       args.rate_limit, args.rate_limit_window, args.secondary_limit_rate)
+    server = start_server(state, args.port)
+    print(f"LISTENING {server.server_port}", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
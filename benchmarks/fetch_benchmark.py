@@ -0,0 +1,243 @@
+"""
+Offline benchmark of the repository fetch path and the model call.
+
+Starts fake_github.py in a subprocess, points the backend at it through
+GITHUB_API_URL and replaces the Bedrock client with StubBedrockClient in the
+resource registry. For each repository profile it runs:
+
+    fetch_tarball   fetch_repository_data, file contents from one tarball
+    fetch_contents  fetch_repository_data, file contents fetched per file
+    fetch_warm      the tarball fetch again with warm ETag and blob caches
+    answer          process_with_claude on the fetched snapshot
+
+and reports the median wall time over --repeat runs, GitHub requests and
+bytes, peak traced memory (measured in a separate run, so tracemalloc does
+not skew wall times) and the slowest trace stages.
+
+    python benchmarks/fetch_benchmark.py --profiles small,medium --latency-ms 30
+    python benchmarks/fetch_benchmark.py --save baseline.json
+    python benchmarks/fetch_benchmark.py --baseline baseline.json  # exits 1 on regressions
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(BENCH_DIR, '..', 'backend')
+QUESTION = "How is this repository organized, and where is the main entry point?"
+
+# Regressions must exceed the tolerance and these absolute floors, so noise on tiny values is ignored
+REGRESSION_FLOORS = {'wall_ms': 50, 'requests': 2, 'bytes': 64 * 1024, 'peak_mb': 2}
+
+
+def start_fake_github(args):
+    command = [
+        sys.executable, os.path.join(BENCH_DIR, 'fake_github.py'),
+        '--port', '0',
+        '--profiles', args.profiles,
+        '--latency-ms', str(args.latency_ms),
+        '--jitter-ms', str(args.jitter_ms),
+        '--bandwidth-mbps', str(args.bandwidth_mbps),
+        '--rate-limit', str(args.rate_limit),
+        '--secondary-limit-rate', str(args.secondary_limit_rate),
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line.startswith('LISTENING '):
+        process.kill()
+        raise RuntimeError("Fake GitHub server failed to start")
+    return process, f"http://127.0.0.1:{int(line.split()[1])}"
+
+
+def server_call(base_url, path, method='GET'):
+    request = urllib.request.Request(base_url + path, method=method, data=b'' if method == 'POST' else None)
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def load_backend(base_url, bedrock):
+    """Import the backend configured for the fake server; env is read at import time"""
+    os.environ.update({
+        'GITHUB_API_URL': base_url,
+        'GITHUB_TOKEN': '',  # Without a token GraphQL is skipped, as for unauthenticated use
+        'INGESTION_BACKEND': 'inline',
+        'ANSWER_CACHE_ENABLED': 'false',
+        'SNAPSHOT_CACHE_DIR': '',
+        'BLOB_STORE_DIR': '',
+        'TRACE_OUTPUT': 'off',
+        'LOG_LEVEL': 'WARNING',
+        'LOG_DEBUG_SAMPLE_RATE': '0',
+    })
+    sys.path.insert(0, BACKEND_DIR)
+    import resources
+    resources.registry.register('client:bedrock-runtime', lambda: bedrock)
+    import lambda_function
+    return lambda_function
+
+
+def reset_github_client(keep_cache=False):
+    """Fresh rate limit and concurrency state, and unless `keep_cache` empty ETag and blob caches"""
+    import blob_store
+    import fetch_engine
+    import github_client
+    if not keep_cache:
+        github_client.github.cache = github_client.ConditionalRequestCache()
+        blob_store.blob_store = blob_store.BlobStore(blob_store.BLOB_STORE_MAX_BYTES)
+    github_client.github.rate_limiter = github_client.RateLimitScheduler()
+    fetch_engine.fetch_limit = fetch_engine.AIMDLimit(
+        github_client.GITHUB_FETCH_CONCURRENCY, fetch_engine.MIN_CONCURRENCY,
+        github_client.GITHUB_FETCH_MAX_CONCURRENCY, fetch_engine.GITHUB_FETCH_LATENCY_TOLERANCE
+    )
+
+
+def stage_breakdown(trace):
+    """Total ms per traced stage, slowest first"""
+    stages = trace.stages()
+    totals = {name: stage['total_ms'] for name, stage in stages.items() if name != 'file'}
+    return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+
+def run_stage(name, fn, args, base_url, keep_cache=False, bedrock=None):
+    import tracing
+
+    walls, github_stats, trace = [], None, None
+    for _ in range(args.repeat):
+        reset_github_client(keep_cache)
+        server_call(base_url, '/_reset', 'POST')
+        if bedrock:
+            bedrock.reset()
+        with tracing.trace_request(name) as trace:
+            start = time.perf_counter()
+            result = fn()
+            walls.append(time.perf_counter() - start)
+        github_stats = server_call(base_url, '/_stats')
+
+    # Peak memory from a separate run so tracing allocations doesn't slow the timed runs
+    reset_github_client(keep_cache)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stats = {
+        'wall_ms': round(statistics.median(walls) * 1000, 1),
+        'min_ms': round(min(walls) * 1000, 1),
+        'requests': github_stats['requests'],
+        'bytes': github_stats['bytes'],
+        'not_modified': github_stats['not_modified'],
+        'rate_limited': github_stats['rate_limited'],
+        'peak_mb': round(peak / 1024 / 1024, 1),
+        'stages': stage_breakdown(trace),
+    }
+    if bedrock:
+        stats['bedrock'] = dict(bedrock.stats)
+    return stats, result
+
+
+def benchmark_profile(lambda_function, profile, args, base_url, bedrock):
+    repo_path = f"bench/{profile}"
+    sha = lambda_function.resolve_head_sha(repo_path)
+    results = {}
+
+    def fetch(mode):
+        def run():
+            lambda_function.FILE_INGESTION_MODE = mode
+            return lambda_function.fetch_repository_data(repo_path, ref=sha)
+        return run
+
+    results['fetch_tarball'], repo_data = run_stage('fetch_tarball', fetch('tarball'), args, base_url)
+    results['fetch_contents'], _ = run_stage('fetch_contents', fetch('contents'), args, base_url)
+
+    # Prime the ETag and blob caches, then measure the revalidating fetch
+    reset_github_client()
+    fetch('tarball')()
+    results['fetch_warm'], _ = run_stage('fetch_warm', fetch('tarball'), args, base_url, keep_cache=True)
+
+    results['answer'], _ = run_stage(
+        'answer', lambda: lambda_function.process_with_claude(repo_path, repo_data, QUESTION),
+        args, base_url, bedrock=bedrock
+    )
+    for stats in results.values():
+        stats['files'] = len(repo_data['file_contents'])
+    return results
+
+
+def print_results(results):
+    print(f"{'profile/stage':<28}{'wall ms':>10}{'min ms':>10}{'requests':>10}{'MB in':>9}{'304s':>7}"
+          f"{'limited':>9}{'peak MB':>9}  slowest stages")
+    for key, stats in results.items():
+        slowest = ', '.join(f"{name} {ms:.0f}" for name, ms in list(stats['stages'].items())[:4])
+        print(f"{key:<28}{stats['wall_ms']:>10.1f}{stats['min_ms']:>10.1f}{stats['requests']:>10}"
+              f"{stats['bytes'] / 1024 / 1024:>9.2f}{stats['not_modified']:>7}{stats['rate_limited']:>9}"
+              f"{stats['peak_mb']:>9.1f}  {slowest}")
+
+
+def find_regressions(results, baseline, tolerance):
+    regressions = []
+    for key, stats in results.items():
+        previous = baseline.get(key)
+        if previous is None:
+            continue
+        for metric, floor in REGRESSION_FLOORS.items():
+            before, after = previous.get(metric, 0), stats[metric]
+            if after > before * (1 + tolerance) and after - before > floor:
+                regressions.append(f"{key} {metric}: {before} -> {after}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the fetch path and model call")
+    parser.add_argument('--profiles', default='small,medium,monorepo', help='repository profiles to run')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per stage (median is reported)')
+    parser.add_argument('--latency-ms', type=float, default=20, help='GitHub latency per request')
+    parser.add_argument('--jitter-ms', type=float, default=5, help='random extra GitHub latency per request')
+    parser.add_argument('--bandwidth-mbps', type=float, default=0, help='GitHub response bandwidth (0 = unlimited)')
+    parser.add_argument('--rate-limit', type=int, default=5000, help='GitHub requests per rate limit window')
+    parser.add_argument('--secondary-limit-rate', type=float, default=0.0, help='fraction of GitHub requests rate limited')
+    parser.add_argument('--bedrock-latency-ms', type=float, default=300, help='Bedrock time to first token')
+    parser.add_argument('--bedrock-tokens-per-second', type=float, default=1000)
+    parser.add_argument('--bedrock-throttle-rate', type=float, default=0.0, help='fraction of Bedrock calls throttled')
+    parser.add_argument('--save', help='write results as JSON to this file')
+    parser.add_argument('--baseline', help='compare against results saved with --save')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative regression')
+    args = parser.parse_args()
+
+    sys.path.insert(0, BENCH_DIR)
+    from fake_bedrock import StubBedrockClient
+    bedrock = StubBedrockClient(args.bedrock_latency_ms, args.bedrock_tokens_per_second,
+                                throttle_rate=args.bedrock_throttle_rate)
+
+    server, base_url = start_fake_github(args)
+    try:
+        lambda_function = load_backend(base_url, bedrock)
+        results = {}
+        for profile in args.profiles.split(','):
+            for stage, stats in benchmark_profile(lambda_function, profile, args, base_url, bedrock).items():
+                results[f"{profile}/{stage}"] = stats
+    finally:
+        server.kill()
+
+    print_results(results)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nNo regressions against baseline")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+"""
+Memory and scan-time benchmark of the file structure representation.
+
+Builds the file structure of synthetic repositories (paths from
+fake_github.SyntheticRepo) both as the old dict of per-path dicts and as a
+FileTree, then times the scans a snapshot goes through: media detection,
+selecting files to fetch, the structure summary in the prompt, and
+serializing for the snapshot cache. Memory is the traced size of the built
+structure (FileTree's indexes included); times are medians over --repeat
+runs.
+
+    python benchmarks/file_tree_benchmark.py --sizes 10000,100000,1000000
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(BENCH_DIR, '..', 'backend')
+REPO_PATH = 'bench/tree'
+REF = 'a' * 40
+
+
+def load_backend():
+    os.environ.update({
+        'INGESTION_BACKEND': 'inline',
+        'ANSWER_CACHE_ENABLED': 'false',
+        'SNAPSHOT_CACHE_DIR': '',
+        'BLOB_STORE_DIR': '',
+        'TRACE_OUTPUT': 'off',
+        'LOG_LEVEL': 'WARNING',
+        'LOG_DEBUG_SAMPLE_RATE': '0',
+    })
+    sys.path.insert(0, BACKEND_DIR)
+    sys.path.insert(0, BENCH_DIR)
+    import lambda_function
+    return lambda_function
+
+
+def tree_entries(size):
+    """(path, type, size, sha) for a synthetic repository of about `size` paths"""
+    from fake_github import SyntheticRepo, blob_sha
+    def synthetic_repo(files):
+        return SyntheticRepo('tree', files, depth=5, fanout=10, file_bytes=4000, issues=0, pulls=0)
+
+    # Directories are implied by the file paths; scale the file count once so the total lands near `size`
+    sample = synthetic_repo(size)
+    repo = synthetic_repo(int(size * size / (len(sample.files) + len(sample.dirs))))
+    entries = [(directory, 'dir', 0, sha) for directory, sha in repo.dirs.items()]
+    entries += [(path, 'file', file_size, blob_sha(path)) for path, file_size in repo.files.items()]
+    return entries
+
+
+# The scans as they were written for the dict of dicts, for comparison
+
+LEGACY_PRIORITY_EXTENSIONS = ['.md', '.py', '.js', '.java', '.ts', '.jsx', '.tsx', '.html', '.css', 'Dockerfile', '.yml', '.yaml', '.json']
+
+def legacy_find_media_files(lf, file_structure):
+    media_files = []
+    for path, info in file_structure.items():
+        if info.get("type") == "file":
+            for ext in lf.MEDIA_EXTENSIONS:
+                if path.lower().endswith(ext):
+                    media_files.append({"path": path, "name": info.get("name"), "type": ext.lstrip('.'), "url": info.get("html_url")})
+                    break
+    return media_files
+
+
+def legacy_select_files_to_fetch(lf, file_structure):
+    files_to_fetch = []
+    for path, info in file_structure.items():
+        if info.get("type") != "file":
+            continue
+        if info.get("size", 0) > 10 * 1024 * 1024:
+            continue
+        if any(path.lower().endswith(ext) for ext in lf.BINARY_EXTENSIONS):
+            continue
+        priority = 0
+        for ext in LEGACY_PRIORITY_EXTENSIONS:
+            if path.lower().endswith(ext):
+                priority += 10
+                break
+        for name in ['readme', 'license', 'contributing', 'changelog', 'dockerfile']:
+            if name in path.lower():
+                priority += 5
+                break
+        if '/' not in path:
+            priority += 3
+        size_mb = info.get('size', 0) / (1024 * 1024)
+        if size_mb > 0.5:
+            priority -= int(size_mb * 2)
+        files_to_fetch.append((path, info, priority))
+    files_to_fetch.sort(key=lambda x: x[2], reverse=True)
+    return files_to_fetch[:lf.MAX_FILES_TO_FETCH]
+
+
+def legacy_summary(file_structure):
+    dir_count = sum(1 for info in file_structure.values() if info.get('type') == 'dir')
+    top_level_dirs = sorted(path for path, info in file_structure.items() if info.get('type') == 'dir' and '/' not in path)
+    top_level_files = sorted(path for path, info in file_structure.items() if info.get('type') == 'file' and '/' not in path)
+    return dir_count, top_level_dirs, top_level_files
+
+
+def tree_summary(tree):
+    return tree.count('dir'), tree.top_level('dir'), tree.top_level('file')
+
+
+def build_legacy(lf, entries):
+    return {path: lf.tree_entry(REPO_PATH, REF, path, item_type, sha, size) for path, item_type, size, sha in entries}
+
+
+def build_tree(entries):
+    from file_tree import FileTree
+    tree = FileTree(REPO_PATH, REF)
+    for path, item_type, size, sha in entries:
+        tree.add(path, item_type, size, sha)
+    return tree
+
+
+def traced_size(build):
+    tracemalloc.start()
+    structure = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del structure
+    return size
+
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return round(statistics.median(times) * 1000, 1)
+
+
+def benchmark_size(lf, size, repeat):
+    from snapshot_cache import encode_snapshot
+    entries = tree_entries(size)
+    legacy = build_legacy(lf, entries)
+    tree = build_tree(entries)
+
+    results = {}
+    for name, structure, scans in (
+        ('dict', legacy, {
+            'media_ms': lambda: legacy_find_media_files(lf, legacy),
+            'select_ms': lambda: legacy_select_files_to_fetch(lf, legacy),
+            'summary_ms': lambda: legacy_summary(legacy),
+        }),
+        ('file_tree', tree, {
+            'media_ms': lambda: lf.find_media_files(tree),
+            'select_ms': lambda: lf.select_files_to_fetch(tree),
+            'summary_ms': lambda: tree_summary(tree),
+        }),
+    ):
+        stats = {
+            'paths': len(structure),
+            'memory_mb': round(traced_size(lambda: build_legacy(lf, entries) if name == 'dict' else build_tree(entries)) / 1024 / 1024, 1),
+            'build_ms': timed(lambda: build_legacy(lf, entries) if name == 'dict' else build_tree(entries), repeat),
+        }
+        for scan, fn in scans.items():
+            stats[scan] = timed(fn, repeat)
+        encoded = encode_snapshot({'file_structure': structure})
+        stats['encode_ms'] = timed(lambda: encode_snapshot({'file_structure': structure}), repeat)
+        stats['encoded_mb'] = round(len(encoded) / 1024 / 1024, 2)
+        results[name] = stats
+
+    # Both representations must produce the same answers
+    assert [m['path'] for m in lf.find_media_files(tree)] == [m['path'] for m in legacy_find_media_files(lf, legacy)]
+    assert tree_summary(tree) == legacy_summary(legacy)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory and scan time of the file structure representations")
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='approximate paths per repository')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per measurement (median is reported)')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    lf = load_backend()
+    results = {}
+    for size in (int(size) for size in args.sizes.split(',')):
+        results[size] = benchmark_size(lf, size, args.repeat)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    columns = ['paths', 'memory_mb', 'build_ms', 'media_ms', 'select_ms', 'summary_ms', 'encode_ms', 'encoded_mb']
+    print(f"{'size/store':<20}" + ''.join(f"{column:>12}" for column in columns))
+    for size, stores in results.items():
+        for name, stats in stores.items():
+            print(f"{f'{size}/{name}':<20}" + ''.join(f"{stats[column]:>12}" for column in columns))
+
+
+if __name__ == '__main__':
+    main()
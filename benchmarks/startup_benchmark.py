@@ -0,0 +1,90 @@
+"""
+Cold-start benchmark for the backend Lambda.
+
+Each run starts a fresh Python process (like a new Lambda container),
+times `import lambda_function`, then the first and second request to each
+route. The second request shows what warm invocations pay once clients,
+tables and secrets are memoized by the resource registry.
+
+    python benchmarks/startup_benchmark.py [--runs 5] [--repo owner/name] [--chat]
+
+Routes that reach GitHub or AWS need credentials; without them they fail
+fast, which still measures client creation and handler overhead.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+# Runs inside the child process; prints one JSON line of timings
+CHILD_SCRIPT = r"""
+import json, sys, time
+start = time.perf_counter()
+import lambda_function
+timings = {'import': time.perf_counter() - start}
+routes = json.loads(sys.argv[1])
+for name, event in routes:
+    for attempt in ('first', 'second'):
+        start = time.perf_counter()
+        try:
+            lambda_function.lambda_handler(event, None)
+        except Exception:
+            pass
+        timings[f"{name} ({attempt})"] = time.perf_counter() - start
+print("TIMINGS " + json.dumps(timings))
+"""
+
+
+def build_routes(repo_path, include_chat):
+    def post(path, body):
+        return {'httpMethod': 'POST', 'path': f"/api/{path}", 'headers': {}, 'body': json.dumps(body)}
+
+    routes = [
+        ('OPTIONS', {'httpMethod': 'OPTIONS', 'path': '/api/chat', 'headers': {}}),
+        ('/repo-info', post('repo-info', {'repoPath': repo_path})),
+        ('/ingestion-status', post('ingestion-status', {'repoPath': repo_path})),
+    ]
+    if include_chat:
+        routes.append(('/chat', post('chat', {'repoPath': repo_path, 'message': 'What does this repository do?'})))
+    return routes
+
+
+def run_once(routes, env):
+    result = subprocess.run(
+        [sys.executable, '-c', CHILD_SCRIPT, json.dumps(routes)],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+    for line in result.stdout.splitlines():
+        if line.startswith('TIMINGS '):
+            return json.loads(line[len('TIMINGS '):])
+    raise RuntimeError(f"Benchmark process failed:\n{result.stderr[-2000:]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='fresh processes to start')
+    parser.add_argument('--repo', default='octocat/Hello-World', help='repository used in request bodies')
+    parser.add_argument('--chat', action='store_true', help='also time /chat (calls Bedrock)')
+    parser.add_argument('--prewarm', default=None, help='PREWARM_RESOURCES value for the child processes')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault('INGESTION_BACKEND', 'local')
+    if args.prewarm is not None:
+        env['PREWARM_RESOURCES'] = args.prewarm
+
+    routes = build_routes(args.repo, args.chat)
+    runs = [run_once(routes, env) for _ in range(args.runs)]
+
+    print(f"{'measurement':<32}{'median ms':>12}{'min ms':>10}{'max ms':>10}")
+    for name in runs[0]:
+        values = [run[name] * 1000 for run in runs]
+        print(f"{name:<32}{statistics.median(values):>12.1f}{min(values):>10.1f}{max(values):>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
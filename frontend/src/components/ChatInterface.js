@@ -1,9 +1,21 @@
 import React, { useState, useEffect, useRef } from 'react';
-import { fetchRepoConversation } from '../services/api';
+import { fetchRepoConversation, streamRepoConversation } from '../services/api';
 import { useAuth } from '../contexts/AuthContext';
 import CustomMarkdownRenderer from './CustomMarkdownRenderer';
 import './ChatInterface.css';
 
+const ENABLE_STREAMING = process.env.REACT_APP_ENABLE_STREAMING === 'true';
+
+const PROGRESS_LABELS = {
+  resolving_head: 'Checking latest commit...',
+  cached_snapshot: 'Using cached repository snapshot...',
+  repository_metadata: 'Fetching repository details...',
+  file_structure: 'Reading file tree...',
+  file_contents: 'Fetching file contents...',
+  files_ready: 'Files loaded...',
+  generating: 'Generating answer...'
+};
+
 const UserIcon = () => (
   <svg xmlns="http://www.w3.org/2000/svg" width="16" height="16" viewBox="0 0 16 16" fill="currentColor">
     <path d="M8 8.5a2.5 2.5 0 100-5 2.5 2.5 0 000 5zm3.5 1.5h-7a3.5 3.5 0 00-3.5 3.5v.5c0 .55.45 1 1 1h12c.55 0 1-.45 1-1v-.5a3.5 3.5 0 00-3.5-3.5z"/>
@@ -21,6 +33,7 @@ function ChatInterface({ repoPath, selectedConversation = null }) {
   const [input, setInput] = useState('');
   const [isLoading, setIsLoading] = useState(false);
   const [conversationId, setConversationId] = useState(null);
+  const [progressStage, setProgressStage] = useState(null);
   const messagesEndRef = useRef(null);
   const { isAuthenticated, user } = useAuth();
 
@@ -67,8 +80,20 @@ function ChatInterface({ repoPath, selectedConversation = null }) {
     
     try {
       console.log('Sending message to API:', userMessage, 'for repo:', repoPath);
-      // Send message to API with conversation ID
-      const response = await fetchRepoConversation(repoPath, userMessage, conversationId);
+      let response;
+      if (ENABLE_STREAMING) {
+        // Show the answer as it is generated
+        response = await streamRepoConversation(repoPath, userMessage, conversationId, {
+          onProgress: (progress) => setProgressStage(progress.stage),
+          onDelta: (text, answer) => {
+            setProgressStage('streaming');
+            setMessages([...updatedMessages, { role: 'assistant', content: answer }]);
+          }
+        });
+      } else {
+        // Send message to API with conversation ID
+        response = await fetchRepoConversation(repoPath, userMessage, conversationId);
+      }
       console.log('API response received:', response);
       
       // Create final messages array with bot response
@@ -95,6 +120,7 @@ function ChatInterface({ repoPath, selectedConversation = null }) {
       ]);
     } finally {
       setIsLoading(false);
+      setProgressStage(null);
     }
   };
 
@@ -111,7 +137,7 @@ function ChatInterface({ repoPath, selectedConversation = null }) {
             </div>
           </div>
         ))}
-        {isLoading && (
+        {isLoading && progressStage !== 'streaming' && (
           <div className="message assistant">
             <div className="message-icon">
               <GitHubIcon />
@@ -122,6 +148,9 @@ function ChatInterface({ repoPath, selectedConversation = null }) {
                 <span></span>
                 <span></span>
               </div>
+              {PROGRESS_LABELS[progressStage] && (
+                <div className="progress-stage">{PROGRESS_LABELS[progressStage]}</div>
+              )}
             </div>
           </div>
         )}
@@ -16,9 +16,29 @@ function formatDate(timestamp) {
   }
 }
 
+// Group conversations by repository; a conversation split across pages keeps its newest entry
+function groupByRepo(history) {
+  const seen = new Set();
+  return history.reduce((acc, conv) => {
+    if (conv.conversationId && seen.has(conv.conversationId)) {
+      return acc;
+    }
+    seen.add(conv.conversationId);
+    const repo = conv.repoPath || 'unknown-repo';
+    if (!acc[repo]) {
+      acc[repo] = [];
+    }
+    acc[repo].push(conv);
+    return acc;
+  }, {});
+}
+
 function ConversationHistory({ onSelectConversation, currentRepoPath }) {
+  const [history, setHistory] = useState([]);
   const [conversations, setConversations] = useState({});
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState('');
   const { isAuthenticated, user } = useAuth();
 
@@ -34,29 +54,22 @@ function ConversationHistory({ onSelectConversation, currentRepoPath }) {
         setLoading(true);
         console.log("Fetching conversation history...");
         
-        // Get history with error handling
-        const history = await fetchConversationHistory();
+        // Only the newest page is loaded up front; older pages load on demand
+        const page = await fetchConversationHistory();
         
         // If empty, don't show error
-        if (!history || history.length === 0) {
+        if (page.conversations.length === 0) {
           console.log("No conversation history found or endpoint not available");
+          setHistory([]);
           setConversations({});
+          setNextCursor(null);
           setLoading(false);
           return;
         }
         
-        // Group conversations by repository
-        const groupedByRepo = history.reduce((acc, conv) => {
-          const repo = conv.repoPath || 'unknown-repo';
-          if (!acc[repo]) {
-            acc[repo] = [];
-          }
-          acc[repo].push(conv);
-          return acc;
-        }, {});
-        
-        console.log("Grouped conversations:", Object.keys(groupedByRepo));
-        setConversations(groupedByRepo);
+        setHistory(page.conversations);
+        setConversations(groupByRepo(page.conversations));
+        setNextCursor(page.nextCursor);
         setError('');
       } catch (err) {
         console.error('Error fetching conversation history:', err);
@@ -70,6 +83,19 @@ function ConversationHistory({ onSelectConversation, currentRepoPath }) {
     loadConversationHistory();
   }, [isAuthenticated, user]);
 
+  async function loadMore() {
+    setLoadingMore(true);
+    try {
+      const page = await fetchConversationHistory(nextCursor);
+      const merged = [...history, ...page.conversations];
+      setHistory(merged);
+      setConversations(groupByRepo(merged));
+      setNextCursor(page.nextCursor);
+    } finally {
+      setLoadingMore(false);
+    }
+  }
+
   if (loading) {
     return <div className="conversation-history loading">Loading conversations...</div>;
   }
@@ -142,6 +168,12 @@ function ConversationHistory({ onSelectConversation, currentRepoPath }) {
             </div>
           ))}
       </div>
+      
+      {nextCursor && (
+        <button className="load-more" onClick={loadMore} disabled={loadingMore}>
+          {loadingMore ? 'Loading...' : 'Load older conversations'}
+        </button>
+      )}
     </div>
   );
 }
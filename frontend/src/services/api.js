@@ -1,6 +1,8 @@
 import { Auth } from 'aws-amplify';
 
 const API_ENDPOINT = process.env.REACT_APP_API_ENDPOINT || 'https://api.aigithub.com';
+// Streaming chat goes to stream_server.py behind the stack's function URL (deploy.sh sets it); API Gateway buffers responses
+const STREAM_ENDPOINT = process.env.REACT_APP_STREAM_ENDPOINT || `${API_ENDPOINT}/api`;
 
 /**
  * Get authentication headers
@@ -49,6 +51,35 @@ export async function fetchRepoInfo(repoPath) {
   }
 }
 
+/**
+ * Fetch the background ingestion status of a repository
+ */
+export async function fetchIngestionStatus(repoPath) {
+  try {
+    const authHeaders = await getAuthHeaders();
+    
+    const response = await fetch(`${API_ENDPOINT}/api/ingestion-status`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        ...authHeaders
+      },
+      body: JSON.stringify({ repoPath }),
+    });
+    
+    if (!response.ok) {
+      const errorText = await response.text();
+      console.error('Ingestion status error response:', response.status, errorText);
+      throw new Error(`Failed to fetch ingestion status: ${response.status}`);
+    }
+    
+    return await response.json();
+  } catch (error) {
+    console.error('API error in fetchIngestionStatus:', error);
+    throw error;
+  }
+}
+
 /**
  * Send user message and get response about a repository
  */
@@ -97,84 +128,130 @@ export async function fetchRepoConversation(repoPath, message, conversationId =
 }
 
 /**
- * Fetch conversation history
+ * Send user message and stream the response as server-sent events.
+ * onProgress receives fetch stages, onDelta receives answer text as it arrives.
+ * Resolves with { answer, conversationId, cached } once the stream is done.
  */
-export async function fetchConversationHistory() {
+export async function streamRepoConversation(repoPath, message, conversationId = null, { onProgress, onDelta } = {}) {
+  const authHeaders = await getAuthHeaders();
+  console.log('Streaming chat message for repo:', repoPath);
+
+  const requestBody = { repoPath, message };
+  if (conversationId) {
+    requestBody.conversationId = conversationId;
+  }
+
+  const response = await fetch(`${STREAM_ENDPOINT}/chat-stream`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      ...authHeaders
+    },
+    body: JSON.stringify(requestBody),
+  });
+
+  if (!response.ok) {
+    const errorText = await response.text();
+    console.error('Chat stream error response:', response.status, errorText);
+    throw new Error("Failed to stream conversation: Status " + response.status);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let answer = '';
+  let result = null;
+
+  const handleEvent = (rawEvent) => {
+    let eventType = 'message';
+    let data = '';
+    for (const line of rawEvent.split('\n')) {
+      if (line.startsWith('event: ')) eventType = line.slice(7);
+      else if (line.startsWith('data: ')) data += line.slice(6);
+    }
+    if (!data) return;
+
+    const payload = JSON.parse(data);
+    if (eventType === 'progress') {
+      onProgress && onProgress(payload);
+    } else if (eventType === 'delta') {
+      answer += payload.text;
+      onDelta && onDelta(payload.text, answer);
+    } else if (eventType === 'done') {
+      result = { answer, conversationId: payload.conversationId, cached: payload.cached };
+    } else if (eventType === 'error') {
+      throw new Error(payload.error);
+    }
+  };
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      handleEvent(buffer.slice(0, boundary));
+      buffer = buffer.slice(boundary + 2);
+    }
+  }
+  if (buffer.trim()) {
+    handleEvent(buffer);
+  }
+
+  if (!result) {
+    throw new Error('Chat stream ended unexpectedly');
+  }
+  return result;
+}
+
+/**
+ * Fetch one page of conversation history, newest first.
+ * Resolves with { conversations, nextCursor }; pass nextCursor back to get the next page.
+ */
+export async function fetchConversationHistory(cursor = null) {
+  const empty = { conversations: [], nextCursor: null };
   try {
-    console.log("Fetching conversation history...");
     const authHeaders = await getAuthHeaders();
     
     if (!Object.keys(authHeaders).length) {
       console.log("No auth headers available, can't fetch history");
-      return [];
+      return empty;
     }
     
-    // Manual test: log conversation history endpoint
-    const url = `\${API_ENDPOINT}/api/conversation-history`;
-    console.log("Making GET request to:", url);
+    const params = new URLSearchParams();
+    if (cursor) {
+      params.set('cursor', cursor);
+    }
+    const query = params.toString();
+    const url = `${API_ENDPOINT}/api/conversation-history${query ? `?${query}` : ''}`;
     
-    try {
-      // Add timeout to avoid long waiting
-      const controller = new AbortController();
-      const timeoutId = setTimeout(() => controller.abort(), 10000);
-      
-      // Make the request
-      const response = await fetch(url, {
-        method: 'GET',
-        headers: {
-          'Content-Type': 'application/json',
-          ...authHeaders
-        },
-        signal: controller.signal
-      });
-      
-      clearTimeout(timeoutId);
-      
-      // Check response
-      console.log("Conversation history API response status:", response.status);
-      
-      if (!response.ok) {
-        throw new Error(`Server returned \${response.status}`);
-      }
-      
-      // Get response text and try to parse
-      const responseText = await response.text();
-      console.log("Response text length:", responseText.length);
-      
-      // Parse JSON
-      const data = JSON.parse(responseText);
-      console.log("Retrieved conversation history:", data.length, "items");
-      return data;
-    } catch (error) {
-      console.error("Error fetching conversation history:", error);
-      
-      // FALLBACK: Try direct scan for data - DEVELOPMENT ONLY
-      try {
-        console.log("Attempting direct DynamoDB access via /api/direct-scan");
-        const scanResponse = await fetch(`\${API_ENDPOINT}/api/direct-scan`, {
-          method: 'POST',
-          headers: {
-            'Content-Type': 'application/json',
-            ...authHeaders
-          },
-          body: JSON.stringify({ userId: "pvsaws@amazon.com" })
-        });
-        
-        if (scanResponse.ok) {
-          const scanData = await scanResponse.json();
-          console.log("Retrieved data via scan:", scanData);
-          return scanData;
-        }
-      } catch (scanError) {
-        console.error("Failed scan attempt:", scanError);
-      }
-      
-      // Return empty array if all attempts fail
-      return [];
+    // Add timeout to avoid long waiting
+    const controller = new AbortController();
+    const timeoutId = setTimeout(() => controller.abort(), 10000);
+    
+    const response = await fetch(url, {
+      method: 'GET',
+      headers: {
+        // Large pages come back gzip-compressed, which the API returns as binary only for this type
+        'Accept': 'application/gzip, application/json',
+        ...authHeaders
+      },
+      signal: controller.signal
+    });
+    
+    clearTimeout(timeoutId);
+    
+    if (!response.ok) {
+      throw new Error(`Server returned ${response.status}`);
     }
+    
+    const data = await response.json();
+    console.log("Retrieved conversation history:", data.conversations.length, "conversations");
+    return data;
   } catch (error) {
     console.error('API error in fetchConversationHistory:', error);
-    return [];
+    return empty;
   }
 }
 
@@ -233,26 +310,37 @@ export async function saveConversation(conversationData) {
 }
 
 /**
- * Get specific conversation
+ * Get specific conversation, following nextCursor until all of its messages are loaded
  */
 export async function getConversation(conversationId) {
   try {
     const authHeaders = await getAuthHeaders();
+    let conversation = null;
+    let cursor = null;
     
-    const response = await fetch(`${API_ENDPOINT}/api/get-conversation`, {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-        ...authHeaders
-      },
-      body: JSON.stringify({ conversationId }),
-    });
-    
-    if (!response.ok) {
-      throw new Error(`Failed to get conversation: ${response.status}`);
-    }
+    do {
+      const response = await fetch(`${API_ENDPOINT}/api/get-conversation`, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+          'Accept': 'application/gzip, application/json',
+          ...authHeaders
+        },
+        body: JSON.stringify({ conversationId, cursor }),
+      });
+      
+      if (!response.ok) {
+        throw new Error(`Failed to get conversation: ${response.status}`);
+      }
+      
+      const page = await response.json();
+      conversation = conversation
+        ? { ...conversation, messages: [...conversation.messages, ...page.messages] }
+        : page;
+      cursor = page.nextCursor;
+    } while (cursor);
     
-    return await response.json();
+    return conversation;
   } catch (error) {
     console.error('API error:', error);
     throw error;
@@ -80,6 +80,7 @@ FRONTEND_BUCKET=$(aws cloudformation describe-stack-resources \
   --region "$REGION")
 
 API_ENDPOINT=$(aws cloudformation describe-stacks --stack-name "$STACK_NAME" --query "Stacks[0].Outputs[?OutputKey=='APIEndpoint'].OutputValue" --output text --region "$REGION")
+STREAM_ENDPOINT=$(aws cloudformation describe-stacks --stack-name "$STACK_NAME" --query "Stacks[0].Outputs[?OutputKey=='StreamEndpoint'].OutputValue" --output text --region "$REGION")
 FRONTEND_URL=$(aws cloudformation describe-stacks --stack-name "$STACK_NAME" --query "Stacks[0].Outputs[?OutputKey=='FrontendURL'].OutputValue" --output text --region "$REGION")
 
 # Get CloudFront distribution ID directly
@@ -99,6 +100,7 @@ echo "Stack deployed successfully!"
 echo "Frontend Bucket: $FRONTEND_BUCKET"
 echo "Frontend URL: $FRONTEND_URL"
 echo "API Endpoint: $API_ENDPOINT"
+echo "Stream Endpoint: $STREAM_ENDPOINT"
 echo "CloudFront Distribution ID: $DISTRIBUTION_ID"
 echo "Cognito User Pool ID: $USER_POOL_ID"
 echo "Cognito User Pool Client ID: $USER_POOL_CLIENT_ID"
@@ -148,6 +150,8 @@ fs.writeFileSync("./package.json", JSON.stringify(packageJson, null, 2));
 
 # Create .env file with API endpoint and Cognito config
 echo "REACT_APP_API_ENDPOINT=$API_ENDPOINT" > .env
+echo "REACT_APP_ENABLE_STREAMING=true" >> .env
+echo "REACT_APP_STREAM_ENDPOINT=$STREAM_ENDPOINT" >> .env
 echo "REACT_APP_AWS_REGION=$REGION" >> .env
 echo "REACT_APP_USER_POOL_ID=$USER_POOL_ID" >> .env
 echo "REACT_APP_USER_POOL_CLIENT_ID=$USER_POOL_CLIENT_ID" >> .env